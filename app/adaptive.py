@@ -0,0 +1,313 @@
+import os
+import threading
+import time
+from collections import Counter
+from typing import AsyncIterator, Iterator, List, NamedTuple, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from app.encoder import JPEG_QUALITY, EncodedFrame
+
+load_dotenv()
+# adaptive streaming
+ADAPTIVE_STREAM = bool(int(os.getenv("ADAPTIVE_STREAM", 1)))
+STREAM_MIN_QUALITY = int(os.getenv("STREAM_MIN_QUALITY", 40))
+
+# (quality, width, fps) scales from the requested profile, stepped down
+# while a client's socket backs up
+QUALITY_LADDER = (
+    (1.0, 1.0, 1.0),
+    (0.8, 1.0, 1.0),
+    (0.6, 1.0, 1.0),
+    (0.6, 0.5, 1.0),
+    (0.6, 0.5, 0.5),
+    (0.4, 0.25, 0.5),
+    (0.4, 0.25, 0.25),
+)
+
+
+class StreamProfile(NamedTuple):
+    """
+    What a client asked for, such as /stream?fps=5&width=320&quality=60.
+    Unset fields follow the camera and encoder settings.
+    """
+
+    fps: Optional[float] = None
+    width: Optional[int] = None
+    quality: Optional[int] = None
+
+
+class AdaptiveClient:
+    """
+    Paces one stream client and picks the variant of each frame it gets.
+
+    Frames are sent no faster than the client's fps. The time the client
+    takes to accept each frame is smoothed; when it exceeds the frame
+    interval, the socket is backing up and the client steps down the
+    quality ladder (lower JPEG quality, then smaller frames, then fewer
+    frames). It steps back up once sending is fast again. Qualities and
+    widths come from a fixed ladder, so clients at the same step share the
+    same encoded variant.
+
+    Args:
+        profile: The profile the client asked for.
+        camera_fps: The fps frames are captured at.
+        frame_width: The width frames are captured at.
+        base_quality: The JPEG quality of the full stream.
+        adaptive: Whether to step down the ladder under back pressure.
+
+    Attributes:
+        __fps: The fps the client asked for
+        __width: The width the client asked for, or None for full size
+        __quality: The JPEG quality the client asked for
+        __adaptive: Whether to step down the ladder under back pressure
+        __level: The current step of the ladder
+        __send_time: Smoothed seconds the client takes to accept a frame
+        __last_sent: perf_counter time the last frame was sent
+        __changed_at: perf_counter time the level last changed
+    """
+
+    def __init__(
+        self,
+        profile: StreamProfile,
+        camera_fps: float,
+        frame_width: Optional[int] = None,
+        base_quality: int = JPEG_QUALITY,
+        adaptive: bool = ADAPTIVE_STREAM,
+    ) -> None:
+        fps = profile.fps or camera_fps
+        self.__fps = min(fps, camera_fps) if camera_fps else fps
+        self.__width = profile.width or frame_width
+        self.__quality = profile.quality or base_quality
+        self.__adaptive = adaptive
+        self.__level = 0
+        self.__send_time = 0.0
+        self.__last_sent = None
+        self.__changed_at = time.perf_counter()
+
+    def get_level(self) -> int:
+        """
+        Gets the current step of the quality ladder.
+
+        Returns:
+            0 at the requested profile, higher when stepped down.
+
+        """
+        return self.__level
+
+    def get_fps(self) -> float:
+        """
+        Gets the fps the client currently gets at most.
+
+        Returns:
+            The fps.
+
+        """
+        return self.__fps * QUALITY_LADDER[self.__level][2]
+
+    def get_variant(self) -> Tuple[Optional[int], int]:
+        """
+        Gets the variant of the frames the client currently gets.
+
+        Returns:
+            The (width, quality) to pass to EncodedFrame.get_variant. The
+            width is None when the frame width is not known.
+
+        """
+        quality_scale, width_scale, _ = QUALITY_LADDER[self.__level]
+        quality = self.__quality
+        if quality_scale < 1:
+            quality = max(int(quality * quality_scale), STREAM_MIN_QUALITY)
+        width = self.__width
+        if width is not None and width_scale < 1:
+            width = max(int(width * width_scale) // 8 * 8, 8)
+        return width, quality
+
+    def should_send(self, now: float) -> bool:
+        """
+        Check whether a frame is due for the client at its fps.
+
+        Args:
+            now (float): The current perf_counter time.
+
+        Returns:
+            True if the frame should be sent.
+
+        """
+        if self.__last_sent is None:
+            return True
+        # a little slack so frames arriving at exactly the fps are not missed
+        return now - self.__last_sent >= 0.9 / self.get_fps()
+
+    def sent(self, now: float, seconds: float) -> None:
+        """
+        Record that a frame was sent, and adapt to how long it took.
+
+        Args:
+            now (float): The perf_counter time the frame was sent.
+            seconds (float): How long the client took to accept it.
+
+        """
+        self.__last_sent = now
+        self.__send_time = 0.8 * self.__send_time + 0.2 * seconds
+        if not self.__adaptive:
+            return
+        interval = 1 / self.get_fps()
+        since_change = now - self.__changed_at
+        if self.__send_time > interval and since_change >= 1:
+            if self.__level < len(QUALITY_LADDER) - 1:
+                self.__level += 1
+                self.__changed_at = now
+        elif self.__send_time < 0.25 * interval and since_change >= 5:
+            if self.__level > 0:
+                self.__level -= 1
+                self.__changed_at = now
+
+
+class VariantRegistry:
+    """
+    Counts the clients getting each variant of the stream, so the producer
+    thread can encode the variants in use as soon as a frame is captured,
+    rather than on the event loop of the first client asking for it.
+
+    Attributes:
+        __lock: Lock guarding the counts
+        __clients: Number of clients by (width, quality) variant
+    """
+
+    def __init__(self) -> None:
+        self.__lock = threading.Lock()
+        self.__clients = Counter()
+
+    def switch(
+        self,
+        old: Optional[Tuple[Optional[int], int]],
+        new: Optional[Tuple[Optional[int], int]],
+    ) -> None:
+        """
+        Move a client from one variant to another.
+
+        Args:
+            old (tuple): The variant the client leaves, or None.
+            new (tuple): The variant the client joins, or None.
+
+        """
+        with self.__lock:
+            if old is not None:
+                self.__clients[old] -= 1
+                if self.__clients[old] <= 0:
+                    del self.__clients[old]
+            if new is not None:
+                self.__clients[new] += 1
+
+    def get_variants(self) -> List[Tuple[Optional[int], int]]:
+        """
+        Gets the variants in use.
+
+        Returns:
+            The (width, quality) variants at least one client gets.
+
+        """
+        with self.__lock:
+            return list(self.__clients)
+
+    def encode(self, frame: EncodedFrame) -> None:
+        """
+        Encode every variant in use of a frame.
+
+        Args:
+            frame (EncodedFrame): The captured frame.
+
+        """
+        for width, quality in self.get_variants():
+            frame.get_variant(width, quality)
+
+
+def deliver(
+    frames: Iterator[EncodedFrame],
+    client: AdaptiveClient,
+    variants: Optional[VariantRegistry] = None,
+) -> Iterator[bytes]:
+    """
+    Deliver frames to a client on a worker thread at its pace and variant.
+
+    Args:
+        frames: The frames from the hub.
+        client: The client's pacing and variant.
+        variants: Registry of the variants in use, to keep up to date.
+
+    Yields:
+        Multipart JPEG chunks.
+
+    """
+    variant = None
+    try:
+        for frame in frames:
+            now = time.perf_counter()
+            if not client.should_send(now):
+                continue
+            variant = _switch_variant(variants, variant, client.get_variant())
+            part = frame.get_variant(*variant)
+            if part is None:
+                continue
+            yield part
+            # resumed once the server has written the chunk to the socket
+            client.sent(now, time.perf_counter() - now)
+    finally:
+        _switch_variant(variants, variant, None)
+
+
+async def deliver_async(
+    frames: AsyncIterator[EncodedFrame],
+    client: AdaptiveClient,
+    variants: Optional[VariantRegistry] = None,
+) -> AsyncIterator[bytes]:
+    """
+    Deliver frames to an asyncio client at its pace and variant.
+
+    Args:
+        frames: The frames from the hub.
+        client: The client's pacing and variant.
+        variants: Registry of the variants in use, to keep up to date.
+
+    Yields:
+        Multipart JPEG chunks.
+
+    """
+    variant = None
+    try:
+        async for frame in frames:
+            now = time.perf_counter()
+            if not client.should_send(now):
+                continue
+            variant = _switch_variant(variants, variant, client.get_variant())
+            part = frame.get_variant(*variant)
+            if part is None:
+                continue
+            yield part
+            # resumed once the server has written the chunk to the socket
+            client.sent(now, time.perf_counter() - now)
+    finally:
+        _switch_variant(variants, variant, None)
+
+
+def _switch_variant(
+    variants: Optional[VariantRegistry],
+    old: Optional[Tuple[Optional[int], int]],
+    new: Optional[Tuple[Optional[int], int]],
+) -> Optional[Tuple[Optional[int], int]]:
+    """
+    Register a client's move to a new variant, if it changed.
+
+    Args:
+        variants (VariantRegistry): The registry, or None.
+        old (tuple): The variant the client had.
+        new (tuple): The variant the client gets now.
+
+    Returns:
+        The new variant.
+
+    """
+    if variants is not None and new != old:
+        variants.switch(old, new)
+    return new
@@ -0,0 +1,552 @@
+"""
+Encoder backends for streamed JPEGs and recorded videos, and a micro
+benchmark picking the fastest one available on the host.
+
+    python -m app.backends
+"""
+
+import os
+import shutil
+import tempfile
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, Optional, Tuple, Type
+
+import cv2
+import numpy as np
+from dotenv import load_dotenv
+
+from app.metrics import metrics
+
+try:
+    import simplejpeg
+except ImportError:
+    simplejpeg = None
+try:
+    from turbojpeg import TJFLAG_PROGRESSIVE, TJPF_BGR, TJSAMP_420, TurboJPEG
+except ImportError:
+    TurboJPEG = None
+try:
+    import ffmpeg
+except ImportError:
+    ffmpeg = None
+
+load_dotenv()
+# video
+CODEC = os.getenv("CODEC")
+VID_FORMAT = os.getenv("VID_FORMAT")
+
+# camera
+WIDTH = int(os.getenv("WIDTH"))
+HEIGHT = int(os.getenv("HEIGHT"))
+
+# encoder backends
+JPEG_BACKEND = os.getenv("JPEG_BACKEND", "auto")
+RECORD_BACKEND = os.getenv("RECORD_BACKEND", "opencv")
+FFMPEG_CODEC = os.getenv("FFMPEG_CODEC", "libx264")
+FFMPEG_PRESET = os.getenv("FFMPEG_PRESET", "veryfast")
+FFMPEG_QUALITY = int(os.getenv("FFMPEG_QUALITY", 23))
+# the option each ffmpeg encoder takes its constant quality from
+FFMPEG_QUALITY_OPTIONS: Dict[str, str] = {
+    "libx264": "crf",
+    "libx265": "crf",
+    "libvpx-vp9": "crf",
+    "libaom-av1": "crf",
+    "libsvtav1": "crf",
+    "h264_nvenc": "cq",
+    "hevc_nvenc": "cq",
+    "av1_nvenc": "cq",
+    "h264_qsv": "global_quality",
+    "hevc_qsv": "global_quality",
+    "h264_vaapi": "qp",
+    "hevc_vaapi": "qp",
+}
+BACKEND_BENCH_FRAMES = int(os.getenv("BACKEND_BENCH_FRAMES", 20))
+
+
+class JpegBackend(ABC):
+    """
+    Base class for JPEG encoding libraries used by JpegEncoder.
+
+    A backend is created with the quality, whether to optimise the Huffman
+    tables and whether to write progressive JPEGs; settings a library does
+    not support are ignored, so "auto" only picks among the backends that
+    support the settings asked for.
+
+    Attributes:
+        optimize: Whether Huffman table optimisation is supported
+        progressive: Whether progressive JPEGs are supported
+    """
+
+    optimize = True
+    progressive = True
+
+    @classmethod
+    def supports(cls, optimize: bool, progressive: bool) -> bool:
+        """
+        Check whether the backend honours the encoding settings.
+
+        Args:
+            optimize (bool): Whether to optimise the Huffman tables.
+            progressive (bool): Whether to write progressive JPEGs.
+
+        Returns:
+            True if no setting asked for would be ignored.
+
+        """
+        return (cls.optimize or not optimize) and (cls.progressive or not progressive)
+
+    @staticmethod
+    def is_available() -> bool:
+        """
+        Check whether the library of the backend is installed.
+
+        Returns:
+            True if the backend can be used.
+
+        """
+        return True
+
+    @abstractmethod
+    def encode(self, frame: np.ndarray) -> Optional[bytes]:
+        """
+        Encode a BGR frame to JPEG.
+
+        Args:
+            frame (np.ndarray): The frame.
+
+        Returns:
+            The JPEG bytes, or None if encoding failed.
+
+        """
+
+
+class OpenCVJpegBackend(JpegBackend):
+    """
+    Encodes with cv2.imencode.
+
+    Attributes:
+        __params: OpenCV imencode parameters built once from the settings
+    """
+
+    def __init__(self, quality: int, optimize: bool, progressive: bool) -> None:
+        self.__params = [
+            cv2.IMWRITE_JPEG_QUALITY,
+            int(quality),
+            cv2.IMWRITE_JPEG_OPTIMIZE,
+            int(optimize),
+            cv2.IMWRITE_JPEG_PROGRESSIVE,
+            int(progressive),
+        ]
+
+    def encode(self, frame: np.ndarray) -> Optional[bytes]:
+        ret, buffer = cv2.imencode(".jpg", frame, self.__params)
+        return buffer.tobytes() if ret else None
+
+
+class TurboJpegBackend(JpegBackend):
+    """
+    Encodes with libjpeg-turbo through PyTurboJPEG, without OpenCV's copies.
+    Huffman table optimisation is not supported.
+
+    Attributes:
+        __jpeg: The TurboJPEG library handle
+        __quality: JPEG quality from 0 to 100
+        __flags: TurboJPEG flags built from the settings
+    """
+
+    optimize = False
+
+    @staticmethod
+    def is_available() -> bool:
+        return TurboJPEG is not None
+
+    def __init__(self, quality: int, optimize: bool, progressive: bool) -> None:
+        self.__jpeg = TurboJPEG()
+        self.__quality = int(quality)
+        self.__flags = TJFLAG_PROGRESSIVE if progressive else 0
+
+    def encode(self, frame: np.ndarray) -> Optional[bytes]:
+        return self.__jpeg.encode(
+            frame,
+            quality=self.__quality,
+            pixel_format=TJPF_BGR,
+            jpeg_subsample=TJSAMP_420,
+            flags=self.__flags,
+        )
+
+
+class SimpleJpegBackend(JpegBackend):
+    """
+    Encodes with libjpeg-turbo through simplejpeg. Huffman table
+    optimisation and progressive JPEGs are not supported.
+
+    Attributes:
+        __quality: JPEG quality from 0 to 100
+    """
+
+    optimize = False
+    progressive = False
+
+    @staticmethod
+    def is_available() -> bool:
+        return simplejpeg is not None
+
+    def __init__(self, quality: int, optimize: bool, progressive: bool) -> None:
+        self.__quality = int(quality)
+
+    def encode(self, frame: np.ndarray) -> Optional[bytes]:
+        return simplejpeg.encode_jpeg(
+            np.ascontiguousarray(frame),
+            quality=self.__quality,
+            colorspace="BGR",
+            colorsubsampling="420",
+        )
+
+
+JPEG_BACKENDS: Dict[str, Type[JpegBackend]] = {
+    "opencv": OpenCVJpegBackend,
+    "turbojpeg": TurboJpegBackend,
+    "simplejpeg": SimpleJpegBackend,
+}
+
+RECORD_BACKENDS = ("opencv", "ffmpeg")
+
+
+class FfmpegWriter:
+    """
+    Records a video by piping raw frames to an ffmpeg subprocess, with the
+    same write, isOpened and release methods as cv2.VideoWriter. Any ffmpeg
+    encoder can be used, such as libx264 or a hardware encoder like
+    h264_nvenc. The preset is passed to it as it is, and the quality through
+    the option the encoder takes it from, such as crf for libx264 or cq for
+    h264_nvenc; encoders not in FFMPEG_QUALITY_OPTIONS keep their default.
+
+    Args:
+        filename: The video file.
+        fps: The fps of the video.
+        frame_size: The (width, height) of the frames.
+        codec: The ffmpeg video encoder.
+        preset: The encoder preset.
+        quality: The constant quality, lower is better quality.
+
+    Attributes:
+        __process: The ffmpeg subprocess, or None if it could not start
+    """
+
+    @staticmethod
+    def is_available() -> bool:
+        """
+        Check whether ffmpeg-python and the ffmpeg binary are installed.
+
+        Returns:
+            True if the backend can be used.
+
+        """
+        return ffmpeg is not None and shutil.which("ffmpeg") is not None
+
+    @staticmethod
+    def get_quality_options(codec: str, quality: int) -> Dict[str, int]:
+        """
+        Get the ffmpeg output option setting the quality of an encoder.
+
+        Args:
+            codec (str): The ffmpeg video encoder.
+            quality (int): The constant quality, lower is better quality.
+
+        Returns:
+            The option and its value, or no option if the encoder is unknown.
+
+        """
+        option = FFMPEG_QUALITY_OPTIONS.get(codec)
+        if option is None:
+            print(f"No quality option known for {codec}, using its default")
+            return {}
+        return {option: quality}
+
+    def __init__(
+        self,
+        filename: str,
+        fps: float,
+        frame_size: Tuple[int, int],
+        codec: str = FFMPEG_CODEC,
+        preset: str = FFMPEG_PRESET,
+        quality: int = FFMPEG_QUALITY,
+    ) -> None:
+        self.__process = None
+        if ffmpeg is None:
+            return
+        width, height = frame_size
+        stream = ffmpeg.input(
+            "pipe:", format="rawvideo", pix_fmt="bgr24", s=f"{width}x{height}", r=fps
+        ).output(
+            filename,
+            vcodec=codec,
+            preset=preset,
+            **self.get_quality_options(codec, quality),
+            pix_fmt="yuv420p",
+            movflags="+faststart",
+        )
+        try:
+            self.__process = (
+                stream.overwrite_output()
+                .global_args("-loglevel", "error")
+                .run_async(pipe_stdin=True)
+            )
+        except OSError as error:
+            print(f"Cannot start ffmpeg: {error}")
+
+    def isOpened(self) -> bool:
+        return self.__process is not None and self.__process.poll() is None
+
+    def write(self, frame: np.ndarray) -> None:
+        if not self.isOpened():
+            return
+        try:
+            self.__process.stdin.write(np.ascontiguousarray(frame).data)
+        except OSError as error:
+            print(f"Cannot write to ffmpeg: {error}")
+
+    def release(self) -> None:
+        if self.__process is None:
+            return
+        try:
+            self.__process.stdin.close()
+        except OSError:
+            pass
+        self.__process.wait()
+        self.__process = None
+
+
+def get_jpeg_backends(
+    optimize: bool = False, progressive: bool = False
+) -> Dict[str, Type[JpegBackend]]:
+    """
+    List the JPEG backends whose library is installed and that support the
+    encoding settings.
+
+    Args:
+        optimize (bool, optional): Whether to optimise the Huffman tables.
+        progressive (bool, optional): Whether to write progressive JPEGs.
+
+    Returns:
+        The backends by name.
+
+    """
+    return {
+        name: backend
+        for name, backend in JPEG_BACKENDS.items()
+        if backend.is_available() and backend.supports(optimize, progressive)
+    }
+
+
+def get_record_backends() -> Tuple[str, ...]:
+    """
+    List the recording backends that can run on this host.
+
+    Returns:
+        The backend names.
+
+    """
+    return tuple(
+        name
+        for name in RECORD_BACKENDS
+        if name != "ffmpeg" or FfmpegWriter.is_available()
+    )
+
+
+def sample_frame(frame_size: Tuple[int, int] = (WIDTH, HEIGHT)) -> np.ndarray:
+    """
+    Build a frame to benchmark with: a gradient with noise, which encodes
+    more like a camera frame than flat color or pure noise.
+
+    Args:
+        frame_size (tuple, optional): The (width, height) of the frame.
+
+    Returns:
+        The BGR frame.
+
+    """
+    width, height = frame_size
+    gradient = np.linspace(0, 200, width, dtype=np.float32)[None, :, None]
+    frame = np.broadcast_to(gradient, (height, width, 3)).astype(np.uint8)
+    noise = np.random.default_rng(0).integers(0, 24, frame.shape, dtype=np.uint8)
+    return cv2.add(frame, noise)
+
+
+def benchmark_jpeg(
+    frames: int = BACKEND_BENCH_FRAMES,
+    frame_size: Tuple[int, int] = (WIDTH, HEIGHT),
+    quality: int = 95,
+    optimize: bool = False,
+    progressive: bool = False,
+) -> Dict[str, float]:
+    """
+    Measure the encode fps of every available JPEG backend supporting the
+    encoding settings.
+
+    Args:
+        frames (int, optional): Frames encoded per backend.
+        frame_size (tuple, optional): The (width, height) of the frames.
+        quality (int, optional): The JPEG quality.
+        optimize (bool, optional): Whether to optimise the Huffman tables.
+        progressive (bool, optional): Whether to write progressive JPEGs.
+
+    Returns:
+        The encode fps by backend name.
+
+    """
+    frame = sample_frame(frame_size)
+    results = {}
+    for name, backend in get_jpeg_backends(optimize, progressive).items():
+        encoder = backend(quality, optimize, progressive)
+        encoder.encode(frame)  # warm up
+        start = time.perf_counter()
+        for _ in range(frames):
+            encoder.encode(frame)
+        results[name] = frames / max(time.perf_counter() - start, 1e-9)
+    _report("jpeg", results)
+    return results
+
+
+def benchmark_record(
+    frames: int = BACKEND_BENCH_FRAMES,
+    frame_size: Tuple[int, int] = (WIDTH, HEIGHT),
+    codec: str = CODEC,
+    vid_format: str = VID_FORMAT,
+) -> Dict[str, float]:
+    """
+    Measure the encode fps of every available recording backend, writing
+    a short video to a temporary directory with each.
+
+    Args:
+        frames (int, optional): Frames written per backend.
+        frame_size (tuple, optional): The (width, height) of the frames.
+        codec (str, optional): The fourcc codec of the opencv backend.
+        vid_format (str, optional): The file extension of the videos.
+
+    Returns:
+        The encode fps by backend name, for the backends that could open a
+        video.
+
+    """
+    frame = sample_frame(frame_size)
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for name in get_record_backends():
+            filename = os.path.join(directory, f"{name}.{vid_format}")
+            start = time.perf_counter()
+            if name == "ffmpeg":
+                writer = FfmpegWriter(filename, 30, frame_size)
+            else:
+                fourcc = cv2.VideoWriter_fourcc(*codec)
+                writer = cv2.VideoWriter(filename, fourcc, 30, frame_size, True)
+            if not writer.isOpened():
+                continue
+            for _ in range(frames):
+                writer.write(frame)
+            writer.release()
+            results[name] = frames / max(time.perf_counter() - start, 1e-9)
+    _report("record", results)
+    return results
+
+
+_selected = {}
+_lock = threading.Lock()
+
+
+def select_jpeg_backend(
+    name: str = JPEG_BACKEND, optimize: bool = False, progressive: bool = False
+) -> str:
+    """
+    Resolve the JPEG backend to use. "auto" benchmarks the available
+    backends supporting the settings once per process and picks the
+    fastest. A backend named explicitly is used even if it ignores a
+    setting, with a warning.
+
+    Args:
+        name (str, optional): A backend name or "auto".
+        optimize (bool, optional): Whether to optimise the Huffman tables.
+        progressive (bool, optional): Whether to write progressive JPEGs.
+
+    Returns:
+        The backend name.
+
+    Raises:
+        ValueError: If the backend is unknown or not installed.
+
+    """
+    if name != "auto":
+        if name not in JPEG_BACKENDS:
+            raise ValueError(
+                f"Unknown JPEG backend {name!r}, use one of {list(JPEG_BACKENDS)}"
+            )
+        if not JPEG_BACKENDS[name].is_available():
+            raise ValueError(f"JPEG backend {name!r} is not installed")
+        if not JPEG_BACKENDS[name].supports(optimize, progressive):
+            print(f"JPEG backend {name!r} ignores JPEG_OPTIMIZE or JPEG_PROGRESSIVE")
+        return name
+    key = ("jpeg", optimize, progressive)
+    with _lock:
+        if key not in _selected:
+            # opencv supports every setting, so there is always one
+            available = list(get_jpeg_backends(optimize, progressive))
+            if len(available) == 1:
+                _selected[key] = available[0]
+            else:
+                results = benchmark_jpeg(optimize=optimize, progressive=progressive)
+                _selected[key] = max(results, key=results.get)
+        return _selected[key]
+
+
+def select_record_backend(name: str = RECORD_BACKEND) -> str:
+    """
+    Resolve the recording backend to use. "auto" benchmarks the available
+    backends once per process and picks the fastest.
+
+    Args:
+        name (str, optional): A backend name or "auto".
+
+    Returns:
+        The backend name.
+
+    Raises:
+        ValueError: If the backend is unknown.
+
+    """
+    if name != "auto":
+        if name not in RECORD_BACKENDS:
+            raise ValueError(
+                f"Unknown record backend {name!r}, use one of {list(RECORD_BACKENDS)}"
+            )
+        return name
+    with _lock:
+        if "record" not in _selected:
+            available = get_record_backends()
+            if len(available) == 1:
+                _selected["record"] = available[0]
+            else:
+                results = benchmark_record()
+                _selected["record"] = max(results, key=results.get, default="opencv")
+        return _selected["record"]
+
+
+def _report(kind: str, results: Dict[str, float]) -> None:
+    """
+    Print the encode fps of each backend and export them as metrics.
+
+    Args:
+        kind (str): "jpeg" or "record".
+        results (dict): The encode fps by backend name.
+
+    """
+    for name, fps in results.items():
+        metrics.set("encoder_backend_fps", fps, kind=kind, backend=name)
+    summary = ", ".join(f"{name} {fps:.0f} fps" for name, fps in results.items())
+    print(f"{kind} encoders: {summary or 'none available'}")
+
+
+if __name__ == "__main__":
+    benchmark_jpeg()
+    benchmark_record()
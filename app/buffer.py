@@ -0,0 +1,158 @@
+import os
+import weakref
+from typing import List, Optional, Union
+
+import cv2
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+# pre-motion buffer
+PREMOTION_SECS = float(os.getenv("PREMOTION_SECS", 5))
+PREMOTION_MODE = os.getenv("PREMOTION_MODE", "jpeg")
+PREMOTION_QUALITY = int(os.getenv("PREMOTION_QUALITY", 90))
+
+BUFFER_MODES = ("raw", "jpeg")
+
+BufferedFrame = Union[np.ndarray, bytes, memoryview]
+
+
+class FrameBuffer:
+    """
+    A ring buffer holding the most recent frames, so a recording can start
+    with the frames from before motion was detected.
+
+    In raw mode frames are copied into one preallocated (capacity, height,
+    width, channels) block. Detaching hands the block over and the next push
+    allocates a new one, so until the recorder has written the handed over
+    frames two blocks are held: raw mode needs up to twice the memory of
+    its capacity, and get_nbytes counts both. In jpeg mode each slot holds a
+    JPEG, which takes around a tenth of the memory; frames already encoded
+    for streaming can be pushed as JPEG bytes to avoid encoding twice.
+
+    Args:
+        capacity: Number of frames kept.
+        mode: "raw" or "jpeg".
+        quality: JPEG quality used when jpeg mode encodes a frame itself.
+
+    Attributes:
+        __capacity: Number of frames kept
+        __mode: "raw" or "jpeg"
+        __params: OpenCV imencode parameters for jpeg mode
+        __slots: The raw frame block or the list of JPEG slots
+        __handed: Weak reference to the raw block last handed over, alive
+                  while its frames are in use
+        __next: Index of the slot the next frame goes to
+        __count: Number of frames currently held
+    """
+
+    def __init__(
+        self,
+        capacity: int,
+        mode: str = PREMOTION_MODE,
+        quality: int = PREMOTION_QUALITY,
+    ) -> None:
+        if mode not in BUFFER_MODES:
+            raise ValueError(f"Unknown buffer mode {mode!r}, use one of {BUFFER_MODES}")
+        self.__capacity = capacity
+        self.__mode = mode
+        self.__params = [cv2.IMWRITE_JPEG_QUALITY, int(quality)]
+        self.__slots = None
+        self.__handed = None
+        self.__next = 0
+        self.__count = 0
+
+    def __len__(self) -> int:
+        return self.__count
+
+    def get_mode(self) -> str:
+        """
+        Gets how frames are stored.
+
+        Returns:
+            "raw" or "jpeg".
+
+        """
+        return self.__mode
+
+    def push(self, frame: BufferedFrame) -> None:
+        """
+        Add a frame, replacing the oldest one when the buffer is full.
+
+        Args:
+            frame: The frame, or in jpeg mode its JPEG bytes.
+
+        """
+        if self.__capacity <= 0:
+            return
+        if self.__mode == "raw":
+            if self.__slots is None or self.__slots.shape[1:] != frame.shape:
+                self.__slots = np.empty((self.__capacity,) + frame.shape, frame.dtype)
+                self.__next, self.__count = 0, 0
+            np.copyto(self.__slots[self.__next], frame)
+        else:
+            if self.__slots is None:
+                self.__slots = [None] * self.__capacity
+            if isinstance(frame, np.ndarray):
+                ret, buffer = cv2.imencode(".jpg", frame, self.__params)
+                if not ret:
+                    return
+                frame = buffer.tobytes()
+            self.__slots[self.__next] = frame
+        self.__next = (self.__next + 1) % self.__capacity
+        self.__count = min(self.__count + 1, self.__capacity)
+
+    def detach(self) -> List[BufferedFrame]:
+        """
+        Hand over the buffered frames, oldest first, and start an empty
+        buffer. The frames are not copied: the buffer moves on to new storage
+        so they stay valid.
+
+        Returns:
+            The raw frames or JPEG bytes, oldest first.
+
+        """
+        start = (self.__next - self.__count) % max(self.__capacity, 1)
+        order = [(start + i) % self.__capacity for i in range(self.__count)]
+        frames = [self.__slots[i] for i in order]
+        if self.__mode == "raw" and self.__slots is not None:
+            # the frames are views that keep the block alive
+            self.__handed = weakref.ref(self.__slots)
+        self.__slots = None
+        self.__next, self.__count = 0, 0
+        return frames
+
+    def get_nbytes(self) -> int:
+        """
+        Gets the memory held by the buffered frames, and in raw mode by the
+        block last handed over while its frames are still in use.
+
+        Returns:
+            The size of the buffered frames in bytes.
+
+        """
+        if self.__mode == "raw":
+            handed = self.__handed() if self.__handed is not None else None
+            nbytes = handed.nbytes if handed is not None else 0
+            if self.__slots is not None:
+                nbytes += self.__slots.nbytes
+            return nbytes
+        if self.__slots is None:
+            return 0
+        return sum(len(slot) for slot in self.__slots if slot is not None)
+
+
+def decode_frame(frame: BufferedFrame) -> Optional[np.ndarray]:
+    """
+    Get a raw frame back from a buffered frame.
+
+    Args:
+        frame: A raw frame or JPEG bytes.
+
+    Returns:
+        The raw frame, or None if the JPEG cannot be decoded.
+
+    """
+    if isinstance(frame, np.ndarray):
+        return frame
+    return cv2.imdecode(np.frombuffer(frame, np.uint8), cv2.IMREAD_COLOR)
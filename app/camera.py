@@ -1,9 +1,14 @@
 import os
-from typing import Tuple, List
+from typing import Tuple, List, Optional
 
 import cv2
 from dotenv import load_dotenv
 
+from app.backends import FfmpegWriter, select_record_backend
+from app.overlay import TIME_ORIGIN, TextCache
+from app.source import DeviceSource, FrameSource
+from app.timing import timer
+
 load_dotenv()
 # video
 CODEC = os.getenv("CODEC")
@@ -21,46 +26,28 @@ class Camera:
 
     Args:
         camid: The ID of the camera.
+        source: Where frames come from, such as a video file or a synthetic
+                scene. Defaults to the capture device camid.
 
     Attributes:
         __id: The camera id for opencv to identify
-        __cap: Store OpenCV VideoCpature object to read video capture by camera
+        __source: The FrameSource frames are read from
+        __opened: Whether the source was opened
         __frame_size: Frame Size (height, width) of camera
         __fps: Frames per Seconds of camera
-        __record_file: Store OpenCV VideoWriter object to save video
+        __record_file: Store OpenCV VideoWriter, or the writer of the
+                       RECORD_BACKEND, to save video
+        __texts: Cache of rendered timestamps
     """
 
-    def __init__(self, camid: int = 0) -> None:
+    def __init__(self, camid: int = 0, source: Optional[FrameSource] = None) -> None:
         self.__id = camid
-        self.__cap = None
+        self.__source = source if source is not None else DeviceSource(camid)
+        self.__opened = False
         self.__frame_size = (None, None)
         self.__fps = None
         self.__record_file = None
-
-    def __set_frame_size(self, width: int, height: int) -> None:
-        """
-        Sets the frame size of the camera.
-
-        Args:
-            height (int): The height of the frame. Defaults to 480.
-            width (int): The width of the frame. Defaults to 640.
-
-        """
-        self.__cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
-        self.__cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
-        self.__frame_size = (width, height)
-
-    def __set_fps(self, fps: int) -> None:
-        """
-        Gets the fps of the camera.
-
-        Args:
-            fps (int): The fps of the camera.
-
-        """
-
-        self.__cap.set(cv2.CAP_PROP_FPS, fps)
-        self.__fps = fps
+        self.__texts = TextCache()
 
     def get_frame_size(self) -> Tuple[int]:
         """
@@ -70,8 +57,7 @@ class Camera:
             The frame size of the camera.
 
         """
-        height = self.__cap.get(cv2.CAP_PROP_FRAME_HEIGHT)
-        width = self.__cap.get(cv2.CAP_PROP_FRAME_WIDTH)
+        width, height = self.__source.get_frame_size()
         self.__frame_size = (int(width), int(height))  # update camera settings
         return self.__frame_size
 
@@ -83,10 +69,20 @@ class Camera:
             The fps of the camera.
 
         """
-        fps = self.__cap.get(cv2.CAP_PROP_FPS)
+        fps = self.__source.get_fps()
         self.__fps = fps  # update camera settings
         return self.__fps
 
+    def get_dropped_frames(self) -> int:
+        """
+        Gets the number of frames skipped to keep up with the camera.
+
+        Returns:
+            The number of frames dropped.
+
+        """
+        return self.__source.get_dropped_frames()
+
     def start(self, fps: int = FPS, frame_size: tuple = (WIDTH, HEIGHT)) -> None:
         """
         Start the camera.
@@ -97,26 +93,30 @@ class Camera:
                                           Defaults to (640, 480).
 
         """
-        self.__cap = cv2.VideoCapture(self.__id)
+        self.__opened = self.__source.open(fps, frame_size)
 
-        if not self.__cap.isOpened():
+        if not self.__opened:
             print(f"Cannot open camera {self.__id}.")
         else:
             print("Camera started. Setting frame size and fps.")
-            self.__set_frame_size(*frame_size)
-            self.__set_fps(fps)
+            self.__frame_size = self.__source.get_frame_size()
+            self.__fps = self.__source.get_fps()
 
     def end(self) -> None:
         """
         End the camera.
 
         """
-        if self.__cap:
-            self.__cap.release()
+        if self.__opened:
+            self.__source.close()
+            self.__opened = False
             print("Camera closed.")
         else:
             print(f"Camera {self.__id} not opened")
-        cv2.destroyAllWindows()
+        try:
+            cv2.destroyAllWindows()
+        except cv2.error:
+            pass  # headless OpenCV builds have no windows to destroy
 
     def read_frame(self, current_time: str = "") -> List[List]:
         """
@@ -129,18 +129,14 @@ class Camera:
             The .
 
         """
-        ret, frame = self.__cap.read()
-        frame = cv2.putText(
-            frame,  # put current datetime at top left of frame
-            text=current_time,
-            org=(10, 15),
-            fontFace=cv2.FONT_HERSHEY_COMPLEX_SMALL,
-            fontScale=0.8,
-            color=(0, 0, 255),
-        )
-        if not ret:
+        with timer.stage("capture"):
+            frame = self.__source.read()
+        if frame is None:
             print(f"Can't receive frame from {self.__id}. Exiting ...")
             return None
+        with timer.stage("overlay"):
+            # put current datetime at top left of frame, rendered once per text
+            self.__texts.draw(frame, current_time, TIME_ORIGIN)
         return frame
 
     def start_record_video(self, name: str = "video") -> None:
@@ -155,10 +151,15 @@ class Camera:
         cam_fps = self.get_fps()
         cam_size = self.get_frame_size()
 
-        fourcc = cv2.VideoWriter_fourcc(*CODEC)
         filename = f"{name}.{VID_FORMAT}"
         print("start recording", filename)
-        self.__record_file = cv2.VideoWriter(filename, fourcc, cam_fps, cam_size, True)
+        if select_record_backend() == "ffmpeg":
+            self.__record_file = FfmpegWriter(filename, cam_fps, cam_size)
+        else:
+            fourcc = cv2.VideoWriter_fourcc(*CODEC)
+            self.__record_file = cv2.VideoWriter(
+                filename, fourcc, cam_fps, cam_size, True
+            )
 
     def end_record_video(self) -> None:
         """
@@ -0,0 +1,283 @@
+import os
+import threading
+from typing import Optional
+
+import cv2
+import numpy as np
+from dotenv import load_dotenv
+
+from app.backends import JPEG_BACKEND, JPEG_BACKENDS, select_jpeg_backend
+from app.timing import timer
+
+load_dotenv()
+# stream encoding
+JPEG_QUALITY = int(os.getenv("JPEG_QUALITY", 95))
+JPEG_OPTIMIZE = bool(int(os.getenv("JPEG_OPTIMIZE", 0)))
+JPEG_PROGRESSIVE = bool(int(os.getenv("JPEG_PROGRESSIVE", 0)))
+
+PART_HEADER = b"--frame\r\nContent-Type: image/jpeg\r\n\r\n"
+PART_FOOTER = b"\r\n"
+
+
+class JpegEncoder:
+    """
+    Encodes frames to JPEG with fixed settings.
+
+    Args:
+        quality: JPEG quality from 0 to 100.
+        optimize: Whether to optimise the Huffman tables.
+        progressive: Whether to write progressive JPEGs.
+        backend: The JPEG library: "opencv", "turbojpeg", "simplejpeg", or
+                 "auto" for the fastest one installed that supports the
+                 settings.
+
+    Attributes:
+        __quality: JPEG quality from 0 to 100
+        __optimize: Whether to optimise the Huffman tables
+        __progressive: Whether to write progressive JPEGs
+        __backend_name: The name of the JPEG library used
+        __backend: The JpegBackend encoding the frames
+        __variants: Encoders with the same settings at other qualities
+    """
+
+    def __init__(
+        self,
+        quality: int = JPEG_QUALITY,
+        optimize: bool = JPEG_OPTIMIZE,
+        progressive: bool = JPEG_PROGRESSIVE,
+        backend: str = JPEG_BACKEND,
+    ) -> None:
+        self.__quality = int(quality)
+        self.__optimize = optimize
+        self.__progressive = progressive
+        self.__variants = {}
+        self.__backend_name = select_jpeg_backend(backend, optimize, progressive)
+        self.__backend = JPEG_BACKENDS[self.__backend_name](
+            quality, optimize, progressive
+        )
+
+    def get_quality(self) -> int:
+        """
+        Gets the JPEG quality.
+
+        Returns:
+            The JPEG quality from 0 to 100.
+
+        """
+        return self.__quality
+
+    def with_quality(self, quality: int) -> "JpegEncoder":
+        """
+        Gets an encoder with the same settings at another quality.
+
+        Args:
+            quality (int): JPEG quality from 0 to 100.
+
+        Returns:
+            This encoder for its own quality, otherwise a cached encoder.
+
+        """
+        quality = int(quality)
+        if quality == self.__quality:
+            return self
+        encoder = self.__variants.get(quality)
+        if encoder is None:
+            encoder = JpegEncoder(
+                quality, self.__optimize, self.__progressive, self.__backend_name
+            )
+            self.__variants[quality] = encoder
+        return encoder
+
+    def get_backend(self) -> str:
+        """
+        Gets the JPEG library used.
+
+        Returns:
+            The backend name.
+
+        """
+        return self.__backend_name
+
+    def encode(self, frame: np.ndarray) -> Optional[bytes]:
+        """
+        Encode a frame to JPEG.
+
+        Args:
+            frame (np.ndarray): The frame to encode.
+
+        Returns:
+            The JPEG bytes, or None if encoding failed.
+
+        """
+        with timer.stage("encode"):
+            jpeg = self.__backend.encode(frame)
+        if jpeg is None:
+            print("Something is wrong with the frames or camera")
+        return jpeg
+
+    def encode_part(self, frame: np.ndarray) -> Optional[bytes]:
+        """
+        Encode a frame to a complete multipart/x-mixed-replace chunk.
+
+        Args:
+            frame (np.ndarray): The frame to encode.
+
+        Returns:
+            The multipart chunk, or None if encoding failed.
+
+        """
+        jpeg = self.encode(frame)
+        if jpeg is None:
+            return None
+        return b"".join((PART_HEADER, jpeg, PART_FOOTER))
+
+
+class EncodedFrame:
+    """
+    A captured frame shared by every stream client, JPEG encoded at most once.
+
+    The first client asking for the multipart chunk encodes it; every other
+    client receives the same immutable bytes object. Clients asking for a
+    smaller or lower quality variant share it the same way: each variant is
+    resized and encoded once.
+
+    Args:
+        frame: The captured frame.
+        encoder: The encoder used to build the multipart chunk.
+        jpeg: The JPEG of the frame when it was already encoded elsewhere,
+              such as in a camera worker process.
+        width: The width of the frame when only its JPEG is given, so the
+               full size variant is the JPEG itself.
+
+    Attributes:
+        __frame: The captured frame
+        __encoder: The JpegEncoder for the multipart chunk
+        __width: The width of the frame, or None if unknown
+        __lock: Lock so concurrent clients encode only once
+        __part: The cached multipart chunk
+        __encoded: Whether encoding has been attempted
+        __variants: Cached multipart chunks by (width, quality)
+    """
+
+    def __init__(
+        self,
+        frame: Optional[np.ndarray],
+        encoder: Optional[JpegEncoder],
+        jpeg: Optional[bytes] = None,
+        width: Optional[int] = None,
+    ) -> None:
+        self.__frame = frame
+        self.__encoder = encoder
+        self.__width = frame.shape[1] if frame is not None else width
+        self.__lock = threading.Lock()
+        self.__part = None
+        self.__encoded = False
+        self.__variants = {}
+        if jpeg is not None:
+            self.__part = b"".join((PART_HEADER, jpeg, PART_FOOTER))
+            self.__encoded = True
+
+    def get_frame(self) -> np.ndarray:
+        """
+        Gets the captured frame.
+
+        Returns:
+            The captured frame.
+
+        """
+        return self.__frame
+
+    def get_jpeg(self) -> Optional[memoryview]:
+        """
+        Gets the JPEG inside the multipart chunk, without copying it.
+
+        Returns:
+            A view of the JPEG bytes, or None if encoding failed.
+
+        """
+        part = self.get_part()
+        if part is None:
+            return None
+        return memoryview(part)[len(PART_HEADER) : len(part) - len(PART_FOOTER)]
+
+    def get_part(self) -> Optional[bytes]:
+        """
+        Gets the multipart chunk, encoding the frame on first use.
+
+        Returns:
+            The cached multipart chunk, or None if encoding failed.
+
+        """
+        if not self.__encoded:
+            with self.__lock:
+                if not self.__encoded:
+                    self.__part = self.__encoder.encode_part(self.__frame)
+                    self.__encoded = True
+        return self.__part
+
+    def get_variant(
+        self, width: Optional[int] = None, quality: Optional[int] = None
+    ) -> Optional[bytes]:
+        """
+        Gets the multipart chunk of the frame resized to a width, keeping its
+        aspect ratio, and encoded at a quality. Each variant is produced on
+        first use and shared by every client asking for it.
+
+        Args:
+            width (int, optional): The width to resize to. Defaults to the
+                                   frame width; frames are never enlarged.
+            quality (int, optional): The JPEG quality. Defaults to the
+                                     encoder quality.
+
+        Returns:
+            The cached multipart chunk, or None if encoding failed.
+
+        """
+        if width is not None and self.__width is not None and width >= self.__width:
+            width = None
+        if self.__encoder is not None and quality == self.__encoder.get_quality():
+            quality = None
+        if width is None and quality is None:
+            return self.get_part()
+
+        key = (width, quality)
+        part = self.__variants.get(key)
+        if part is None:
+            with self.__lock:
+                part = self.__variants.get(key)
+                if part is None:
+                    part = self.__encode_variant(width, quality)
+                    self.__variants[key] = part
+        return part or None
+
+    def __encode_variant(self, width: Optional[int], quality: Optional[int]) -> bytes:
+        """
+        Resize and encode a variant of the frame.
+
+        Args:
+            width (int): The width to resize to, or None to keep it.
+            quality (int): The JPEG quality, or None for the encoder's.
+
+        Returns:
+            The multipart chunk, or b"" if encoding failed.
+
+        """
+        frame = self.__frame
+        if frame is None:
+            # only the JPEG was given, such as from a camera worker process
+            part = self.__part
+            if part is None:
+                return b""
+            jpeg = np.frombuffer(part, np.uint8)[len(PART_HEADER) : -len(PART_FOOTER)]
+            frame = cv2.imdecode(jpeg, cv2.IMREAD_COLOR)
+            if frame is None:
+                return b""
+        height, frame_width = frame.shape[:2]
+        if width is not None and width < frame_width:
+            size = (int(width), max(int(round(height * width / frame_width)), 1))
+            with timer.stage("resize"):
+                frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+        encoder = self.__encoder or JpegEncoder()
+        if quality is not None:
+            encoder = encoder.with_quality(quality)
+        return encoder.encode_part(frame) or b""
@@ -0,0 +1,264 @@
+from abc import ABC, abstractmethod
+from typing import Dict, Optional, Type
+
+import cv2
+import numpy as np
+
+# pairs of frames differenced at a time by stack_similarity
+STACK_CHUNK_SIZE = 64
+
+
+def difference_score(
+    difference: np.ndarray, mask: Optional[np.ndarray] = None
+) -> float:
+    """
+    Calculates the similarity score from the uint8 difference of two images,
+    without converting the difference to floats.
+
+    The score is 100 minus the mean difference as a percentage of 255,
+    computed from the integer sum of the difference.
+
+    Args:
+        difference: The absolute difference of two images.
+        mask: Only pixels where the mask is non-zero are scored.
+
+    Returns:
+        The similarity score between the two images.
+
+    """
+    if mask is not None:
+        mean_difference = cv2.mean(difference, mask)[0] / 255
+        return round(100 - (mean_difference * 100), 2)
+    total = sum(cv2.sumElems(difference))
+    mean_difference = total / (255 * difference.size)
+    img_similarity = round(100 - (mean_difference * 100), 2)
+    return img_similarity
+
+
+def stack_similarity(
+    stack: np.ndarray,
+    lag: int = 1,
+    mask: Optional[np.ndarray] = None,
+    chunk_size: int = STACK_CHUNK_SIZE,
+) -> np.ndarray:
+    """
+    Calculates the similarity score of every frame of a stack with the frame
+    lag frames before it, in vectorized passes over chunks of frames.
+
+    Scores match difference_score on each pair of frames. A chunk of frames
+    is differenced with one cv2.absdiff over the chunk viewed as a single
+    tall image, masked with one bitwise_and, and summed per frame with one
+    cv2.reduce in integers, so there is no Python work per frame. At most
+    chunk_size pairs of frames are differenced at a time, so memory stays
+    bounded however long the stack.
+
+    Args:
+        stack: (T, H, W) uint8 stack of preprocessed frames.
+        lag: Number of frames between the frames compared.
+        mask: Only pixels where the mask is non-zero are scored.
+        chunk_size: Number of pairs of frames differenced at a time.
+
+    Returns:
+        The T - lag similarity scores, of frames lag to T - 1.
+
+    """
+    pairs = len(stack) - lag
+    if pairs <= 0:
+        return np.empty(0)
+    height, width = stack.shape[1:]
+    chunk_size = min(chunk_size, pairs)
+    difference = np.empty((chunk_size * height, width), np.uint8)
+    if mask is not None:
+        pixels = cv2.countNonZero(mask)
+        mask = np.tile(np.where(mask != 0, 255, 0).astype(np.uint8), (chunk_size, 1))
+    else:
+        pixels = height * width
+    # integer sums are exact and fast while they fit in 32 bits
+    depth = cv2.CV_32S if 255 * height * width < 2**31 else cv2.CV_64F
+
+    totals = np.empty(pairs)
+    for start in range(0, pairs, chunk_size):
+        stop = min(start + chunk_size, pairs)
+        rows = (stop - start) * height
+        earlier = np.ascontiguousarray(stack[start:stop]).reshape(rows, width)
+        later = np.ascontiguousarray(stack[start + lag : stop + lag])
+        chunk = difference[:rows]
+        cv2.absdiff(earlier, later.reshape(rows, width), chunk)
+        if mask is not None:
+            cv2.bitwise_and(chunk, mask[:rows], chunk)
+        sums = cv2.reduce(
+            chunk.reshape(stop - start, -1), 1, cv2.REDUCE_SUM, dtype=depth
+        )
+        totals[start:stop] = sums[:, 0]
+    return np.round(100 - totals / (255 * max(pixels, 1)) * 100, 2)
+
+
+class MotionEngine(ABC):
+    """
+    Base class for motion detection engines used by Detector.update.
+
+    An engine receives preprocessed grayscale frames one at a time and
+    returns a similarity score from 0 to 100, where 100 means no motion.
+    Engines must update their state in O(pixels) per frame. The frame given
+    to update stays unchanged until the update after next, so an engine may
+    keep a reference to it instead of copying it.
+    """
+
+    @abstractmethod
+    def update(self, image: np.ndarray, mask: Optional[np.ndarray] = None) -> float:
+        """
+        Score a new frame and update the engine state with it.
+
+        Args:
+            image: The preprocessed grayscale frame.
+            mask: Only pixels where the mask is non-zero are scored.
+
+        Returns:
+            The similarity score, 100.0 while the engine has no history.
+
+        """
+
+    @abstractmethod
+    def reset(self) -> None:
+        """
+        Forget the frames seen so far.
+
+        """
+
+
+class FrameDifferenceEngine(MotionEngine):
+    """
+    Compares each frame with the previous one.
+
+    Attributes:
+        __reference: The previous frame, or None
+        __difference: Reused buffer for the difference of the two frames
+    """
+
+    def __init__(self) -> None:
+        self.__reference = None
+        self.__difference = None
+
+    def update(self, image: np.ndarray, mask: Optional[np.ndarray] = None) -> float:
+        reference, self.__reference = self.__reference, image
+        if reference is None or reference.shape != image.shape:
+            return 100.0
+
+        if self.__difference is None or self.__difference.shape != image.shape:
+            self.__difference = np.empty_like(image)
+        cv2.absdiff(reference, image, self.__difference)
+        return difference_score(self.__difference, mask)
+
+    def reset(self) -> None:
+        self.__reference = None
+
+
+class RunningAverageEngine(MotionEngine):
+    """
+    Compares each frame with an exponential running average of the frames
+    before it, so slow changes such as lighting are absorbed into the
+    background while moving objects stand out.
+
+    Args:
+        alpha: Weight of the new frame in the running average.
+
+    Attributes:
+        __alpha: Weight of the new frame in the running average
+        __background: The float32 running average, or None
+        __background_u8: Reused uint8 copy of the running average
+        __difference: Reused buffer for the difference with the background
+    """
+
+    def __init__(self, alpha: float = 0.05) -> None:
+        self.__alpha = alpha
+        self.__background = None
+        self.__background_u8 = None
+        self.__difference = None
+
+    def update(self, image: np.ndarray, mask: Optional[np.ndarray] = None) -> float:
+        if self.__background is None or self.__background.shape != image.shape:
+            self.__background = image.astype(np.float32)
+            self.__background_u8 = np.empty_like(image)
+            self.__difference = np.empty_like(image)
+            return 100.0
+
+        cv2.convertScaleAbs(self.__background, self.__background_u8)
+        cv2.absdiff(self.__background_u8, image, self.__difference)
+        score = difference_score(self.__difference, mask)
+        cv2.accumulateWeighted(image, self.__background, self.__alpha)
+        return score
+
+    def reset(self) -> None:
+        self.__background = None
+
+
+class Mog2Engine(MotionEngine):
+    """
+    Scores frames by the share of pixels an OpenCV MOG2 background
+    subtractor marks as foreground.
+
+    Args:
+        history: Number of frames the background model remembers.
+        var_threshold: Squared distance for a pixel to count as foreground.
+
+    Attributes:
+        __history: Number of frames the background model remembers
+        __var_threshold: Squared distance for a pixel to be foreground
+        __subtractor: The OpenCV background subtractor
+        __foreground: Reused foreground mask buffer
+        __seen: Whether the model has seen a frame
+    """
+
+    def __init__(self, history: int = 500, var_threshold: float = 16) -> None:
+        self.__history = history
+        self.__var_threshold = var_threshold
+        self.reset()
+
+    def update(self, image: np.ndarray, mask: Optional[np.ndarray] = None) -> float:
+        if self.__foreground is None or self.__foreground.shape != image.shape:
+            self.__foreground = np.empty_like(image)
+        self.__subtractor.apply(image, self.__foreground)
+        if not self.__seen:
+            self.__seen = True
+            return 100.0
+
+        if mask is not None:
+            cv2.bitwise_and(self.__foreground, mask, self.__foreground)
+            pixels = cv2.countNonZero(mask)
+        else:
+            pixels = self.__foreground.size
+        moving = cv2.countNonZero(self.__foreground)
+        return round(100 - (moving * 100 / max(pixels, 1)), 2)
+
+    def reset(self) -> None:
+        self.__subtractor = cv2.createBackgroundSubtractorMOG2(
+            history=self.__history,
+            varThreshold=self.__var_threshold,
+            detectShadows=False,
+        )
+        self.__foreground = None
+        self.__seen = False
+
+
+ENGINES: Dict[str, Type[MotionEngine]] = {
+    "difference": FrameDifferenceEngine,
+    "average": RunningAverageEngine,
+    "mog2": Mog2Engine,
+}
+
+
+def create_engine(name: str, **kwargs) -> MotionEngine:
+    """
+    Create a motion engine by name.
+
+    Args:
+        name (str): One of "difference", "average" or "mog2".
+        **kwargs: Arguments for the engine.
+
+    Returns:
+        The motion engine.
+
+    """
+    if name not in ENGINES:
+        raise ValueError(f"Unknown motion engine {name!r}, use one of {list(ENGINES)}")
+    return ENGINES[name](**kwargs)
@@ -0,0 +1,277 @@
+import os
+import sqlite3
+import threading
+from typing import List, NamedTuple, Optional, Tuple
+
+from dotenv import load_dotenv
+
+load_dotenv()
+# event store, kept out of the directory recordings are served from
+EVENT_DB = os.getenv("EVENT_DB", "events.db")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY,
+    camera TEXT NOT NULL,
+    start_time REAL NOT NULL,
+    end_time REAL NOT NULL,
+    peak_score REAL,
+    min_score REAL,
+    path TEXT,
+    size INTEGER,
+    frames INTEGER
+);
+CREATE INDEX IF NOT EXISTS events_start ON events (start_time);
+CREATE INDEX IF NOT EXISTS events_camera_start ON events (camera, start_time);
+"""
+
+COLUMNS = "id, camera, start_time, end_time, peak_score, min_score, path, size, frames"
+
+
+class MotionEvent(NamedTuple):
+    """
+    A motion event and the video recorded for it. Times are Unix timestamps
+    in seconds; scores are the similarity scores seen during the event, the
+    lowest being the most motion.
+    """
+
+    camera: str
+    start: float
+    end: float
+    peak_score: Optional[float] = None
+    min_score: Optional[float] = None
+    path: Optional[str] = None
+    size: Optional[int] = None
+    frames: Optional[int] = None
+    id: Optional[int] = None
+
+
+class EventStore:
+    """
+    An index of motion events in SQLite, so recordings can be found by time
+    and camera without listing and parsing video file names.
+
+    Events are indexed by start time, and by camera and start time, so a
+    query for a time range reads only the matching rows even with hundreds
+    of thousands of events. The database is in WAL mode, so the pipelines of
+    several cameras, in threads or worker processes, can add events while
+    the web server queries them.
+
+    Args:
+        path: The database file, created if missing. ":memory:" keeps the
+              events in memory.
+
+    Attributes:
+        __path: The database file
+        __lock: Lock serialising use of the connection across threads
+        __conn: The SQLite connection
+    """
+
+    def __init__(self, path: str = EVENT_DB) -> None:
+        self.__path = path
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.__lock = threading.Lock()
+        self.__conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        with self.__lock:
+            self.__conn.execute("PRAGMA journal_mode=WAL")
+            self.__conn.execute("PRAGMA synchronous=NORMAL")
+            self.__conn.executescript(SCHEMA)
+
+    def get_path(self) -> str:
+        """
+        Gets the database file.
+
+        Returns:
+            The database file.
+
+        """
+        return self.__path
+
+    def add(self, event: MotionEvent) -> int:
+        """
+        Add a motion event.
+
+        Args:
+            event (MotionEvent): The event. Its id is ignored.
+
+        Returns:
+            The id of the event.
+
+        """
+        return self.add_many([event])[0]
+
+    def add_many(self, events: List[MotionEvent]) -> List[int]:
+        """
+        Add motion events in one transaction.
+
+        Args:
+            events (list): The events. Their ids are ignored.
+
+        Returns:
+            The ids of the events, in order.
+
+        """
+        ids = []
+        with self.__lock, self.__conn:
+            for event in events:
+                cursor = self.__conn.execute(
+                    "INSERT INTO events (camera, start_time, end_time, peak_score, "
+                    "min_score, path, size, frames) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    tuple(event[:8]),
+                )
+                ids.append(cursor.lastrowid)
+        return ids
+
+    def query(
+        self,
+        start: Optional[float] = None,
+        end: Optional[float] = None,
+        camera: Optional[str] = None,
+        limit: int = 100,
+        offset: int = 0,
+    ) -> List[MotionEvent]:
+        """
+        Find the events starting in a time range, newest first.
+
+        Args:
+            start (float, optional): Earliest start time, inclusive.
+            end (float, optional): Latest start time, exclusive.
+            camera (str, optional): Only events of this camera.
+            limit (int, optional): Maximum number of events.
+            offset (int, optional): Number of matching events to skip.
+
+        Returns:
+            The events.
+
+        """
+        where, args = self.__where(start, end, camera)
+        sql = (
+            f"SELECT {COLUMNS} FROM events{where} "
+            "ORDER BY start_time DESC LIMIT ? OFFSET ?"
+        )
+        with self.__lock:
+            rows = self.__conn.execute(sql, args + [limit, offset]).fetchall()
+        return [_to_event(row) for row in rows]
+
+    def count(
+        self,
+        start: Optional[float] = None,
+        end: Optional[float] = None,
+        camera: Optional[str] = None,
+    ) -> int:
+        """
+        Count the events starting in a time range.
+
+        Args:
+            start (float, optional): Earliest start time, inclusive.
+            end (float, optional): Latest start time, exclusive.
+            camera (str, optional): Only events of this camera.
+
+        Returns:
+            The number of events.
+
+        """
+        where, args = self.__where(start, end, camera)
+        with self.__lock:
+            row = self.__conn.execute(
+                f"SELECT COUNT(*) FROM events{where}", args
+            ).fetchone()
+        return row[0]
+
+    def get(self, event_id: int) -> Optional[MotionEvent]:
+        """
+        Gets an event by id.
+
+        Args:
+            event_id (int): The id of the event.
+
+        Returns:
+            The event, or None if there is none with this id.
+
+        """
+        with self.__lock:
+            row = self.__conn.execute(
+                f"SELECT {COLUMNS} FROM events WHERE id = ?", (event_id,)
+            ).fetchone()
+        return _to_event(row) if row is not None else None
+
+    def explain(
+        self,
+        start: Optional[float] = None,
+        end: Optional[float] = None,
+        camera: Optional[str] = None,
+    ) -> str:
+        """
+        Describe how SQLite runs a query, to check it uses an index.
+
+        Args:
+            start (float, optional): Earliest start time, inclusive.
+            end (float, optional): Latest start time, exclusive.
+            camera (str, optional): Only events of this camera.
+
+        Returns:
+            The query plan.
+
+        """
+        where, args = self.__where(start, end, camera)
+        sql = (
+            f"EXPLAIN QUERY PLAN SELECT {COLUMNS} FROM events{where} "
+            "ORDER BY start_time DESC"
+        )
+        with self.__lock:
+            rows = self.__conn.execute(sql, args).fetchall()
+        return "\n".join(row[-1] for row in rows)
+
+    def close(self) -> None:
+        """
+        Close the database.
+
+        """
+        with self.__lock:
+            self.__conn.close()
+
+    @staticmethod
+    def __where(
+        start: Optional[float], end: Optional[float], camera: Optional[str]
+    ) -> Tuple[str, List]:
+        """
+        Build the WHERE clause of a query.
+
+        Args:
+            start (float): Earliest start time, or None.
+            end (float): Latest start time, or None.
+            camera (str): The camera, or None.
+
+        Returns:
+            The clause, empty without conditions, and its arguments.
+
+        """
+        conditions, args = [], []
+        if camera is not None:
+            conditions.append("camera = ?")
+            args.append(camera)
+        if start is not None:
+            conditions.append("start_time >= ?")
+            args.append(start)
+        if end is not None:
+            conditions.append("start_time < ?")
+            args.append(end)
+        if not conditions:
+            return "", args
+        return " WHERE " + " AND ".join(conditions), args
+
+
+def _to_event(row: tuple) -> MotionEvent:
+    """
+    Convert a row of the events table to an event.
+
+    Args:
+        row (tuple): The columns, in the order of COLUMNS.
+
+    Returns:
+        The event.
+
+    """
+    event_id, *fields = row
+    return MotionEvent(*fields, id=event_id)
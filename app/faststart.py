@@ -0,0 +1,198 @@
+import os
+import struct
+from typing import List, Optional, Tuple
+
+# atoms holding the chunk offset tables, directly or nested
+CONTAINER_ATOMS = (b"moov", b"trak", b"mdia", b"minf", b"stbl")
+COPY_CHUNK_SIZE = 1 << 20
+
+Atom = Tuple[bytes, int, int]
+
+
+def faststart(path: str) -> bool:
+    """
+    Move the moov atom of an MP4 or MOV file in front of the media data, so
+    a browser can start playing and seeking before the whole file arrives.
+
+    Writers such as OpenCV's put the moov atom, the index of the media, at
+    the end of the file, since its size is only known once recording stops.
+    Moving it shifts the media data by the size of the moov atom, so every
+    chunk offset in its stco and co64 tables is shifted to match. The file
+    is rewritten next to the original and replaces it once complete.
+
+    Args:
+        path (str): The video file.
+
+    Returns:
+        True if the file was rewritten, False if it already starts with
+        its moov atom or cannot be rewritten.
+
+    """
+    with open(path, "rb") as file:
+        atoms = _read_atoms(file)
+        types = [atom_type for atom_type, _, _ in atoms]
+        if b"moov" not in types or b"mdat" not in types:
+            return False
+        moov_index = types.index(b"moov")
+        mdat_index = types.index(b"mdat")
+        if moov_index < mdat_index or b"mdat" in types[moov_index:]:
+            return False  # already fast, or media data on both sides
+
+        _, moov_offset, moov_size = atoms[moov_index]
+        file.seek(moov_offset)
+        moov = bytearray(file.read(moov_size))
+        header = _header_size(moov, 0)
+        if not _shift_chunk_offsets(moov, header, len(moov), moov_size):
+            return False  # malformed, leave the file as it is
+
+        temp_path = f"{path}.faststart"
+        try:
+            with open(temp_path, "wb") as out:
+                for index, (atom_type, offset, size) in enumerate(atoms):
+                    if index == mdat_index:
+                        out.write(moov)
+                    if atom_type != b"moov":
+                        _copy(file, out, offset, size)
+            os.replace(temp_path, path)
+        except OSError:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+    return True
+
+
+def find_atom(path: str, atom_type: bytes) -> Optional[int]:
+    """
+    Gets the position of a top level atom in a file.
+
+    Args:
+        path (str): The video file.
+        atom_type (bytes): The atom type, such as b"moov".
+
+    Returns:
+        The offset of the first such atom, or None if there is none.
+
+    """
+    with open(path, "rb") as file:
+        for found, offset, _ in _read_atoms(file):
+            if found == atom_type:
+                return offset
+    return None
+
+
+def _read_atoms(file) -> List[Atom]:
+    """
+    List the top level atoms of a file.
+
+    Args:
+        file: The file, opened in binary mode.
+
+    Returns:
+        The (type, offset, size) of each atom, in order.
+
+    """
+    file.seek(0, os.SEEK_END)
+    end = file.tell()
+    atoms = []
+    offset = 0
+    while offset + 8 <= end:
+        file.seek(offset)
+        size, atom_type = struct.unpack(">I4s", file.read(8))
+        if size == 1:
+            (size,) = struct.unpack(">Q", file.read(8))
+        elif size == 0:
+            size = end - offset
+        if size < 8 or offset + size > end:
+            break  # truncated or not an MP4 file
+        atoms.append((atom_type, offset, size))
+        offset += size
+    return atoms
+
+
+def _header_size(data: bytearray, offset: int) -> int:
+    """
+    Gets the header size of an atom: 16 bytes with a 64 bit size, otherwise
+    8.
+
+    Args:
+        data (bytearray): The data holding the atom.
+        offset (int): Position of the atom.
+
+    Returns:
+        The header size.
+
+    """
+    (size,) = struct.unpack_from(">I", data, offset)
+    return 16 if size == 1 else 8
+
+
+def _shift_chunk_offsets(data: bytearray, start: int, end: int, shift: int) -> bool:
+    """
+    Add a shift to every chunk offset in the stco and co64 tables of the
+    atoms between two positions of a moov atom, in place.
+
+    Args:
+        data (bytearray): The moov atom.
+        start (int): Position of the first child atom.
+        end (int): Position after the last child atom.
+        shift (int): Bytes the media data moves by.
+
+    Returns:
+        False if an atom or table is malformed or a 32 bit offset would
+        overflow.
+
+    """
+    offset = start
+    while offset + 8 <= end:
+        size, atom_type = struct.unpack_from(">I4s", data, offset)
+        header = _header_size(data, offset)
+        if size == 1:
+            if offset + 16 > end:
+                return False
+            (size,) = struct.unpack_from(">Q", data, offset + 8)
+        elif size == 0:
+            size = end - offset  # up to the end of its parent
+        if size < header or offset + size > end:
+            return False
+        if atom_type in CONTAINER_ATOMS:
+            if not _shift_chunk_offsets(data, offset + header, offset + size, shift):
+                return False
+        elif atom_type in (b"stco", b"co64"):
+            fmt = ">I" if atom_type == b"stco" else ">Q"
+            width = struct.calcsize(fmt)
+            if size < header + 8:
+                return False
+            # version and flags, then the entry count
+            (count,) = struct.unpack_from(">I", data, offset + header + 4)
+            table = offset + header + 8
+            if table + count * width > offset + size:
+                return False
+            for entry in range(table, table + count * width, width):
+                (value,) = struct.unpack_from(fmt, data, entry)
+                value += shift
+                if atom_type == b"stco" and value > 0xFFFFFFFF:
+                    return False
+                struct.pack_into(fmt, data, entry, value)
+        offset += size
+    return offset == end
+
+
+def _copy(source, target, offset: int, size: int) -> None:
+    """
+    Copy a range of one file to another in chunks.
+
+    Args:
+        source: The file to copy from.
+        target: The file to append to.
+        offset (int): Position of the range in the source.
+        size (int): Length of the range.
+
+    """
+    source.seek(offset)
+    remaining = size
+    while remaining:
+        chunk = source.read(min(COPY_CHUNK_SIZE, remaining))
+        if not chunk:
+            break
+        target.write(chunk)
+        remaining -= len(chunk)
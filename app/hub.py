@@ -0,0 +1,164 @@
+import asyncio
+import threading
+from typing import Any, AsyncIterator, Dict, Iterator, Optional, Tuple
+
+
+class FrameHub:
+    """
+    Broadcasts the latest frame from one producer to any number of
+    subscribers.
+
+    The hub only ever holds the newest item. Subscribers that are slower than
+    the producer skip the frames they missed instead of queueing them, so the
+    producer never waits on a client.
+
+    Subscribers can be threads (subscribe) or asyncio tasks (subscribe_async).
+    Async subscribers on the same event loop share one future per frame, so
+    the producer thread wakes each loop once however many clients it serves.
+
+    Attributes:
+        __cond: Condition guarding the latest item and notifying subscribers
+        __seq: Sequence number of the latest item (0 means nothing published)
+        __item: The latest published item
+        __closed: Whether the producer has finished
+        __waiters: Future per event loop resolved on the next publish or close
+    """
+
+    def __init__(self) -> None:
+        self.__cond = threading.Condition()
+        self.__seq = 0
+        self.__item = None
+        self.__closed = False
+        self.__waiters: Dict[asyncio.AbstractEventLoop, asyncio.Future] = {}
+
+    def publish(self, item: Any) -> None:
+        """
+        Replace the latest item and wake up every waiting subscriber.
+
+        Args:
+            item: The item to broadcast.
+
+        """
+        with self.__cond:
+            self.__seq += 1
+            self.__item = item
+            self.__cond.notify_all()
+            waiters, self.__waiters = self.__waiters, {}
+        self.__wake(waiters)
+
+    def close(self) -> None:
+        """
+        Mark the hub as finished so subscribers stop once they are up to date.
+
+        """
+        with self.__cond:
+            self.__closed = True
+            self.__cond.notify_all()
+            waiters, self.__waiters = self.__waiters, {}
+        self.__wake(waiters)
+
+    @staticmethod
+    def __wake(waiters: Dict[asyncio.AbstractEventLoop, asyncio.Future]) -> None:
+        """
+        Resolve the pending future of every event loop from any thread.
+
+        Args:
+            waiters: The futures to resolve, keyed by their event loop.
+
+        """
+        for loop, future in waiters.items():
+            try:
+                loop.call_soon_threadsafe(FrameHub.__resolve, future)
+            except RuntimeError:  # event loop already closed
+                pass
+
+    @staticmethod
+    def __resolve(future: asyncio.Future) -> None:
+        """
+        Resolve a future on its own event loop.
+
+        Args:
+            future: The future to resolve.
+
+        """
+        if not future.done():
+            future.set_result(None)
+
+    def is_closed(self) -> bool:
+        """
+        Check whether the producer has finished.
+
+        Returns:
+            True if the hub has been closed.
+
+        """
+        return self.__closed
+
+    def wait(
+        self, last_seq: int = 0, timeout: Optional[float] = None
+    ) -> Tuple[int, Any]:
+        """
+        Block until an item newer than last_seq is published.
+
+        Args:
+            last_seq (int, optional): Sequence number the caller already has.
+                                      Defaults to 0.
+            timeout (float, optional): Maximum seconds to wait.
+                                       Defaults to waiting forever.
+
+        Returns:
+            The (sequence number, item) pair, or (last_seq, None) if the hub
+            closed or the timeout expired without a newer item.
+
+        """
+        with self.__cond:
+            self.__cond.wait_for(
+                lambda: self.__seq != last_seq or self.__closed, timeout
+            )
+            if self.__seq == last_seq:
+                return last_seq, None
+            return self.__seq, self.__item
+
+    def subscribe(self) -> Iterator[Any]:
+        """
+        Iterate over published items until the hub is closed.
+
+        Yields:
+            The latest item each time a new one is available.
+
+        """
+        seq = 0
+        while True:
+            seq, item = self.wait(seq)
+            if item is None:
+                return
+            yield item
+
+    async def subscribe_async(self) -> AsyncIterator[Any]:
+        """
+        Asynchronously iterate over published items until the hub is closed,
+        without blocking the event loop.
+
+        Yields:
+            The latest item each time a new one is available.
+
+        """
+        loop = asyncio.get_running_loop()
+        seq = 0
+        while True:
+            with self.__cond:
+                if self.__seq != seq:
+                    seq, item = self.__seq, self.__item
+                    future = None
+                elif self.__closed:
+                    return
+                else:
+                    future = self.__waiters.get(loop)
+                    if future is None:
+                        future = loop.create_future()
+                        self.__waiters[loop] = future
+            if future is None:
+                yield item
+            else:
+                # shield so one cancelled client does not cancel the others
+                await asyncio.shield(future)
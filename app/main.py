@@ -1,25 +1,212 @@
 # importing the libraries
-from app.camera import Camera
-from app.motion import Detector
-from app.video import Streaming
+import mimetypes
+import os
+from datetime import datetime
+from typing import Optional
+
+from app.adaptive import StreamProfile
+from app.events import EVENT_DB, EventStore, MotionEvent
+from app.manager import CameraManager
+from app.metrics import metrics
+from app.playback import (
+    VID_DIR,
+    RangeNotSatisfiable,
+    etag_matches,
+    file_etag,
+    find_recording,
+    iter_file,
+    list_recordings,
+    parse_range,
+)
+from app.thumbnails import THUMBNAIL_KINDS, ThumbnailCache
 import uvicorn
-from fastapi import FastAPI
-from fastapi.responses import StreamingResponse
+from fastapi import Depends, FastAPI, HTTPException, Query, Request
+from fastapi.responses import (
+    FileResponse,
+    PlainTextResponse,
+    Response,
+    StreamingResponse,
+)
 
 app = FastAPI()
 
-webcam = Camera(camid=0)
-motion_detector = Detector()
-streaming = Streaming(camera=webcam, detector=motion_detector)
+thumbnails = ThumbnailCache()
+
+STREAM_MEDIA_TYPE = "multipart/x-mixed-replace; boundary=frame"
+
+
+@app.on_event("startup")
+def start_cameras():
+    # opened on startup rather than on import, one store for every camera
+    app.state.events = EventStore(EVENT_DB)
+    app.state.cameras = CameraManager.from_file(events=app.state.events)
+    app.state.cameras.start()
+
+
+@app.on_event("shutdown")
+def stop_cameras():
+    app.state.cameras.stop()
+    app.state.events.close()
+
+
+def get_cameras() -> CameraManager:
+    return app.state.cameras
+
+
+def get_events() -> EventStore:
+    return app.state.events
+
+
+def stream_profile(
+    fps: Optional[float] = Query(None, gt=0),
+    width: Optional[int] = Query(None, ge=16),
+    quality: Optional[int] = Query(None, ge=1, le=100),
+) -> StreamProfile:
+    return StreamProfile(fps=fps, width=width, quality=quality)
 
 
 @app.get("/stream")
-async def stream_video():
+async def stream_video(
+    profile: StreamProfile = Depends(stream_profile),
+    cameras: CameraManager = Depends(get_cameras),
+):
     return StreamingResponse(
-        streaming.start(),
-        media_type="multipart/x-mixed-replace; boundary=frame",
+        cameras.get_default().stream(profile),
+        media_type=STREAM_MEDIA_TYPE,
     )
 
 
+@app.get("/cameras")
+async def list_cameras(cameras: CameraManager = Depends(get_cameras)):
+    cameras_info = []
+    for camera_id in cameras.get_ids():
+        config = cameras.get(camera_id).get_config()
+        cameras_info.append(
+            {
+                "id": camera_id,
+                "mode": config["mode"],
+                "fps": config["fps"],
+                "frame_size": [config["width"], config["height"]],
+            }
+        )
+    return cameras_info
+
+
+@app.get("/cameras/{camera_id}/stream")
+async def stream_camera(
+    camera_id: str,
+    profile: StreamProfile = Depends(stream_profile),
+    cameras: CameraManager = Depends(get_cameras),
+):
+    try:
+        camera = cameras.get(camera_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unknown camera {camera_id}")
+    return StreamingResponse(camera.stream(profile), media_type=STREAM_MEDIA_TYPE)
+
+
+def event_info(event: MotionEvent) -> dict:
+    info = event._asdict()
+    info["start"] = datetime.fromtimestamp(event.start).isoformat()
+    info["end"] = datetime.fromtimestamp(event.end).isoformat()
+    if event.path:
+        url = f"/recordings/{os.path.basename(event.path)}"
+        info["url"] = url
+        info["thumbnail"] = f"{url}/thumbnail"
+        info["sprite"] = f"{url}/sprite"
+    return info
+
+
+@app.get("/events")
+def list_events(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    camera: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
+    events: EventStore = Depends(get_events),
+):
+    start_ts = start.timestamp() if start is not None else None
+    end_ts = end.timestamp() if end is not None else None
+    return {
+        "count": events.count(start_ts, end_ts, camera),
+        "events": [
+            event_info(event)
+            for event in events.query(start_ts, end_ts, camera, limit, offset)
+        ],
+    }
+
+
+@app.get("/events/{event_id}")
+def get_event(event_id: int, events: EventStore = Depends(get_events)):
+    event = events.get(event_id)
+    if event is None:
+        raise HTTPException(status_code=404, detail=f"Unknown event {event_id}")
+    return event_info(event)
+
+
+@app.get("/recordings")
+def recordings(camera: Optional[str] = None):
+    recordings_info = []
+    for recording in list_recordings(VID_DIR, camera=camera):
+        recording["modified"] = datetime.fromtimestamp(
+            recording["modified"]
+        ).isoformat()
+        recording["url"] = f"/recordings/{recording['name']}"
+        recording["thumbnail"] = f"{recording['url']}/thumbnail"
+        recordings_info.append(recording)
+    return {"recordings": recordings_info}
+
+
+@app.get("/recordings/{name}")
+def download_recording(name: str, request: Request):
+    path = find_recording(name, VID_DIR)
+    if path is None:
+        raise HTTPException(status_code=404, detail=f"Unknown recording {name}")
+    stat = os.stat(path)
+    etag = file_etag(stat)
+    headers = {"ETag": etag, "Accept-Ranges": "bytes"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    media_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+    try:
+        byte_range = parse_range(request.headers.get("range"), stat.st_size)
+    except RangeNotSatisfiable:
+        headers["Content-Range"] = f"bytes */{stat.st_size}"
+        return Response(status_code=416, headers=headers)
+    if byte_range is None:
+        return FileResponse(path, media_type=media_type, headers=headers)
+
+    start, end = byte_range
+    headers["Content-Range"] = f"bytes {start}-{end}/{stat.st_size}"
+    headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(
+        iter_file(path, start, end),
+        status_code=206,
+        media_type=media_type,
+        headers=headers,
+    )
+
+
+@app.get("/recordings/{name}/{kind}")
+def recording_thumbnail(name: str, kind: str):
+    path = find_recording(name, VID_DIR)
+    image = None
+    if path is not None and kind in THUMBNAIL_KINDS:
+        image = thumbnails.get(path, kind)
+    if image is None:
+        raise HTTPException(status_code=404, detail=f"No {kind} for {name}")
+    return Response(
+        image, media_type="image/jpeg", headers={"Cache-Control": "max-age=86400"}
+    )
+
+
+@app.get("/metrics")
+def export_metrics(cameras: CameraManager = Depends(get_cameras)):
+    cameras.collect_metrics()
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
 if __name__ == "__main__":
     uvicorn.run(app, host="127.0.0.1", port=8000)
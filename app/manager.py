@@ -0,0 +1,676 @@
+import json
+import multiprocessing
+import os
+import threading
+from typing import AsyncIterator, Callable, Dict, Iterator, List, Optional
+
+import cv2
+from dotenv import load_dotenv
+
+from app.adaptive import (
+    AdaptiveClient,
+    StreamProfile,
+    VariantRegistry,
+    deliver,
+    deliver_async,
+)
+from app.camera import Camera
+from app.encoder import EncodedFrame, JpegEncoder
+from app.events import EventStore
+from app.hub import FrameHub
+from app.metrics import metrics
+from app.motion import (
+    DETECT_EXCLUDE,
+    DETECT_REGIONS,
+    DETECT_SIZE,
+    MOTION_ENGINE,
+    Detector,
+)
+from app.shm import FrameRing
+from app.source import CAPTURE_MODE, SOURCE_PACING, create_source
+from app.video import IDLE_STREAM, Streaming
+
+load_dotenv()
+# cameras
+CAMERA_CONFIG = os.getenv("CAMERA_CONFIG", "cameras.json")
+WORKER_MODE = os.getenv("WORKER_MODE", "thread")
+
+# camera
+FPS = int(os.getenv("FPS"))
+WIDTH = int(os.getenv("WIDTH"))
+HEIGHT = int(os.getenv("HEIGHT"))
+
+WORKER_MODES = ("thread", "process")
+
+CameraFactory = Callable[[Dict], Camera]
+
+
+def load_config(path: str = CAMERA_CONFIG) -> List[Dict]:
+    """
+    Load the camera configurations from a JSON file of the form
+    {"cameras": [{"id": "front", "source": 0, "mode": "process"}, ...]}.
+
+    Every camera needs an id and a source: a device index, a stream URL, a
+    video file or "synthetic". mode, fps, width, height, engine, pacing,
+    capture and idle_stream default to the settings from .env. Without a
+    file, a single camera "0" is configured on device 0.
+
+    Args:
+        path (str, optional): The configuration file.
+
+    Returns:
+        The camera configurations.
+
+    """
+    cameras = [{"id": "0", "source": 0}]
+    if os.path.exists(path):
+        with open(path) as file:
+            cameras = json.load(file)["cameras"]
+
+    configs = []
+    for camera in cameras:
+        config = {
+            "mode": WORKER_MODE,
+            "fps": FPS,
+            "width": WIDTH,
+            "height": HEIGHT,
+            "engine": MOTION_ENGINE,
+            "pacing": SOURCE_PACING,
+            "capture": CAPTURE_MODE,
+            "idle_stream": IDLE_STREAM,
+        }
+        config.update(camera)
+        config["id"] = str(config["id"])
+        if config["mode"] not in WORKER_MODES:
+            raise ValueError(
+                f"Unknown mode {config['mode']!r} for camera {config['id']}, "
+                f"use one of {WORKER_MODES}"
+            )
+        configs.append(config)
+    return configs
+
+
+def create_camera(config: Dict) -> Camera:
+    """
+    Create the camera for a configuration.
+
+    Args:
+        config (dict): The camera configuration.
+
+    Returns:
+        The camera.
+
+    """
+    source = create_source(config["source"], config["pacing"], config["capture"])
+    return Camera(camid=config["source"], source=source)
+
+
+def create_detector(config: Dict) -> Detector:
+    """
+    Create the motion detector for a configuration.
+
+    Args:
+        config (dict): The camera configuration.
+
+    Returns:
+        The motion detector.
+
+    """
+    return Detector(
+        detect_size=DETECT_SIZE,
+        regions=DETECT_REGIONS,
+        exclusions=DETECT_EXCLUDE,
+        engine=config["engine"],
+    )
+
+
+def create_streaming(
+    config: Dict, camera_factory: CameraFactory, events: Optional[EventStore] = None
+) -> Streaming:
+    """
+    Create the capture and detection pipeline for a configuration.
+
+    Args:
+        config (dict): The camera configuration.
+        camera_factory (callable): Creates the camera from the configuration.
+        events (EventStore, optional): The index motion events are added
+                                       to, shared by the cameras.
+
+    Returns:
+        The Streaming object running the pipeline.
+
+    """
+    return Streaming(
+        camera_factory(config),
+        create_detector(config),
+        fps=config["fps"],
+        frame_size=(config["width"], config["height"]),
+        camera_id=config["id"],
+        events=events,
+        idle_stream=bool(config["idle_stream"]),
+    )
+
+
+class FrameRingPublisher:
+    """
+    Publishes the frames of a capture loop to a shared memory ring, in place
+    of a FrameHub, and wakes up the reading processes.
+
+    The ring is sized from the configured frame size before the camera is
+    opened. A device delivering another size gets its frames resized to
+    the ring, and their JPEG encoded again, with a warning once.
+
+    Args:
+        ring: The frame ring to write to.
+        notify: Condition shared with the reading processes.
+
+    Attributes:
+        __ring: The frame ring to write to
+        __notify: Condition shared with the reading processes
+        __encoder: The JpegEncoder of resized frames, once one is needed
+    """
+
+    def __init__(self, ring: FrameRing, notify) -> None:
+        self.__ring = ring
+        self.__notify = notify
+        self.__encoder = None
+
+    def publish(self, frame: EncodedFrame) -> None:
+        """
+        Write a frame and its JPEG to the ring.
+
+        Args:
+            frame (EncodedFrame): The captured frame.
+
+        """
+        image = frame.get_frame()
+        jpeg = frame.get_jpeg()
+        height, width = self.__ring.get_shape()[:2]
+        if image.shape[:2] != (height, width):
+            if self.__encoder is None:
+                print(
+                    f"Camera frames are {image.shape[1]}x{image.shape[0]}, "
+                    f"resizing them to the configured {width}x{height}"
+                )
+                self.__encoder = JpegEncoder()
+            image = cv2.resize(image, (width, height), interpolation=cv2.INTER_AREA)
+            jpeg = self.__encoder.encode(image)
+            if jpeg is None:
+                return
+        self.__ring.write(image, jpeg)
+        with self.__notify:
+            self.__notify.notify_all()
+
+    def close(self) -> None:
+        """
+        Wake up the reading processes so they notice the capture loop ended.
+
+        """
+        with self.__notify:
+            self.__notify.notify_all()
+
+
+def run_camera_worker(
+    config: Dict,
+    camera_factory: CameraFactory,
+    name: str,
+    notify,
+    stop,
+    events_path: Optional[str] = None,
+    captured=None,
+) -> None:
+    """
+    Run a camera's capture, detection, recording and encoding in a worker
+    process, publishing frames to a shared memory ring until stop is set.
+
+    Args:
+        config (dict): The camera configuration.
+        camera_factory (callable): Creates the camera from the configuration.
+        name (str): The name of the frame ring to write to.
+        notify: Condition shared with the web process.
+        stop: Event set by the web process to stop the worker.
+        events_path (str, optional): The database of the event store the
+                                     worker adds motion events to, or None.
+        captured (multiprocessing.Value, optional): Counter of the frames
+                                                    captured, shared with
+                                                    the web process.
+
+    """
+    ring = FrameRing((config["height"], config["width"], 3), name=name)
+    # SQLite connections cannot be shared with another process
+    events = EventStore(events_path) if events_path is not None else None
+    try:
+        streaming = create_streaming(config, camera_factory, events)
+        try:
+            streaming.run(FrameRingPublisher(ring, notify), stop.is_set, captured)
+        finally:
+            # the recorder thread is a daemon: finish the last video first
+            streaming.stop()
+    finally:
+        ring.close()
+        if events is not None:
+            events.close()
+
+
+class ThreadCamera:
+    """
+    A camera whose pipeline runs on a thread of the web process, started
+    when the first client connects.
+
+    Args:
+        config: The camera configuration.
+        camera_factory: Creates the camera from the configuration.
+        events: The index motion events are added to, or None.
+
+    Attributes:
+        __config: The camera configuration
+        __streaming: The Streaming object running the pipeline
+    """
+
+    def __init__(
+        self,
+        config: Dict,
+        camera_factory: CameraFactory = create_camera,
+        events: Optional[EventStore] = None,
+    ):
+        self.__config = config
+        self.__streaming = create_streaming(config, camera_factory, events)
+
+    def get_config(self) -> Dict:
+        """
+        Gets the camera configuration.
+
+        Returns:
+            The camera configuration.
+
+        """
+        return self.__config
+
+    def start(self) -> None:
+        """
+        Nothing to start: the pipeline runs while clients are connected.
+
+        """
+
+    def stop(self, timeout: Optional[float] = 5) -> None:
+        """
+        Stop the pipeline, even with clients connected, and wait for the
+        last recording to be written and closed.
+
+        Args:
+            timeout (float, optional): Maximum seconds to wait for the
+                                       capture loop and for the recorder.
+                                       Defaults to 5.
+
+        """
+        self.__streaming.stop(timeout)
+
+    def collect_metrics(self) -> None:
+        """
+        Update the metrics of the pipeline before they are rendered.
+
+        """
+        self.__streaming.collect_metrics()
+
+    def frames(self, profile: Optional[StreamProfile] = None) -> Iterator[bytes]:
+        """
+        Stream multipart JPEG chunks to a client on a worker thread.
+
+        Args:
+            profile (StreamProfile, optional): The fps, width and quality
+                                               the client asked for.
+
+        """
+        return self.__streaming.start(profile)
+
+    def stream(self, profile: Optional[StreamProfile] = None) -> AsyncIterator[bytes]:
+        """
+        Stream multipart JPEG chunks to an asyncio client.
+
+        Args:
+            profile (StreamProfile, optional): The fps, width and quality
+                                               the client asked for.
+
+        """
+        return self.__streaming.stream(profile)
+
+
+class ProcessCamera:
+    """
+    A camera whose pipeline runs in its own worker process, so OpenCV and
+    numpy work of different cameras runs on different cores without sharing
+    the GIL. The worker writes each frame and its JPEG to a shared memory
+    ring; a relay thread in the web process broadcasts the JPEGs to clients,
+    and other consumers can attach to the ring to read frames in place.
+
+    Args:
+        config: The camera configuration.
+        camera_factory: Creates the camera from the configuration, in the
+                        worker process. Must be picklable.
+        events: The index motion events are added to, or None. The worker
+                opens its own connection to the same database.
+
+    Attributes:
+        __config: The camera configuration
+        __camera_factory: Creates the camera from the configuration
+        __events_path: The database the worker adds motion events to
+        __ring: The frame ring written by the worker
+        __notify: Condition the worker notifies after each frame
+        __stop: Event telling the worker to stop
+        __captured: Counter of the frames the worker captured
+        __process: The worker process
+        __relay: Thread copying JPEGs from the ring to the hub
+        __hub: The hub clients subscribe to, created on each start
+        __clients_lock: Lock guarding the client count
+        __clients: Number of clients currently streaming
+        __variants: The variants clients are using, encoded by the relay
+        __encoder: The JpegEncoder of the variants, with the worker's settings
+    """
+
+    def __init__(
+        self,
+        config: Dict,
+        camera_factory: CameraFactory = create_camera,
+        events: Optional[EventStore] = None,
+    ):
+        self.__config = config
+        self.__camera_factory = camera_factory
+        self.__events_path = events.get_path() if events is not None else None
+        self.__ring = None
+        self.__notify = None
+        self.__stop = None
+        self.__captured = None
+        self.__process = None
+        self.__relay = None
+        self.__hub = None
+        self.__clients_lock = threading.Lock()
+        self.__clients = 0
+        self.__variants = VariantRegistry()
+        self.__encoder = JpegEncoder()
+
+    def get_config(self) -> Dict:
+        """
+        Gets the camera configuration.
+
+        Returns:
+            The camera configuration.
+
+        """
+        return self.__config
+
+    def get_ring_name(self) -> Optional[str]:
+        """
+        Gets the name of the frame ring, for consumers in other processes to
+        attach to with FrameRing(shape, name=name).
+
+        Returns:
+            The frame ring name, or None if the worker is not running.
+
+        """
+        return self.__ring.get_name() if self.__process is not None else None
+
+    def start(self) -> None:
+        """
+        Start the worker process and the relay thread, with a new hub since
+        the one of a previous run is closed when it stops.
+
+        """
+        context = multiprocessing.get_context("spawn")
+        shape = (self.__config["height"], self.__config["width"], 3)
+        self.__ring = FrameRing(shape)
+        self.__notify = context.Condition()
+        self.__stop = context.Event()
+        # only the worker writes it
+        self.__captured = context.Value("q", 0, lock=False)
+        self.__process = context.Process(
+            target=run_camera_worker,
+            args=(
+                self.__config,
+                self.__camera_factory,
+                self.__ring.get_name(),
+                self.__notify,
+                self.__stop,
+                self.__events_path,
+                self.__captured,
+            ),
+            daemon=True,
+        )
+        self.__hub = FrameHub()
+        self.__process.start()
+        self.__relay = threading.Thread(target=self.__relay_frames, daemon=True)
+        self.__relay.start()
+
+    def stop(self, timeout: Optional[float] = 5) -> None:
+        """
+        Stop the worker process and free the shared memory.
+
+        Args:
+            timeout (float, optional): Seconds to wait for the worker before
+                                       terminating it. Defaults to 5.
+
+        """
+        if self.__process is None:
+            return
+        self.__stop.set()
+        self.__process.join(timeout)
+        if self.__process.is_alive():
+            self.__process.terminate()
+            self.__process.join()
+        self.__relay.join()
+        self.__ring.close()
+        self.__process = None
+
+    def __relay_frames(self) -> None:
+        """
+        Runs the relay thread: waits for the worker to write a frame, copies
+        its JPEG out of the ring, encodes the variants clients are using and
+        publishes it to the hub.
+
+        """
+        seq = 0
+        while self.__process.is_alive() and not self.__stop.is_set():
+            with self.__notify:
+                if self.__ring.get_seq() == seq:
+                    self.__notify.wait(0.1)
+            new_seq, jpeg = self.__ring.read_jpeg()
+            if new_seq != seq:
+                seq = new_seq
+                if jpeg is not None:
+                    frame = EncodedFrame(
+                        None, self.__encoder, jpeg=jpeg, width=self.__config["width"]
+                    )
+                    self.__variants.encode(frame)
+                    self.__hub.publish(frame)
+        self.__hub.close()
+
+    def collect_metrics(self) -> None:
+        """
+        Update the metrics seen from the web process before they are
+        rendered. Detection, encoding and recording metrics stay in the
+        worker process.
+
+        """
+        labels = {"camera": self.__config["id"]}
+        with self.__clients_lock:
+            clients = self.__clients
+        metrics.set("stream_clients", clients, **labels)
+        if self.__process is not None:
+            captured = self.__captured.value
+            metrics.set("camera_frames_total", captured, **labels)
+
+    def frames(self, profile: Optional[StreamProfile] = None) -> Iterator[bytes]:
+        """
+        Stream multipart JPEG chunks to a client on a worker thread.
+
+        Args:
+            profile (StreamProfile, optional): The fps, width and quality
+                                               the client asked for.
+
+        """
+        self.__add_client(1)
+        try:
+            client = self.__create_client(profile)
+            for part in deliver(self.__hub.subscribe(), client, self.__variants):
+                metrics.inc("stream_bytes_total", len(part), camera=self.__config["id"])
+                yield part
+        finally:
+            self.__add_client(-1)
+
+    async def stream(
+        self, profile: Optional[StreamProfile] = None
+    ) -> AsyncIterator[bytes]:
+        """
+        Stream multipart JPEG chunks to an asyncio client.
+
+        Args:
+            profile (StreamProfile, optional): The fps, width and quality
+                                               the client asked for.
+
+        """
+        self.__add_client(1)
+        try:
+            client = self.__create_client(profile)
+            frames = self.__hub.subscribe_async()
+            async for part in deliver_async(frames, client, self.__variants):
+                metrics.inc("stream_bytes_total", len(part), camera=self.__config["id"])
+                yield part
+        finally:
+            self.__add_client(-1)
+
+    def __add_client(self, count: int) -> None:
+        """
+        Count a client in or out. Clients come and go on threadpool threads.
+
+        Args:
+            count (int): 1 when a client connects, -1 when it leaves.
+
+        """
+        with self.__clients_lock:
+            self.__clients += count
+
+    def __create_client(self, profile: Optional[StreamProfile]) -> AdaptiveClient:
+        """
+        Create the pacing and variant selection of a new client.
+
+        Args:
+            profile (StreamProfile): The profile the client asked for.
+
+        Returns:
+            The client's AdaptiveClient.
+
+        """
+        return AdaptiveClient(
+            profile or StreamProfile(),
+            self.__config["fps"],
+            self.__config["width"],
+            self.__encoder.get_quality(),
+        )
+
+
+class CameraManager:
+    """
+    A registry of cameras, each running its capture and detection pipeline
+    on a thread or in a worker process.
+
+    Args:
+        configs: The camera configurations, see load_config.
+        camera_factory: Creates a camera from a configuration.
+        events: The index every camera adds its motion events to, or None.
+
+    Attributes:
+        __cameras: The cameras by id, in configuration order
+    """
+
+    def __init__(
+        self,
+        configs: List[Dict],
+        camera_factory: CameraFactory = create_camera,
+        events: Optional[EventStore] = None,
+    ) -> None:
+        self.__cameras = {}
+        for config in configs:
+            worker = ProcessCamera if config["mode"] == "process" else ThreadCamera
+            self.__cameras[config["id"]] = worker(config, camera_factory, events)
+
+    @classmethod
+    def from_file(
+        cls,
+        path: str = CAMERA_CONFIG,
+        camera_factory: CameraFactory = create_camera,
+        events: Optional[EventStore] = None,
+    ) -> "CameraManager":
+        """
+        Create a manager from a configuration file.
+
+        Args:
+            path (str, optional): The configuration file.
+            camera_factory (callable, optional): Creates a camera from a
+                                                 configuration.
+            events (EventStore, optional): The index every camera adds its
+                                           motion events to.
+
+        Returns:
+            The camera manager.
+
+        """
+        return cls(load_config(path), camera_factory, events)
+
+    def start(self) -> None:
+        """
+        Start every camera that runs in a worker process.
+
+        """
+        for camera in self.__cameras.values():
+            camera.start()
+
+    def stop(self) -> None:
+        """
+        Stop every camera.
+
+        """
+        for camera in self.__cameras.values():
+            camera.stop()
+
+    def collect_metrics(self) -> None:
+        """
+        Update the metrics of every camera before they are rendered.
+
+        """
+        for camera in self.__cameras.values():
+            camera.collect_metrics()
+
+    def get_ids(self) -> List[str]:
+        """
+        Gets the camera ids.
+
+        Returns:
+            The camera ids, in configuration order.
+
+        """
+        return list(self.__cameras)
+
+    def get(self, camera_id: str):
+        """
+        Gets a camera by id.
+
+        Args:
+            camera_id (str): The camera id.
+
+        Returns:
+            The ThreadCamera or ProcessCamera.
+
+        Raises:
+            KeyError: If there is no camera with this id.
+
+        """
+        return self.__cameras[camera_id]
+
+    def get_default(self):
+        """
+        Gets the first configured camera.
+
+        Returns:
+            The ThreadCamera or ProcessCamera.
+
+        """
+        return next(iter(self.__cameras.values()))
@@ -0,0 +1,294 @@
+import os
+import threading
+from bisect import bisect_left
+from typing import List, Optional, Sequence, Tuple
+
+from dotenv import load_dotenv
+
+from app.timing import timer
+
+load_dotenv()
+# metrics
+METRICS_ENABLED = bool(int(os.getenv("METRICS", 1)))
+
+METRIC_KINDS = ("counter", "gauge", "histogram")
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class MetricsRegistry:
+    """
+    Counters, gauges and histograms of the pipeline, rendered in the
+    Prometheus text format for a /metrics endpoint.
+
+    Metrics are defined once, then updated from the hot loop by name with
+    keyword labels. Updates take one uncontended lock; while the registry is
+    disabled they return at once.
+
+    Args:
+        enabled: Whether updates are recorded.
+
+    Attributes:
+        __enabled: Whether updates are recorded
+        __lock: Lock guarding the values
+        __definitions: (kind, help, buckets) by metric name, in definition
+                       order
+        __values: Values by metric name and labels; for histograms, the
+                  bucket counts, sum and count
+    """
+
+    def __init__(self, enabled: bool = METRICS_ENABLED) -> None:
+        self.__enabled = enabled
+        self.__lock = threading.Lock()
+        self.__definitions = {}
+        self.__values = {}
+
+    def is_enabled(self) -> bool:
+        """
+        Gets whether updates are recorded.
+
+        Returns:
+            True if updates are recorded.
+
+        """
+        return self.__enabled
+
+    def define(
+        self,
+        name: str,
+        kind: str,
+        help: str,
+        buckets: Optional[Sequence[float]] = None,
+    ) -> None:
+        """
+        Define a metric.
+
+        Args:
+            name (str): The metric name.
+            kind (str): "counter", "gauge" or "histogram".
+            help (str): The description of the metric.
+            buckets (sequence, optional): Upper bounds of the histogram
+                                          buckets. Defaults to latency
+                                          buckets in seconds.
+
+        """
+        if kind not in METRIC_KINDS:
+            raise ValueError(f"Unknown metric kind {kind!r}, use one of {METRIC_KINDS}")
+        if kind == "histogram":
+            buckets = tuple(sorted(buckets or LATENCY_BUCKETS))
+        self.__definitions[name] = (kind, help, buckets)
+        self.__values.setdefault(name, {})
+
+    def inc(self, name: str, value: float = 1, **labels: str) -> None:
+        """
+        Increase a counter or gauge.
+
+        Args:
+            name (str): The metric name.
+            value (float, optional): The increase. Defaults to 1.
+            **labels: The label values of the series.
+
+        """
+        if not self.__enabled:
+            return
+        key = tuple(sorted(labels.items()))
+        with self.__lock:
+            series = self.__values[name]
+            series[key] = series.get(key, 0) + value
+
+    def set(self, name: str, value: float, **labels: str) -> None:
+        """
+        Set a gauge, or a counter read from another component's totals.
+
+        Args:
+            name (str): The metric name.
+            value (float): The value.
+            **labels: The label values of the series.
+
+        """
+        if not self.__enabled:
+            return
+        key = tuple(sorted(labels.items()))
+        with self.__lock:
+            self.__values[name][key] = value
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        """
+        Add an observation to a histogram.
+
+        Args:
+            name (str): The metric name.
+            value (float): The observation, such as a latency in seconds.
+            **labels: The label values of the series.
+
+        """
+        if not self.__enabled:
+            return
+        key = tuple(sorted(labels.items()))
+        buckets = self.__definitions[name][2]
+        index = bisect_left(buckets, value)
+        with self.__lock:
+            series = self.__values[name]
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = [[0] * len(buckets), 0.0, 0]
+            if index < len(buckets):
+                histogram[0][index] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    def get(self, name: str, **labels: str) -> Optional[float]:
+        """
+        Gets the value of a counter or gauge series.
+
+        Args:
+            name (str): The metric name.
+            **labels: The label values of the series.
+
+        Returns:
+            The value, or None if the series has no value yet.
+
+        """
+        with self.__lock:
+            return self.__values[name].get(tuple(sorted(labels.items())))
+
+    def reset(self) -> None:
+        """
+        Forget every value, keeping the definitions.
+
+        """
+        with self.__lock:
+            for name in self.__values:
+                self.__values[name] = {}
+
+    def render(self) -> str:
+        """
+        Render every metric in the Prometheus text exposition format.
+
+        Returns:
+            The metrics text.
+
+        """
+        lines = []
+        with self.__lock:
+            for name, (kind, help, buckets) in self.__definitions.items():
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {kind}")
+                for key, value in self.__values[name].items():
+                    if kind == "histogram":
+                        lines.extend(_histogram_lines(name, key, buckets, value))
+                    else:
+                        lines.append(f"{name}{_format_labels(key)} {value:g}")
+        return "\n".join(lines) + "\n"
+
+
+def _format_labels(labels: Labels) -> str:
+    """
+    Format labels as {name="value",...}.
+
+    Args:
+        labels (tuple): The (name, value) pairs.
+
+    Returns:
+        The formatted labels, empty without labels.
+
+    """
+    if not labels:
+        return ""
+    pairs = []
+    for label, value in labels:
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"')
+        pairs.append(f'{label}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def _histogram_lines(
+    name: str, labels: Labels, buckets: Sequence[float], histogram: List
+) -> List[str]:
+    """
+    Format the cumulative buckets, sum and count of a histogram series.
+
+    Args:
+        name (str): The metric name.
+        labels (tuple): The (name, value) pairs of the series.
+        buckets (sequence): Upper bounds of the buckets.
+        histogram (list): The bucket counts, sum and count.
+
+    Returns:
+        The lines of the series.
+
+    """
+    counts, total, count = histogram
+    lines = []
+    cumulative = 0
+    for bound, bucket_count in zip(buckets, counts):
+        cumulative += bucket_count
+        bucket_labels = labels + (("le", f"{bound:g}"),)
+        lines.append(f"{name}_bucket{_format_labels(bucket_labels)} {cumulative}")
+    inf_labels = labels + (("le", "+Inf"),)
+    lines.append(f"{name}_bucket{_format_labels(inf_labels)} {count}")
+    lines.append(f"{name}_sum{_format_labels(labels)} {total:g}")
+    lines.append(f"{name}_count{_format_labels(labels)} {count}")
+    return lines
+
+
+# the registry shared by the pipeline
+metrics = MetricsRegistry()
+
+metrics.define("camera_frames_total", "counter", "Frames captured.")
+metrics.define("camera_capture_fps", "gauge", "Frames captured in the last second.")
+metrics.define("camera_read_failures_total", "counter", "Failed frame reads.")
+metrics.define(
+    "camera_dropped_frames_total",
+    "counter",
+    "Frames skipped to read the newest frame in latest capture mode.",
+)
+metrics.define(
+    "pipeline_stage_seconds",
+    "histogram",
+    "Latency of each pipeline stage: capture, overlay, transform, "
+    "similarity, encode, record.",
+)
+metrics.define("pipeline_load", "gauge", "Share of the frame interval the work takes.")
+metrics.define(
+    "pipeline_skipped_frames_total",
+    "counter",
+    "Frames not encoded or published because the loop was behind.",
+)
+metrics.define(
+    "stream_idle_frames_total",
+    "counter",
+    "Frames not encoded or published because the scene was idle.",
+)
+metrics.define(
+    "encoder_backend_fps",
+    "gauge",
+    "Encode fps of each encoder backend, measured at startup.",
+)
+metrics.define("motion_similarity_score", "gauge", "Latest similarity score.")
+metrics.define("motion_active", "gauge", "1 while motion is being recorded.")
+metrics.define("motion_events_total", "counter", "Motion events started.")
+metrics.define("stream_clients", "gauge", "Clients currently streaming.")
+metrics.define("stream_bytes_total", "counter", "Bytes sent to stream clients.")
+metrics.define("recorder_queue_depth", "gauge", "Frames waiting to be recorded.")
+metrics.define("recorder_written_frames_total", "counter", "Frames recorded.")
+metrics.define(
+    "recorder_dropped_frames_total", "counter", "Frames dropped by a full queue."
+)
+
+
+def observe_stage(stage: str, seconds: float) -> None:
+    """
+    Record the latency of a pipeline stage timed by the stage timer.
+
+    Args:
+        stage (str): The name of the stage.
+        seconds (float): The latency.
+
+    """
+    metrics.observe("pipeline_stage_seconds", seconds, stage=stage)
+
+
+if METRICS_ENABLED:
+    timer.set_observer(observe_stage)
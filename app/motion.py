@@ -1,17 +1,140 @@
+import os
+from typing import Iterator, List, Optional, Sequence, Tuple, Union
+
 import cv2
-from app.image import Image
+from app.engines import (
+    MotionEngine,
+    create_engine,
+    difference_score,
+    stack_similarity,
+)
+from app.image import Image, Preprocessor
+from app.source import FrameSource
+from app.timing import timer
 import numpy as np
-from typing import Tuple
+from dotenv import load_dotenv
+
+Region = Tuple[int, int, int, int]
+
+
+def parse_regions(value: Optional[str]) -> List[Region]:
+    """
+    Parse rectangles written as "x,y,w,h;x,y,w,h" in frame pixels.
+
+    Args:
+        value (str): The rectangles to parse. Empty or None gives none.
+
+    Returns:
+        The (x, y, width, height) rectangles.
+
+    """
+    if not value:
+        return []
+    return [
+        tuple(int(n) for n in region.split(","))
+        for region in value.split(";")
+        if region.strip()
+    ]
+
+
+load_dotenv()
+# motion detector
+DETECT_WIDTH = int(os.getenv("DETECT_WIDTH", 0))
+DETECT_HEIGHT = int(os.getenv("DETECT_HEIGHT", 0))
+DETECT_SIZE = (DETECT_WIDTH, DETECT_HEIGHT) if DETECT_WIDTH and DETECT_HEIGHT else None
+DETECT_REGIONS = parse_regions(os.getenv("DETECT_REGIONS"))
+DETECT_EXCLUDE = parse_regions(os.getenv("DETECT_EXCLUDE"))
+MOTION_ENGINE = os.getenv("MOTION_ENGINE", "difference")
 
 
 class Detector:
     """
     This class detects motion in real time from camera.
 
+    Frames can be compared pairwise with detect_motion, or fed one at a time
+    to update, which transforms each frame once and hands it to a motion
+    engine: the previous frame (difference), a running-average background
+    (average) or a MOG2 background subtractor (mog2). update runs the same
+    transform through a Preprocessor writing into two reused buffers, so it
+    does not allocate per frame.
+
+    update can also detect at a lower resolution than the camera, and only
+    score motion inside regions of interest or outside excluded regions (for
+    example the timestamp drawn on each frame). Regions are given in camera
+    frame pixels.
+
+    Args:
+        detect_size: The (width, height) update detects at.
+                     Defaults to the camera frame size.
+        regions: The (x, y, width, height) regions to detect motion in.
+                 Defaults to the whole frame.
+        exclusions: The (x, y, width, height) regions to ignore.
+        engine: The motion engine used by update, or its name.
+                Defaults to comparing with the previous frame.
+
+    Attributes:
+        __preprocessor: Allocation-free version of __image_transform
+        __engine: The motion engine used by update
+        __regions: The regions to detect motion in
+        __exclusions: The regions to ignore
+        __mask: The detection mask at detection size, or None for no mask
+        __mask_shape: The frame shape the mask was built for
+        __buffers: The two transformed frames update alternates between
+        __current: Index of the buffer holding the latest frame
     """
 
-    def __init__(self) -> None:
-        pass
+    def __init__(
+        self,
+        detect_size: Optional[Tuple[int, int]] = None,
+        regions: Optional[List[Region]] = None,
+        exclusions: Optional[List[Region]] = None,
+        engine: Union[str, MotionEngine] = "difference",
+    ) -> None:
+        self.__preprocessor = Preprocessor(k=1, s=1, radius=1, size=detect_size)
+        if isinstance(engine, str):
+            engine = create_engine(engine)
+        self.__engine = engine
+        self.__regions = list(regions or [])
+        self.__exclusions = list(exclusions or [])
+        self.__mask = None
+        self.__mask_shape = None
+        self.__buffers = [None, None]
+        self.__current = 0
+
+    def __get_mask(self, frame_shape: Tuple[int, ...]) -> Optional[np.ndarray]:
+        """
+        Gets the detection mask for a camera frame shape, building it at
+        detection size on first use.
+
+        Args:
+            frame_shape: The shape of the camera frame.
+
+        Returns:
+            The mask, 255 where motion counts, or None to use every pixel.
+
+        """
+        if not self.__regions and not self.__exclusions:
+            return None
+        if frame_shape != self.__mask_shape:
+            height, width = frame_shape[:2]
+            out_height, out_width = self.__preprocessor.get_output_shape(frame_shape)
+            scale_x, scale_y = out_width / width, out_height / height
+
+            def scaled(region: Region) -> Tuple[slice, slice]:
+                x, y, w, h = region
+                return (
+                    slice(int(y * scale_y), int(np.ceil((y + h) * scale_y))),
+                    slice(int(x * scale_x), int(np.ceil((x + w) * scale_x))),
+                )
+
+            fill = 0 if self.__regions else 255
+            self.__mask = np.full((out_height, out_width), fill, np.uint8)
+            for region in self.__regions:
+                self.__mask[scaled(region)] = 255
+            for region in self.__exclusions:
+                self.__mask[scaled(region)] = 0
+            self.__mask_shape = frame_shape
+        return self.__mask
 
     def __image_transform(self, img: Image) -> Image:
         """
@@ -59,9 +182,7 @@ class Detector:
 
         """
         subtracted_img = self.__image_subtraction(img1, img2)
-        normalised_img = subtracted_img.normalise()
-        img_similarity = round(100 - (np.mean(normalised_img) * 100), 2)
-        return img_similarity
+        return difference_score(subtracted_img.get_image())
 
     def detect_motion(self, prev_frame, current_frame, threshold) -> Tuple[bool, float]:
         """
@@ -72,11 +193,121 @@ class Detector:
             current_frame: Current camera frame
 
         """
-        transformed_prev_frame = self.__image_transform(prev_frame)
-        transformed_current_frame = self.__image_transform(current_frame)
-        similarity_score = self.__image_similarity(
-            transformed_prev_frame, transformed_current_frame
-        )
+        with timer.stage("transform"):
+            transformed_prev_frame = self.__image_transform(prev_frame)
+            transformed_current_frame = self.__image_transform(current_frame)
+        with timer.stage("similarity"):
+            similarity_score = self.__image_similarity(
+                transformed_prev_frame, transformed_current_frame
+            )
 
         has_movement = bool(similarity_score < threshold)
         return has_movement, similarity_score
+
+    def update(self, frame: Image, threshold: float) -> Tuple[bool, float]:
+        """
+        Detect motion in the current frame with the motion engine, then add
+        the frame to the engine's history (for the default engine, keep it
+        as the new reference frame).
+
+        The first frame after construction or reset only starts the history
+        and reports no movement.
+
+        Args:
+            frame: Current camera frame
+            threshold: Similarity score below which there is movement
+
+        Returns:
+            Whether there is movement and the similarity score.
+
+        """
+        # alternate buffers so the engine may keep the previous frame
+        self.__current = 1 - self.__current
+        with timer.stage("transform"):
+            transformed_frame = self.__preprocessor.apply(
+                frame.get_image(), out=self.__buffers[self.__current]
+            )
+        self.__buffers[self.__current] = transformed_frame
+        with timer.stage("similarity"):
+            similarity_score = self.__engine.update(
+                transformed_frame, self.__get_mask(frame.get_image().shape)
+            )
+
+        has_movement = bool(similarity_score < threshold)
+        return has_movement, similarity_score
+
+    def transform_stack(
+        self, frames: Sequence[np.ndarray], out: Optional[np.ndarray] = None
+    ) -> np.ndarray:
+        """
+        Preprocess frames as update does, into one stack.
+
+        Args:
+            frames: The BGR frames, all of the same size.
+            out: (T, H, W) uint8 buffer to write the stack to. Allocated if
+                 missing.
+
+        Returns:
+            The (T, H, W) stack of preprocessed frames.
+
+        """
+        if out is None:
+            shape = self.__preprocessor.get_output_shape(frames[0].shape)
+            out = np.empty((len(frames),) + tuple(shape), np.uint8)
+        with timer.stage("transform"):
+            for frame, transformed in zip(frames, out):
+                self.__preprocessor.apply(frame, out=transformed)
+        return out
+
+    def score_stack(
+        self, stack: np.ndarray, frame_shape: Tuple[int, ...], lag: int = 1
+    ) -> np.ndarray:
+        """
+        Score a stack of preprocessed frames against the frames lag before
+        them in one vectorized pass, with the same regions as update.
+
+        Args:
+            stack: (T, H, W) stack from transform_stack.
+            frame_shape: The shape of the camera frames, to place regions.
+            lag: Number of frames between the frames compared.
+
+        Returns:
+            The T - lag similarity scores.
+
+        """
+        with timer.stage("similarity"):
+            return stack_similarity(stack, lag, self.__get_mask(frame_shape))
+
+    def reset(self) -> None:
+        """
+        Forget the frames given to update.
+
+        """
+        self.__engine.reset()
+
+    def detect_source(
+        self, source: FrameSource, threshold: float, every: int = 1
+    ) -> Iterator[Tuple[int, bool, float]]:
+        """
+        Detect motion in every frame of an opened source, such as a video
+        file or a synthetic scene, until it runs out of frames.
+
+        Args:
+            source: The opened frame source.
+            threshold: Similarity score below which there is movement.
+            every: Only detect on every n-th frame.
+
+        Yields:
+            The frame number, whether there is movement and the similarity
+            score.
+
+        """
+        self.reset()
+        index = 0
+        frame = source.read()
+        while frame is not None:
+            if index % every == 0:
+                has_movement, similarity_score = self.update(Image(frame), threshold)
+                yield index, has_movement, similarity_score
+            index += 1
+            frame = source.read()
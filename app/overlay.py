@@ -0,0 +1,323 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import NamedTuple, Optional, Tuple
+
+import cv2
+import numpy as np
+from dotenv import load_dotenv
+
+from app.timing import timer
+
+load_dotenv()
+# video
+TIME_FORMAT = os.getenv("TIME_FORMAT")
+
+# overlays
+OVERLAY_DETECT = bool(int(os.getenv("OVERLAY_DETECT", 0)))
+OVERLAY_RECORD = bool(int(os.getenv("OVERLAY_RECORD", 1)))
+OVERLAY_CAMERA_NAME = bool(int(os.getenv("OVERLAY_CAMERA_NAME", 0)))
+OVERLAY_MOTION = bool(int(os.getenv("OVERLAY_MOTION", 0)))
+OVERLAY_CACHE_SIZE = int(os.getenv("OVERLAY_CACHE_SIZE", 64))
+
+FONT = cv2.FONT_HERSHEY_COMPLEX_SMALL
+FONT_SCALE = 0.8
+TEXT_COLOR = (0, 0, 255)
+TIME_ORIGIN = (10, 15)
+MOTION_RADIUS = 6
+# pixels around the text size, for glyphs reaching past it
+MARGIN = 4
+
+
+class Tile(NamedTuple):
+    """
+    A rendered overlay: its BGR pixels, a mask that is 255 where it is
+    drawn, and the position of its origin inside it, such as the start of
+    the text baseline.
+    """
+
+    image: np.ndarray
+    mask: np.ndarray
+    origin: Tuple[int, int]
+
+
+def render_text(
+    text: str,
+    font: int = FONT,
+    scale: float = FONT_SCALE,
+    color: Tuple[int, int, int] = TEXT_COLOR,
+    thickness: int = 1,
+) -> Tile:
+    """
+    Render text into a tile, with the pixels cv2.putText draws with 8-connected
+    lines, its default before OpenCV 5.
+
+    Args:
+        text (str): The text.
+        font (int, optional): The OpenCV Hershey font.
+        scale (float, optional): The font scale.
+        color (tuple, optional): The BGR color.
+        thickness (int, optional): The line thickness.
+
+    Returns:
+        The tile, with its origin at the start of the baseline.
+
+    """
+    (width, height), baseline = cv2.getTextSize(text, font, scale, thickness)
+    margin = MARGIN + thickness
+    origin = (margin, margin + height)
+    mask = np.zeros((height + baseline + 2 * margin, width + 2 * margin), np.uint8)
+    cv2.putText(mask, text, origin, font, scale, 255, thickness, cv2.LINE_8)
+    return _colored(mask, color, origin)
+
+
+def render_dot(
+    radius: int = MOTION_RADIUS, color: Tuple[int, int, int] = TEXT_COLOR
+) -> Tile:
+    """
+    Render a filled circle into a tile, as a motion indicator.
+
+    Args:
+        radius (int, optional): The radius in pixels.
+        color (tuple, optional): The BGR color.
+
+    Returns:
+        The tile, with its origin at the center of the circle.
+
+    """
+    size = 2 * radius + 1
+    mask = np.zeros((size, size), np.uint8)
+    cv2.circle(mask, (radius, radius), radius, 255, -1, cv2.LINE_8)
+    return _colored(mask, color, (radius, radius))
+
+
+def _colored(mask: np.ndarray, color: Tuple[int, int, int], origin) -> Tile:
+    """
+    Make a tile of one color from the pixels a mask draws. Builds whose
+    text is always anti-aliased draw the pixels at least half covered.
+
+    Args:
+        mask (np.ndarray): The coverage of each pixel, 0 to 255.
+        color (tuple): The BGR color.
+        origin (tuple): The (x, y) origin inside the mask.
+
+    Returns:
+        The tile.
+
+    """
+    drawn = np.where(mask >= 128, 255, 0).astype(np.uint8)
+    image = np.zeros(mask.shape + (3,), np.uint8)
+    image[drawn != 0] = color
+    return Tile(image, drawn, origin)
+
+
+def blit(frame: np.ndarray, tile: Tile, origin: Tuple[int, int]) -> None:
+    """
+    Draw a tile on a frame in place with one masked copy, clipped to the
+    frame.
+
+    Args:
+        frame (np.ndarray): The BGR frame.
+        tile (Tile): The tile.
+        origin (tuple): The (x, y) of the frame to put the tile origin at.
+
+    """
+    left, top = origin[0] - tile.origin[0], origin[1] - tile.origin[1]
+    height, width = tile.mask.shape
+    y0, x0 = max(top, 0), max(left, 0)
+    y1 = min(top + height, frame.shape[0])
+    x1 = min(left + width, frame.shape[1])
+    if y0 >= y1 or x0 >= x1:
+        return
+    part = (slice(y0 - top, y1 - top), slice(x0 - left, x1 - left))
+    cv2.copyTo(tile.image[part], tile.mask[part], frame[y0:y1, x0:x1])
+
+
+class TextCache:
+    """
+    Renders each distinct text once into a tile and draws it from the cache
+    afterwards, so a timestamp that changes once per second costs one
+    masked copy per frame instead of cv2.putText. The least recently used
+    texts are dropped first.
+
+    Args:
+        size: Maximum number of texts kept.
+
+    Attributes:
+        __size: Maximum number of texts kept
+        __lock: Lock guarding the tiles
+        __tiles: Tiles by text, least recently used first
+    """
+
+    def __init__(self, size: int = OVERLAY_CACHE_SIZE) -> None:
+        self.__size = size
+        self.__lock = threading.Lock()
+        self.__tiles = OrderedDict()
+
+    def get(self, text: str) -> Tile:
+        """
+        Gets the tile of a text, rendering it on first use.
+
+        Args:
+            text (str): The text.
+
+        Returns:
+            The tile.
+
+        """
+        with self.__lock:
+            tile = self.__tiles.get(text)
+            if tile is not None:
+                self.__tiles.move_to_end(text)
+                return tile
+        tile = render_text(text)
+        with self.__lock:
+            self.__tiles[text] = tile
+            while len(self.__tiles) > self.__size:
+                self.__tiles.popitem(last=False)
+        return tile
+
+    def draw(self, frame: np.ndarray, text: str, origin: Tuple[int, int]) -> None:
+        """
+        Draw a text on a frame in place.
+
+        Args:
+            frame (np.ndarray): The BGR frame.
+            text (str): The text. Nothing is drawn for an empty text.
+            origin (tuple): The (x, y) of the start of the baseline.
+
+        """
+        if text:
+            blit(frame, self.get(text), origin)
+
+    def __len__(self) -> int:
+        with self.__lock:
+            return len(self.__tiles)
+
+
+class Clock:
+    """
+    Formats the current time, only once per second when the format has no
+    finer field than seconds.
+
+    Args:
+        time_format: The strftime format.
+
+    Attributes:
+        __format: The strftime format
+        __cached: Whether the format can be reused for a whole second
+        __second: The second last formatted
+        __text: The text of that second
+    """
+
+    def __init__(self, time_format: str = TIME_FORMAT) -> None:
+        self.__format = time_format
+        self.__cached = "%f" not in time_format
+        self.__second = None
+        self.__text = ""
+
+    def now(self) -> str:
+        """
+        Gets the current time as text.
+
+        Returns:
+            The formatted time.
+
+        """
+        now = time.time()
+        if not self.__cached:
+            return datetime.fromtimestamp(now).strftime(self.__format)
+        second = int(now)
+        if second != self.__second:
+            self.__text = datetime.fromtimestamp(second).strftime(self.__format)
+            self.__second = second
+        return self.__text
+
+
+class Overlay:
+    """
+    Draws the timestamp, and optionally the camera name at the bottom left
+    and a motion indicator at the top right, on frames from cached tiles.
+
+    Whether the frames used for detection and recording get the overlays
+    too is part of the configuration: by default motion is detected on the
+    frame before the overlays are drawn, so the clock never counts as
+    motion, and recordings include them.
+
+    Args:
+        camera_name: The name drawn at the bottom left, or None.
+        motion: Whether to draw the motion indicator.
+        on_detect: Whether motion is detected on frames with overlays.
+        on_record: Whether recordings get the overlays.
+        cache: The cache of text tiles.
+
+    Attributes:
+        __camera_name: The name drawn at the bottom left, or None
+        __motion: Whether to draw the motion indicator
+        __on_detect: Whether motion is detected on frames with overlays
+        __on_record: Whether recordings get the overlays
+        __texts: The cache of text tiles
+        __dot: The tile of the motion indicator
+    """
+
+    def __init__(
+        self,
+        camera_name: Optional[str] = None,
+        motion: bool = OVERLAY_MOTION,
+        on_detect: bool = OVERLAY_DETECT,
+        on_record: bool = OVERLAY_RECORD,
+        cache: Optional[TextCache] = None,
+    ) -> None:
+        self.__camera_name = camera_name
+        self.__motion = motion
+        self.__on_detect = on_detect
+        self.__on_record = on_record
+        self.__texts = cache if cache is not None else TextCache()
+        self.__dot = render_dot()
+
+    def get_on_detect(self) -> bool:
+        """
+        Gets whether motion is detected on frames with overlays.
+
+        Returns:
+            True to draw the overlays before detection.
+
+        """
+        return self.__on_detect
+
+    def get_on_record(self) -> bool:
+        """
+        Gets whether recordings get the overlays.
+
+        Returns:
+            True to record the frames with overlays.
+
+        """
+        return self.__on_record
+
+    def draw(
+        self, frame: np.ndarray, current_time: str = "", is_moving: bool = False
+    ) -> np.ndarray:
+        """
+        Draw the overlays on a frame in place.
+
+        Args:
+            frame (np.ndarray): The BGR frame.
+            current_time (str, optional): The timestamp to draw.
+            is_moving (bool, optional): Whether to show the motion indicator.
+
+        Returns:
+            The frame.
+
+        """
+        with timer.stage("overlay"):
+            self.__texts.draw(frame, current_time, TIME_ORIGIN)
+            if self.__camera_name:
+                origin = (TIME_ORIGIN[0], frame.shape[0] - TIME_ORIGIN[0])
+                self.__texts.draw(frame, self.__camera_name, origin)
+            if self.__motion and is_moving:
+                origin = (frame.shape[1] - TIME_ORIGIN[1], TIME_ORIGIN[1])
+                blit(frame, self.__dot, origin)
+        return frame
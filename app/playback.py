@@ -0,0 +1,183 @@
+import os
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+load_dotenv()
+# video
+VID_DIR = os.getenv("VID_DIR")
+VID_FORMAT = os.getenv("VID_FORMAT")
+
+# playback
+PLAYBACK_CHUNK_SIZE = int(os.getenv("PLAYBACK_CHUNK_SIZE", 256 * 1024))
+
+
+class RangeNotSatisfiable(ValueError):
+    """
+    Raised when a Range header asks for bytes beyond the end of a file.
+    """
+
+
+def list_recordings(
+    directory: str = VID_DIR,
+    vid_format: str = VID_FORMAT,
+    camera: Optional[str] = None,
+) -> List[Dict]:
+    """
+    List the recorded videos, newest first.
+
+    Args:
+        directory (str, optional): The directory of the videos.
+        vid_format (str, optional): The file extension of the videos.
+        camera (str, optional): Only videos of this camera, named
+                                {camera}_{time}.
+
+    Returns:
+        The name, size in bytes and modification time of each video.
+
+    """
+    if not os.path.isdir(directory):
+        return []
+    recordings = []
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if not entry.is_file() or not entry.name.endswith(f".{vid_format}"):
+                continue
+            if camera is not None and not entry.name.startswith(f"{camera}_"):
+                continue
+            stat = entry.stat()
+            recordings.append(
+                {"name": entry.name, "size": stat.st_size, "modified": stat.st_mtime}
+            )
+    recordings.sort(key=lambda recording: recording["modified"], reverse=True)
+    return recordings
+
+
+def find_recording(
+    name: str, directory: str = VID_DIR, vid_format: str = VID_FORMAT
+) -> Optional[str]:
+    """
+    Gets the path of a recorded video from its name, refusing names that
+    would leave the directory and files that are not videos, such as the
+    event database.
+
+    Args:
+        name (str): The file name of the video.
+        directory (str, optional): The directory of the videos.
+        vid_format (str, optional): The file extension of the videos.
+
+    Returns:
+        The path, or None if there is no such video.
+
+    """
+    if not name or name != os.path.basename(name) or name.startswith("."):
+        return None
+    if not name.endswith(f".{vid_format}"):
+        return None
+    path = os.path.join(directory, name)
+    return path if os.path.isfile(path) else None
+
+
+def file_etag(stat: os.stat_result) -> str:
+    """
+    Gets the entity tag of a file from its modification time and size, so
+    it changes whenever the file is rewritten.
+
+    Args:
+        stat (os.stat_result): The stat of the file.
+
+    Returns:
+        The quoted entity tag.
+
+    """
+    return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Check an If-None-Match header against the entity tag of a file.
+
+    Args:
+        if_none_match (str): The header, or None.
+        etag (str): The entity tag of the file.
+
+    Returns:
+        True if the client already has this version of the file.
+
+    """
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a Range header of the form bytes=start-end, bytes=start- or
+    bytes=-suffix.
+
+    Several ranges are not supported; the header is then ignored and the
+    whole file is sent, as HTTP allows. So is a range ending before it
+    starts, which RFC 7233 treats as invalid rather than unsatisfiable.
+
+    Args:
+        header (str): The header, or None.
+        size (int): The size of the file.
+
+    Returns:
+        The first and last byte, inclusive, or None to send the whole file.
+
+    Raises:
+        RangeNotSatisfiable: If the range starts beyond the end of the file.
+
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    first, _, last = header[len("bytes=") :].strip().partition("-")
+    try:
+        start = int(first) if first else None
+        end = int(last) if last else None
+    except ValueError:
+        return None  # malformed
+    if start is None:
+        if end is None:
+            return None
+        if end == 0:
+            raise RangeNotSatisfiable(header)
+        # the last end bytes
+        start, end = max(size - end, 0), size - 1
+    elif end is not None and end < start:
+        return None  # invalid
+    elif end is None or end >= size:
+        end = size - 1
+    if start >= size:
+        raise RangeNotSatisfiable(header)
+    return start, end
+
+
+def iter_file(
+    path: str, start: int, end: int, chunk_size: int = PLAYBACK_CHUNK_SIZE
+) -> Iterator[bytes]:
+    """
+    Read a range of a file in chunks, so a response never holds the whole
+    file in memory.
+
+    Args:
+        path (str): The file.
+        start (int): The first byte.
+        end (int): The last byte, inclusive.
+        chunk_size (int, optional): Bytes read at a time.
+
+    Yields:
+        The chunks of the range.
+
+    """
+    with open(path, "rb") as file:
+        file.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = file.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
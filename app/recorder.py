@@ -0,0 +1,322 @@
+import os
+import threading
+from collections import deque
+from typing import Callable, Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+from dotenv import load_dotenv
+
+from app.backends import RECORD_BACKEND, FfmpegWriter, select_record_backend
+from app.buffer import BufferedFrame, decode_frame
+from app.faststart import faststart
+from app.timing import timer
+
+load_dotenv()
+# video
+CODEC = os.getenv("CODEC")
+VID_FORMAT = os.getenv("VID_FORMAT")
+
+# recorder
+RECORD_QUEUE_SIZE = int(os.getenv("RECORD_QUEUE_SIZE", 120))
+RECORD_OVERFLOW = os.getenv("RECORD_OVERFLOW", "drop_oldest")
+RECORD_FASTSTART = bool(int(os.getenv("RECORD_FASTSTART", 1)))
+
+OVERFLOW_POLICIES = ("drop_oldest", "drop_newest", "block")
+FASTSTART_FORMATS = ("mp4", "mov", "m4v")
+
+
+class Recorder:
+    """
+    Records videos on a background thread, so opening files and encoding
+    frames never stall the capture loop.
+
+    Frames are handed over through a bounded queue. When the queue is full,
+    the overflow policy decides what happens: drop the oldest queued frame,
+    drop the new frame, or block the caller until there is room. Opening and
+    closing files are always queued, in order with the frames.
+
+    Args:
+        queue_size: Maximum number of frames waiting to be written.
+        overflow: One of "drop_oldest", "drop_newest" or "block".
+        codec: The fourcc codec of the videos.
+        vid_format: The file extension of the videos.
+        fast_start: Move the index of MP4 and MOV videos to the front once
+                    they are closed, so browsers can play them while they
+                    download.
+        backend: The video encoder: "opencv" (cv2.VideoWriter with the
+                 codec), "ffmpeg" (a piped ffmpeg subprocess), or "auto" for
+                 the fastest one available.
+
+    Attributes:
+        __queue_size: Maximum number of frames waiting to be written
+        __overflow: The overflow policy
+        __codec: The fourcc codec of the videos
+        __vid_format: The file extension of the videos
+        __faststart: Whether to move the index of closed videos to the front
+        __backend: The name of the video encoder used
+        __cond: Condition guarding the queue
+        __queue: Queued (command, argument) pairs
+        __queued_frames: Number of frames in the queue
+        __worker: The background thread, started on first use
+        __record_file: VideoWriter, or writer of the backend, used by the
+                       worker
+        __video: The file name, frames written and on_close callback of the
+                 current video
+        __metrics: Counters of written and dropped frames and opened files
+    """
+
+    def __init__(
+        self,
+        queue_size: int = RECORD_QUEUE_SIZE,
+        overflow: str = RECORD_OVERFLOW,
+        codec: str = CODEC,
+        vid_format: str = VID_FORMAT,
+        fast_start: bool = RECORD_FASTSTART,
+        backend: str = RECORD_BACKEND,
+    ) -> None:
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(
+                f"Unknown overflow policy {overflow!r}, use one of {OVERFLOW_POLICIES}"
+            )
+        self.__queue_size = queue_size
+        self.__overflow = overflow
+        self.__codec = codec
+        self.__vid_format = vid_format
+        self.__faststart = fast_start and vid_format.lower() in FASTSTART_FORMATS
+        self.__backend = select_record_backend(backend)
+        self.__cond = threading.Condition()
+        self.__queue = deque()
+        self.__queued_frames = 0
+        self.__worker = None
+        self.__record_file = None
+        self.__video = None
+        self.__metrics = {"written_frames": 0, "dropped_frames": 0, "videos": 0}
+
+    def open(
+        self,
+        name: str,
+        fps: float,
+        frame_size: Tuple[int, int],
+        on_close: Optional[Callable[[str, int], None]] = None,
+    ) -> None:
+        """
+        Start recording a new video, closing the current one.
+
+        Args:
+            name (str): The name of the video file, without extension.
+            fps (float): The fps of the video.
+            frame_size (tuple): The (width, height) of the frames.
+            on_close (callable, optional): Called on the background thread
+                                           with the file name and number of
+                                           frames written once the video is
+                                           closed.
+
+        """
+        self.__put("open", (name, fps, frame_size, on_close))
+
+    def write(self, frame: np.ndarray) -> bool:
+        """
+        Queue a frame for the current video. The frame must not be modified
+        afterwards.
+
+        Args:
+            frame (np.ndarray): The frame to record.
+
+        Returns:
+            False if the frame was dropped because the queue was full.
+
+        """
+        return self.__put("write", frame)
+
+    def write_batch(self, frames: List[BufferedFrame]) -> None:
+        """
+        Queue several frames at once, such as the frames buffered before
+        motion started. A batch is never dropped by the overflow policy.
+
+        Args:
+            frames (list): Raw frames or JPEG bytes to record in order.
+
+        """
+        self.__put("batch", frames)
+
+    def close(self) -> None:
+        """
+        Finish the current video once its queued frames are written.
+
+        """
+        self.__put("close", None)
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """
+        Write everything queued, close the current video and stop the
+        background thread.
+
+        Args:
+            timeout (float, optional): Maximum seconds to wait.
+                                       Defaults to waiting forever.
+
+        """
+        worker = self.__worker
+        if worker is None:
+            return
+        self.__put("stop", None)
+        worker.join(timeout)
+
+    def get_metrics(self) -> Dict[str, int]:
+        """
+        Gets the recorder counters.
+
+        Returns:
+            The queue depth, written and dropped frames, and number of
+            videos opened.
+
+        """
+        with self.__cond:
+            return dict(self.__metrics, queue_depth=self.__queued_frames)
+
+    def __put(self, command: str, argument) -> bool:
+        """
+        Queue a command for the background thread, applying the overflow
+        policy to frames.
+
+        Args:
+            command (str): One of "open", "write", "batch", "close" or
+                           "stop".
+            argument: The argument of the command.
+
+        Returns:
+            False if a frame was dropped instead of queued.
+
+        """
+        with self.__cond:
+            if self.__worker is None or not self.__worker.is_alive():
+                self.__worker = threading.Thread(target=self.__run, daemon=True)
+                self.__worker.start()
+
+            if command == "write" and self.__queued_frames >= self.__queue_size:
+                if self.__overflow == "drop_newest":
+                    self.__metrics["dropped_frames"] += 1
+                    return False
+                if self.__overflow == "drop_oldest":
+                    for i, (queued, _) in enumerate(self.__queue):
+                        if queued == "write":
+                            del self.__queue[i]
+                            break
+                    self.__queued_frames -= 1
+                    self.__metrics["dropped_frames"] += 1
+                else:
+                    self.__cond.wait_for(
+                        lambda: self.__queued_frames < self.__queue_size
+                    )
+
+            self.__queue.append((command, argument))
+            if command == "write":
+                self.__queued_frames += 1
+            self.__cond.notify_all()
+            return True
+
+    def __run(self) -> None:
+        """
+        Runs the background thread: executes queued commands in order.
+
+        """
+        while True:
+            with self.__cond:
+                self.__cond.wait_for(lambda: self.__queue)
+                command, argument = self.__queue.popleft()
+                if command == "write":
+                    self.__queued_frames -= 1
+                    self.__cond.notify_all()
+
+            if command == "write":
+                if self.__record_file is not None:
+                    with timer.stage("record"):
+                        self.__record_file.write(argument)
+                    self.__video["frames"] += 1
+                    with self.__cond:
+                        self.__metrics["written_frames"] += 1
+            elif command == "batch":
+                self.__write_batch(argument)
+            elif command == "open":
+                self.__release()
+                self.__start_video(*argument)
+            elif command == "close":
+                self.__release()
+            elif command == "stop":
+                self.__release()
+                return
+
+    def __write_batch(self, frames: List[BufferedFrame]) -> None:
+        """
+        Write a batch of raw frames or JPEG bytes to the current video.
+
+        Args:
+            frames (list): The frames to write in order.
+
+        """
+        if self.__record_file is None:
+            return
+        for frame in frames:
+            frame = decode_frame(frame)
+            if frame is not None:
+                with timer.stage("record"):
+                    self.__record_file.write(frame)
+                self.__video["frames"] += 1
+                with self.__cond:
+                    self.__metrics["written_frames"] += 1
+
+    def __start_video(
+        self,
+        name: str,
+        fps: float,
+        frame_size: Tuple[int, int],
+        on_close: Optional[Callable[[str, int], None]],
+    ) -> None:
+        """
+        Create the writer for a new video.
+
+        Args:
+            name (str): The name of the video file, without extension.
+            fps (float): The fps of the video.
+            frame_size (tuple): The (width, height) of the frames.
+            on_close (callable): Called once the video is closed, or None.
+
+        """
+        filename = f"{name}.{self.__vid_format}"
+        print("start recording", filename)
+        os.makedirs(os.path.dirname(filename) or ".", exist_ok=True)
+        if self.__backend == "ffmpeg":
+            self.__record_file = FfmpegWriter(filename, fps, frame_size)
+        else:
+            fourcc = cv2.VideoWriter_fourcc(*self.__codec)
+            self.__record_file = cv2.VideoWriter(
+                filename, fourcc, fps, frame_size, True
+            )
+        self.__video = {"filename": filename, "frames": 0, "on_close": on_close}
+        if not self.__record_file.isOpened():
+            print(f"Cannot record {filename} with the {self.__backend} backend")
+        with self.__cond:
+            self.__metrics["videos"] += 1
+
+    def __release(self) -> None:
+        """
+        Close the current video, if any, and report it to its on_close
+        callback.
+
+        """
+        if self.__record_file is not None:
+            print("ending record")
+            self.__record_file.release()
+            self.__record_file = None
+            video, self.__video = self.__video, None
+            if self.__faststart:
+                try:
+                    faststart(video["filename"])
+                except OSError as error:
+                    print(f"Cannot move the index of {video['filename']}: {error}")
+            if video["on_close"] is not None:
+                try:
+                    video["on_close"](video["filename"], video["frames"])
+                except Exception as error:
+                    print(f"Cannot report {video['filename']}: {error}")
@@ -0,0 +1,634 @@
+"""
+Scans recorded video files for motion offline, in parallel across files,
+and writes the motion segments of each file as a line of JSON. Files
+already in the output are skipped, so an interrupted scan resumes.
+
+    python -m app.scan videos/ --threshold 90 --every 10 --output scan.jsonl
+
+With --sweep, each file is decoded once and the segments found with every
+combination of thresholds and frame intervals are counted instead, to tune
+THRESHOLD and N_FRAMES:
+
+    python -m app.scan clip.mp4 --sweep 90,93,95,97 --lags 5,10,20
+"""
+
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import (
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+import cv2
+import numpy as np
+from dotenv import load_dotenv
+
+from app.image import Image
+from app.motion import (
+    DETECT_EXCLUDE,
+    DETECT_REGIONS,
+    DETECT_SIZE,
+    MOTION_ENGINE,
+    Detector,
+)
+
+load_dotenv()
+# motion detector
+N_FRAMES = int(os.getenv("N_FRAMES"))
+SIM_THRESHOLD = float(os.getenv("THRESHOLD"))
+
+# offline scan
+SCAN_WORKERS = int(os.getenv("SCAN_WORKERS", 0)) or os.cpu_count() or 1
+SCAN_BATCH_SIZE = int(os.getenv("SCAN_BATCH_SIZE", 32))
+SCAN_MERGE_GAP = float(os.getenv("SCAN_MERGE_GAP", 2.0))
+SCAN_SEEK_STRIDE = int(os.getenv("SCAN_SEEK_STRIDE", 60))
+
+VIDEO_EXTENSIONS = (".mp4", ".mov", ".avi", ".mkv", ".m4v")
+
+
+class Segment(NamedTuple):
+    """
+    A stretch of a video with motion. Times are seconds from the start of
+    the video; the score is the lowest similarity score seen in it.
+    """
+
+    start: float
+    end: float
+    score: float
+
+
+def find_segments(
+    results: Iterable[Tuple[int, bool, float]],
+    fps: float,
+    every: int = 1,
+    merge_gap: float = SCAN_MERGE_GAP,
+) -> List[Segment]:
+    """
+    Group detection results into motion segments.
+
+    A moving sample means motion since the previous sample, so a segment
+    starts one sample before its first moving sample. Segments less than
+    merge_gap seconds apart are merged.
+
+    Args:
+        results: (frame number, has movement, similarity score) of each
+                 sampled frame, in order.
+        fps: The fps of the video.
+        every: Number of frames between samples.
+        merge_gap: Seconds of stillness that still join two segments.
+
+    Returns:
+        The segments, in order.
+
+    """
+    segments = []
+    for index, has_movement, score in results:
+        if not has_movement:
+            continue
+        start = max(index - every, 0) / fps
+        end = index / fps
+        if segments and start - segments[-1].end <= merge_gap:
+            last = segments[-1]
+            segments[-1] = Segment(last.start, end, min(last.score, score))
+        else:
+            segments.append(Segment(start, end, score))
+    return segments
+
+
+def sweep_thresholds(
+    indices: np.ndarray,
+    scores: np.ndarray,
+    fps: float,
+    thresholds: Iterable[float],
+    every: int = 1,
+    merge_gap: float = SCAN_MERGE_GAP,
+) -> Dict[float, List[Segment]]:
+    """
+    Group similarity scores into motion segments for several thresholds at
+    once, with the same segments as find_segments gives for each.
+
+    Moving samples, segment breaks and the lowest score of each segment are
+    found with array operations, so sweeping thresholds over the scores of
+    an hour of video takes milliseconds.
+
+    Args:
+        indices: Frame number of each score, in order.
+        scores: Similarity score of each sampled frame.
+        fps: The fps of the video.
+        thresholds: Similarity scores below which there is movement.
+        every: Number of frames between samples.
+        merge_gap: Seconds of stillness that still join two segments.
+
+    Returns:
+        The segments of each threshold, in order.
+
+    """
+    indices = np.asarray(indices)
+    scores = np.asarray(scores, dtype=float)
+    starts = np.maximum(indices - every, 0) / fps
+    ends = indices / fps
+    sweep = {}
+    for threshold in thresholds:
+        moving = np.flatnonzero(scores < threshold)
+        if not len(moving):
+            sweep[threshold] = []
+            continue
+        breaks = starts[moving[1:]] - ends[moving[:-1]] > merge_gap
+        first = np.concatenate(([0], np.flatnonzero(breaks) + 1))
+        last = np.append(first[1:] - 1, len(moving) - 1)
+        lowest = np.minimum.reduceat(scores[moving], first)
+        sweep[threshold] = [
+            Segment(float(start), float(end), float(score))
+            for start, end, score in zip(
+                starts[moving[first]], ends[moving[last]], lowest
+            )
+        ]
+    return sweep
+
+
+def sample_frames(
+    path: str, every: int = 1, seek_stride: int = SCAN_SEEK_STRIDE
+) -> Iterator[Tuple[int, np.ndarray]]:
+    """
+    Read every n-th frame of a video file.
+
+    Frames in between are only grabbed, which skips converting them to BGR.
+    When samples are at least seek_stride frames apart, the reader seeks
+    to each sample instead, so the decoder can skip from keyframe to
+    keyframe rather than going through every frame.
+
+    Args:
+        path (str): The video file.
+        every (int, optional): Number of frames between samples.
+        seek_stride (int, optional): Sample spacing from which to seek.
+
+    Yields:
+        The frame number and BGR frame of each sample.
+
+    """
+    cap = cv2.VideoCapture(path)
+    try:
+        if not cap.isOpened():
+            return
+        seek = every >= seek_stride
+        index = 0
+        while True:
+            if seek:
+                if index:
+                    cap.set(cv2.CAP_PROP_POS_FRAMES, index)
+                ret, frame = cap.read()
+            else:
+                ret, frame = cap.retrieve() if cap.grab() else (False, None)
+            if not ret:
+                break
+            yield index, frame
+            if not seek:
+                for _ in range(every - 1):
+                    if not cap.grab():
+                        return
+            index += every
+    finally:
+        cap.release()
+
+
+def batched(
+    samples: Iterator[Tuple[int, np.ndarray]], size: int
+) -> Iterator[List[Tuple[int, np.ndarray]]]:
+    """
+    Group samples into lists of a fixed size for the detector.
+
+    Args:
+        samples: The samples.
+        size: Number of samples per batch.
+
+    Yields:
+        The batches, the last one possibly shorter.
+
+    """
+    batch = []
+    for sample in samples:
+        batch.append(sample)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def score_lags(
+    path: str,
+    lags: Sequence[int],
+    batch_size: int = SCAN_BATCH_SIZE,
+    detector: Optional[Detector] = None,
+) -> Dict[int, Tuple[np.ndarray, np.ndarray]]:
+    """
+    Score a video file as the frame difference detector would with each of
+    several frame intervals, decoding it only once.
+
+    With an interval of n, frames n, 2n, 3n... are each compared with the
+    frame n before them, as the live pipeline does with N_FRAMES=n. Frames
+    are sampled at the greatest common divisor of the intervals, preprocessed
+    a batch at a time into one stack and scored with vectorized passes over
+    it. The last samples of each batch are kept for the next one, so pairs
+    across batches are scored too and memory stays bounded.
+
+    Args:
+        path (str): The video file.
+        lags: The frame intervals.
+        batch_size (int, optional): Frames decoded per batch.
+        detector (Detector, optional): The detector, for its detection size
+                                       and regions.
+
+    Returns:
+        The frame numbers and similarity scores of each interval.
+
+    Raises:
+        ValueError: If an interval is not positive.
+
+    """
+    if not lags or min(lags) < 1:
+        raise ValueError(f"Frame intervals must be positive, got {list(lags)}")
+    if detector is None:
+        detector = _create_detector("difference")
+    step = math.gcd(*lags)
+    steps = {lag: lag // step for lag in lags}
+    keep = max(steps.values())
+    found = {lag: ([], []) for lag in lags}
+
+    stack = None
+    held = 0  # samples kept from the batches before
+    first = 0  # sample number of stack[0]
+    for batch in batched(sample_frames(path, step), batch_size):
+        frames = [frame for _, frame in batch]
+        if stack is None:
+            frame_shape = frames[0].shape
+            shape = detector.transform_stack(frames[:1]).shape[1:]
+            stack = np.empty((keep + batch_size,) + shape, np.uint8)
+        count = held + len(frames)
+        detector.transform_stack(frames, out=stack[held:count])
+        for lag, k in steps.items():
+            # first new sample on the interval that has one before it
+            position = held + (-(first + held)) % k
+            if first + position < k:
+                position += k
+            if position >= count:
+                continue
+            scores = detector.score_stack(stack[position - k : count : k], frame_shape)
+            samples = first + np.arange(position, count, k)
+            found[lag][0].append(samples * step)
+            found[lag][1].append(scores)
+        kept = min(keep, count)
+        stack[:kept] = stack[count - kept : count]
+        first += count - kept
+        held = kept
+
+    return {
+        lag: (
+            np.concatenate(indices) if indices else np.empty(0, int),
+            np.concatenate(scores) if scores else np.empty(0),
+        )
+        for lag, (indices, scores) in found.items()
+    }
+
+
+def scan_file(
+    path: str,
+    threshold: float = SIM_THRESHOLD,
+    every: int = N_FRAMES,
+    engine: str = MOTION_ENGINE,
+    batch_size: int = SCAN_BATCH_SIZE,
+    merge_gap: float = SCAN_MERGE_GAP,
+) -> Dict:
+    """
+    Detect the motion segments of a video file.
+
+    Args:
+        path (str): The video file.
+        threshold (float, optional): Similarity score below which there is
+                                     movement.
+        every (int, optional): Only detect on every n-th frame.
+        engine (str, optional): The motion engine.
+        batch_size (int, optional): Frames decoded per batch.
+        merge_gap (float, optional): Seconds of stillness that still join
+                                     two segments.
+
+    Returns:
+        The path, settings, fps, number of frames and duration of the video,
+        its segments, and the seconds the scan took.
+
+    """
+    begin = time.perf_counter()
+    cap = cv2.VideoCapture(path)
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+
+    detector = _create_detector(engine)
+    if engine == "difference":
+        # compares each sample with the one before: score batches as stacks
+        indices, scores = score_lags(path, [every], batch_size, detector)[every]
+        segments = sweep_thresholds(
+            indices, scores, fps, [threshold], every, merge_gap
+        )[threshold]
+    else:
+        results = []
+        for batch in batched(sample_frames(path, every), batch_size):
+            for index, frame in batch:
+                has_movement, score = detector.update(Image(frame), threshold)
+                results.append((index, has_movement, score))
+        segments = find_segments(results, fps, every, merge_gap)
+    return {
+        "path": path,
+        "engine": engine,
+        "threshold": threshold,
+        "every": every,
+        "fps": fps,
+        "frames": frame_count,
+        "duration": frame_count / fps,
+        "segments": [segment._asdict() for segment in segments],
+        "elapsed": time.perf_counter() - begin,
+    }
+
+
+def sweep_file(
+    path: str,
+    thresholds: Sequence[float],
+    lags: Sequence[int],
+    batch_size: int = SCAN_BATCH_SIZE,
+    merge_gap: float = SCAN_MERGE_GAP,
+) -> Dict:
+    """
+    Count the motion segments of a video file for every combination of
+    thresholds and frame intervals, decoding it once.
+
+    Args:
+        path (str): The video file.
+        thresholds: Similarity scores below which there is movement.
+        lags: Frame intervals, the N_FRAMES to try.
+        batch_size (int, optional): Frames decoded per batch.
+        merge_gap (float, optional): Seconds of stillness that still join
+                                     two segments.
+
+    Returns:
+        The path, fps, number of frames and duration of the video, the
+        number of segments and seconds of motion of each combination, and
+        the seconds the sweep took.
+
+    """
+    begin = time.perf_counter()
+    cap = cv2.VideoCapture(path)
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+
+    sweep = []
+    for lag, (indices, scores) in score_lags(path, lags, batch_size).items():
+        segments = sweep_thresholds(indices, scores, fps, thresholds, lag, merge_gap)
+        for threshold in thresholds:
+            found = segments[threshold]
+            sweep.append(
+                {
+                    "every": lag,
+                    "threshold": threshold,
+                    "segments": len(found),
+                    "motion": sum(segment.end - segment.start for segment in found),
+                }
+            )
+    return {
+        "path": path,
+        "fps": fps,
+        "frames": frame_count,
+        "duration": frame_count / fps,
+        "sweep": sweep,
+        "elapsed": time.perf_counter() - begin,
+    }
+
+
+def find_videos(paths: Iterable[str]) -> List[str]:
+    """
+    List the video files of files and directories, recursively.
+
+    Args:
+        paths: Files and directories.
+
+    Returns:
+        The video files, sorted.
+
+    """
+    videos = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                videos.extend(
+                    os.path.join(root, name)
+                    for name in files
+                    if name.lower().endswith(VIDEO_EXTENSIONS)
+                )
+        else:
+            videos.append(path)
+    return sorted(videos)
+
+
+def load_done(
+    output: Optional[str], threshold: float, every: int, engine: str = MOTION_ENGINE
+) -> set:
+    """
+    Read which files an earlier scan with the same settings finished.
+
+    Args:
+        output (str): The JSON lines output, or None.
+        threshold (float): The threshold of this scan.
+        every (int): The sampling of this scan.
+        engine (str, optional): The motion engine of this scan.
+
+    Returns:
+        The paths already scanned.
+
+    """
+    done = set()
+    if output is None or not os.path.exists(output):
+        return done
+    with open(output) as file:
+        for line in file:
+            try:
+                result = json.loads(line)
+            except ValueError:
+                continue  # a line cut short by an interrupted scan
+            if (
+                result.get("engine") == engine
+                and result.get("threshold") == threshold
+                and result.get("every") == every
+            ):
+                done.add(result["path"])
+    return done
+
+
+def scan_files(
+    paths: Iterable[str],
+    threshold: float = SIM_THRESHOLD,
+    every: int = N_FRAMES,
+    engine: str = MOTION_ENGINE,
+    workers: int = SCAN_WORKERS,
+    output: Optional[str] = None,
+    progress: bool = False,
+) -> Iterator[Dict]:
+    """
+    Scan video files in a pool of worker processes, one file per task,
+    appending each result to a JSON lines file as soon as it is done.
+
+    Args:
+        paths: The video files and directories of video files.
+        threshold (float, optional): Similarity score below which there is
+                                     movement.
+        every (int, optional): Only detect on every n-th frame.
+        engine (str, optional): The motion engine.
+        workers (int, optional): Number of worker processes. 1 scans in
+                                 this process.
+        output (str, optional): JSON lines file to append results to.
+                                Files it already has results for with the
+                                same threshold and sampling are skipped.
+        progress (bool, optional): Print progress to stderr.
+
+    Yields:
+        The result of each file, in the order they finish.
+
+    """
+    videos = find_videos(paths)
+    done = load_done(output, threshold, every, engine)
+    todo = [video for video in videos if video not in done]
+    out = open(output, "a") if output is not None else None
+    try:
+        if workers <= 1:
+            results = (scan_file(video, threshold, every, engine) for video in todo)
+            yield from _record(results, out, len(done), len(videos), progress)
+            return
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(workers, mp_context=context) as pool:
+            futures = [
+                pool.submit(scan_file, video, threshold, every, engine)
+                for video in todo
+            ]
+            results = (future.result() for future in as_completed(futures))
+            yield from _record(results, out, len(done), len(videos), progress)
+    finally:
+        if out is not None:
+            out.close()
+
+
+def _record(
+    results: Iterable[Dict], out, done: int, total: int, progress: bool
+) -> Iterator[Dict]:
+    """
+    Append results to the output as they arrive and report progress.
+
+    Args:
+        results: The results of the files.
+        out: The open output file, or None.
+        done (int): Number of files scanned before.
+        total (int): Number of files to scan in all.
+        progress (bool): Print progress to stderr.
+
+    Yields:
+        The results.
+
+    """
+    for result in results:
+        if out is not None:
+            out.write(json.dumps(result) + "\n")
+            out.flush()
+        done += 1
+        if progress:
+            speed = result["duration"] / result["elapsed"] if result["elapsed"] else 0
+            print(
+                f"[{done}/{total}] {result['path']}: "
+                f"{len(result['segments'])} segments, {speed:.1f}x real time",
+                file=sys.stderr,
+            )
+        yield result
+
+
+def _create_detector(engine: str) -> Detector:
+    """
+    Create a detector with the detection size and regions of the live
+    pipeline.
+
+    Args:
+        engine (str): The motion engine.
+
+    Returns:
+        The detector.
+
+    """
+    return Detector(
+        detect_size=DETECT_SIZE,
+        regions=DETECT_REGIONS,
+        exclusions=DETECT_EXCLUDE,
+        engine=engine,
+    )
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("paths", nargs="+", help="video files or directories")
+    parser.add_argument("--threshold", type=float, default=SIM_THRESHOLD)
+    parser.add_argument("--every", type=int, default=N_FRAMES)
+    parser.add_argument("--engine", default=MOTION_ENGINE)
+    parser.add_argument("--workers", type=int, default=SCAN_WORKERS)
+    parser.add_argument("--output", default="scan.jsonl")
+    parser.add_argument(
+        "--sweep", help="comma separated thresholds to count segments for"
+    )
+    parser.add_argument(
+        "--lags", default=str(N_FRAMES), help="comma separated frame intervals"
+    )
+    args = parser.parse_args(argv)
+
+    if args.sweep:
+        thresholds = [float(value) for value in args.sweep.split(",")]
+        lags = [int(value) for value in args.lags.split(",")]
+        for video in find_videos(args.paths):
+            result = sweep_file(video, thresholds, lags)
+            print(f"{video} ({result['duration']:.0f}s, {result['elapsed']:.1f}s)")
+            for row in result["sweep"]:
+                print(
+                    f"  every {row['every']:>4}  threshold {row['threshold']:>6}  "
+                    f"{row['segments']:>5} segments  {row['motion']:>8.1f}s motion"
+                )
+        return
+
+    begin = time.perf_counter()
+    duration = 0.0
+    results = scan_files(
+        args.paths,
+        args.threshold,
+        args.every,
+        args.engine,
+        args.workers,
+        args.output,
+        progress=True,
+    )
+    for result in results:
+        duration += result["duration"]
+    elapsed = time.perf_counter() - begin
+    if elapsed and duration:
+        print(
+            f"Scanned {duration:.0f}s of video in {elapsed:.1f}s, "
+            f"{duration / elapsed:.1f}x real time",
+            file=sys.stderr,
+        )
+
+
+if __name__ == "__main__":
+    main()
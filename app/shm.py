@@ -0,0 +1,235 @@
+import os
+from multiprocessing import shared_memory
+from typing import Optional, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+# shared memory
+FRAME_RING_SLOTS = int(os.getenv("FRAME_RING_SLOTS", 4))
+
+ALIGNMENT = 64
+
+
+class FrameRing:
+    """
+    A fixed number of frame slots, and the JPEG of each frame, in shared
+    memory. One process writes; any number of consumers in any process read
+    the frames in place, as numpy views, instead of receiving copies.
+
+    Frames are numbered from 1 and frame seq goes to slot seq % slots. Each
+    slot has a generation stamp: 2 * seq - 1 while frame seq is written and
+    2 * seq once it is complete. A reader checks the stamp before and after
+    using a view; if it changed, the writer has lapped the ring and the data
+    read may be torn.
+
+    Args:
+        shape: The (height, width, channels) shape of the frames.
+        slots: Number of frames kept.
+        name: The name of an existing ring to attach to.
+              Defaults to creating a new ring.
+
+    Attributes:
+        __shape: The (height, width, channels) shape of the frames
+        __slots: Number of frames kept
+        __shm: The SharedMemory block
+        __owner: Whether this object created the block
+        __latest: int64 view holding the sequence number of the latest frame
+        __stamps: int64 view of the (stamp, JPEG length) of each slot
+        __frames: Views of the frame slots
+        __jpegs: View of the JPEG slots
+    """
+
+    def __init__(
+        self,
+        shape: Tuple[int, ...],
+        slots: int = FRAME_RING_SLOTS,
+        name: Optional[str] = None,
+    ) -> None:
+        if slots < 1:
+            raise ValueError(f"A frame ring needs at least one slot, got {slots}")
+        self.__shape = tuple(shape)
+        self.__slots = slots
+        frame_size = int(np.prod(self.__shape))
+        # slots start on cache line boundaries
+        header_size = -(-(8 + 16 * slots) // ALIGNMENT) * ALIGNMENT
+        slot_size = -(-frame_size // ALIGNMENT) * ALIGNMENT
+        # a JPEG is always far smaller than the raw frame
+        size = header_size + 2 * slots * slot_size
+        self.__owner = name is None
+        if self.__owner:
+            self.__shm = shared_memory.SharedMemory(create=True, size=size)
+        else:
+            self.__shm = shared_memory.SharedMemory(name=name)
+        buf = self.__shm.buf
+        self.__latest = np.ndarray((1,), np.int64, buf, 0)
+        self.__stamps = np.ndarray((slots, 2), np.int64, buf, 8)
+        frames = np.ndarray((slots, slot_size), np.uint8, buf, header_size)
+        self.__frames = [
+            frames[slot, :frame_size].reshape(self.__shape) for slot in range(slots)
+        ]
+        self.__jpegs = np.ndarray(
+            (slots, frame_size), np.uint8, buf, header_size + slots * slot_size
+        )
+        if self.__owner:
+            self.__latest[:] = 0
+            self.__stamps[:] = 0
+
+    def get_name(self) -> str:
+        """
+        Gets the name other processes attach with.
+
+        Returns:
+            The shared memory name.
+
+        """
+        return self.__shm.name
+
+    def get_shape(self) -> Tuple[int, ...]:
+        """
+        Gets the shape of the frames.
+
+        Returns:
+            The (height, width, channels) shape.
+
+        """
+        return self.__shape
+
+    def get_slots(self) -> int:
+        """
+        Gets the number of frames kept.
+
+        Returns:
+            The number of slots.
+
+        """
+        return self.__slots
+
+    def get_seq(self) -> int:
+        """
+        Gets the sequence number of the latest complete frame.
+
+        Returns:
+            The sequence number, 0 before the first frame.
+
+        """
+        return int(self.__latest[0])
+
+    def write(self, frame: np.ndarray, jpeg: Optional[memoryview] = None) -> int:
+        """
+        Write a frame and optionally its JPEG to the next slot, overwriting
+        the oldest frame. Only one process may write.
+
+        Args:
+            frame (np.ndarray): The frame, of the ring's shape.
+            jpeg (memoryview, optional): The JPEG of the frame.
+
+        Returns:
+            The sequence number of the frame.
+
+        """
+        seq = int(self.__latest[0]) + 1
+        slot = seq % self.__slots
+        jpeg_len = len(jpeg) if jpeg is not None else 0
+        if jpeg_len > self.__jpegs.shape[1]:
+            jpeg_len = 0
+        self.__stamps[slot, 0] = 2 * seq - 1  # odd: writing
+        np.copyto(self.__frames[slot], frame)
+        if jpeg_len:
+            self.__jpegs[slot, :jpeg_len] = np.frombuffer(jpeg, np.uint8)
+        self.__stamps[slot, 1] = jpeg_len
+        self.__stamps[slot, 0] = 2 * seq  # even: complete
+        self.__latest[0] = seq
+        return seq
+
+    def is_valid(self, seq: int) -> bool:
+        """
+        Check that a frame is complete and has not been overwritten, such as
+        after reading a view of it.
+
+        Args:
+            seq (int): The sequence number of the frame.
+
+        Returns:
+            True if the slot still holds the complete frame.
+
+        """
+        return seq > 0 and int(self.__stamps[seq % self.__slots, 0]) == 2 * seq
+
+    def view(self, seq: int) -> Optional[np.ndarray]:
+        """
+        Get a read-only view of a frame, without copying. The view stays
+        valid until the writer laps the ring: check is_valid(seq) after
+        using it.
+
+        Args:
+            seq (int): The sequence number of the frame.
+
+        Returns:
+            The view, or None if the frame is not in the ring.
+
+        """
+        if not self.is_valid(seq):
+            return None
+        frame = self.__frames[seq % self.__slots].view()
+        frame.flags.writeable = False
+        return frame
+
+    def read_frame(self, seq: Optional[int] = None) -> Tuple[int, Optional[np.ndarray]]:
+        """
+        Copy out a frame.
+
+        Args:
+            seq (int, optional): The sequence number of the frame.
+                                 Defaults to the latest frame.
+
+        Returns:
+            The sequence number and frame, or None for the frame if it is not
+            in the ring or was overwritten while copying.
+
+        """
+        seq = self.get_seq() if seq is None else seq
+        frame = self.view(seq)
+        if frame is None:
+            return seq, None
+        frame = frame.copy()
+        if not self.is_valid(seq):
+            return seq, None
+        return seq, frame
+
+    def read_jpeg(self, seq: Optional[int] = None) -> Tuple[int, Optional[bytes]]:
+        """
+        Copy out the JPEG of a frame.
+
+        Args:
+            seq (int, optional): The sequence number of the frame.
+                                 Defaults to the latest frame.
+
+        Returns:
+            The sequence number and JPEG bytes, or None for the bytes if the
+            frame is not in the ring, was overwritten while copying or has no
+            JPEG.
+
+        """
+        seq = self.get_seq() if seq is None else seq
+        if not self.is_valid(seq):
+            return seq, None
+        slot = seq % self.__slots
+        jpeg_len = int(self.__stamps[slot, 1])
+        jpeg = self.__jpegs[slot, :jpeg_len].tobytes() if jpeg_len else None
+        if not self.is_valid(seq):
+            return seq, None
+        return seq, jpeg
+
+    def close(self) -> None:
+        """
+        Detach from the shared memory, and free it if this object created it.
+        Views handed out must no longer be used.
+
+        """
+        self.__latest = self.__stamps = self.__jpegs = None
+        self.__frames = []
+        self.__shm.close()
+        if self.__owner:
+            self.__shm.unlink()
@@ -0,0 +1,622 @@
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Optional, Tuple, Union
+
+import cv2
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+# camera
+FPS = int(os.getenv("FPS"))
+WIDTH = int(os.getenv("WIDTH"))
+HEIGHT = int(os.getenv("HEIGHT"))
+
+# frame source
+SOURCE_PACING = os.getenv("SOURCE_PACING", "realtime")
+CAPTURE_MODE = os.getenv("CAPTURE_MODE", "sequential")
+
+PACING_MODES = ("realtime", "fast")
+CAPTURE_MODES = ("sequential", "latest")
+
+
+class FrameSource(ABC):
+    """
+    Base class for where a Camera gets its frames: a capture device, a video
+    file, a network stream or a synthetic scene.
+
+    Sources that replay frames can be paced in real time, delivering frames
+    at the fps the source was opened with, or run as fast as the consumer
+    reads them to measure the maximum throughput of the pipeline. Devices and
+    network streams deliver frames at their own pace.
+
+    Args:
+        pacing: "realtime" or "fast".
+
+    Attributes:
+        __pacing: "realtime" or "fast"
+        __interval: Seconds between frames when paced in real time
+        __deadline: perf_counter time the next paced frame is due
+    """
+
+    def __init__(self, pacing: str = SOURCE_PACING) -> None:
+        if pacing not in PACING_MODES:
+            raise ValueError(f"Unknown pacing {pacing!r}, use one of {PACING_MODES}")
+        self.__pacing = pacing
+        self.__interval = 0.0
+        self.__deadline = None
+
+    def get_pacing(self) -> str:
+        """
+        Gets how replayed frames are paced.
+
+        Returns:
+            "realtime" or "fast".
+
+        """
+        return self.__pacing
+
+    def open(
+        self, fps: int = FPS, frame_size: Tuple[int, int] = (WIDTH, HEIGHT)
+    ) -> bool:
+        """
+        Open the source.
+
+        Args:
+            fps (int, optional): The fps to deliver frames at.
+            frame_size (tuple, optional): The (width, height) of the frames.
+
+        Returns:
+            True if the source can deliver frames.
+
+        """
+        self.__interval = 1 / fps if fps else 0.0
+        self.__deadline = None
+        return True
+
+    def read(self) -> Optional[np.ndarray]:
+        """
+        Read the next frame, waiting for it to be due in real time pacing.
+
+        Returns:
+            The BGR frame, or None when the source has no more frames.
+
+        """
+        frame = self.grab()
+        if frame is not None:
+            self._pace()
+        return frame
+
+    def _pace(self) -> None:
+        """
+        Wait for the next frame to be due in real time pacing.
+
+        """
+        if self.__pacing != "realtime" or not self.__interval:
+            return
+        now = time.perf_counter()
+        if self.__deadline is None or self.__deadline < now - self.__interval:
+            self.__deadline = now  # start, or too far behind to catch up
+        elif self.__deadline > now:
+            time.sleep(self.__deadline - now)
+        self.__deadline += self.__interval
+
+    @abstractmethod
+    def grab(self) -> Optional[np.ndarray]:
+        """
+        Get the next frame, without pacing.
+
+        Returns:
+            The BGR frame, or None when the source has no more frames.
+
+        """
+
+    def close(self) -> None:
+        """
+        Release the source.
+
+        """
+
+    def get_dropped_frames(self) -> int:
+        """
+        Gets the number of frames the source skipped because the consumer
+        was reading slower than they arrived.
+
+        Returns:
+            The number of frames dropped.
+
+        """
+        return 0
+
+    @abstractmethod
+    def get_fps(self) -> float:
+        """
+        Gets the fps of the source.
+
+        Returns:
+            The fps of the source.
+
+        """
+
+    @abstractmethod
+    def get_frame_size(self) -> Tuple[int, int]:
+        """
+        Gets the frame size (width, height) of the source.
+
+        Returns:
+            The frame size of the source.
+
+        """
+
+
+class CaptureSource(FrameSource):
+    """
+    Frames read through an OpenCV VideoCapture.
+
+    Args:
+        target: A device index, file path or stream URL.
+        pacing: "realtime" or "fast".
+
+    Attributes (shared with subclasses):
+        _target: The device index, file path or stream URL
+        _cap: The OpenCV VideoCapture, once opened
+        _frame_size: The (width, height) frames are delivered at
+        _fps: The fps frames are delivered at
+    """
+
+    def __init__(self, target: Union[int, str], pacing: str = "fast") -> None:
+        super().__init__(pacing)
+        self._target = target
+        self._cap = None
+        self._frame_size = (WIDTH, HEIGHT)
+        self._fps = FPS
+
+    def open(
+        self, fps: int = FPS, frame_size: Tuple[int, int] = (WIDTH, HEIGHT)
+    ) -> bool:
+        super().open(fps, frame_size)
+        self._cap = cv2.VideoCapture(self._target)
+        if not self._cap.isOpened():
+            print(f"Cannot open {self._target}.")
+            self.close()
+            return False
+        self._frame_size = tuple(frame_size)
+        self._fps = fps
+        return True
+
+    def grab(self) -> Optional[np.ndarray]:
+        if not self.capture():
+            return None
+        return self.retrieve()
+
+    def capture(self) -> bool:
+        """
+        Advance to the next frame without decoding it.
+
+        Returns:
+            True if there was a next frame.
+
+        """
+        if self._cap is None:
+            return False
+        return self._cap.grab()
+
+    def retrieve(self) -> Optional[np.ndarray]:
+        """
+        Decode the frame captured last.
+
+        Returns:
+            The BGR frame, or None if it cannot be decoded.
+
+        """
+        if self._cap is None:
+            return None
+        ret, frame = self._cap.retrieve()
+        if not ret:
+            return None
+        if (frame.shape[1], frame.shape[0]) != self._frame_size:
+            frame = cv2.resize(frame, self._frame_size, interpolation=cv2.INTER_AREA)
+        return frame
+
+    def close(self) -> None:
+        if self._cap is not None:
+            self._cap.release()
+            self._cap = None
+
+    def get_fps(self) -> float:
+        return self._fps
+
+    def get_frame_size(self) -> Tuple[int, int]:
+        return self._frame_size
+
+
+class DeviceSource(CaptureSource):
+    """
+    A capture device such as a webcam, asked for the requested fps and frame
+    size. The device paces the frames.
+
+    Args:
+        camid: The device index.
+    """
+
+    def __init__(self, camid: int = 0) -> None:
+        super().__init__(camid, pacing="fast")
+
+    def open(
+        self, fps: int = FPS, frame_size: Tuple[int, int] = (WIDTH, HEIGHT)
+    ) -> bool:
+        if not super().open(fps, frame_size):
+            return False
+        self._cap.set(cv2.CAP_PROP_FRAME_HEIGHT, frame_size[1])
+        self._cap.set(cv2.CAP_PROP_FRAME_WIDTH, frame_size[0])
+        self._cap.set(cv2.CAP_PROP_FPS, fps)
+        width = int(self._cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(self._cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        self._frame_size = (width, height)
+        self._fps = self._cap.get(cv2.CAP_PROP_FPS)
+        return True
+
+
+class FileSource(CaptureSource):
+    """
+    Frames replayed from a video file, resized to the requested frame size.
+
+    Args:
+        path: The video file.
+        pacing: "realtime" replays at the requested fps, "fast" as fast as
+                frames are decoded.
+        loop: Restart from the beginning at the end of the file.
+
+    Attributes:
+        __loop: Whether to restart at the end of the file
+    """
+
+    def __init__(
+        self, path: str, pacing: str = SOURCE_PACING, loop: bool = False
+    ) -> None:
+        super().__init__(path, pacing)
+        self.__loop = loop
+
+    def capture(self) -> bool:
+        captured = super().capture()
+        if not captured and self.__loop and self._cap is not None:
+            self._cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            captured = super().capture()
+        return captured
+
+
+class RtspSource(CaptureSource):
+    """
+    Frames from a network stream such as an RTSP camera, resized to the
+    requested frame size. The stream paces the frames.
+
+    Args:
+        url: The stream URL.
+    """
+
+    def __init__(self, url: str) -> None:
+        super().__init__(url, pacing="fast")
+
+    def open(
+        self, fps: int = FPS, frame_size: Tuple[int, int] = (WIDTH, HEIGHT)
+    ) -> bool:
+        FrameSource.open(self, fps, frame_size)
+        self._cap = cv2.VideoCapture(self._target, cv2.CAP_FFMPEG)
+        if not self._cap.isOpened():
+            print(f"Cannot open {self._target}.")
+            self.close()
+            return False
+        # keep the latest frame rather than a backlog of stale ones
+        self._cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        self._frame_size = tuple(frame_size)
+        self._fps = self._cap.get(cv2.CAP_PROP_FPS) or fps
+        return True
+
+
+class SyntheticSource(FrameSource):
+    """
+    A generated scene: a noisy background with squares moving across it,
+    optionally under slowly changing lighting. Frames are built from
+    precomputed noise, so generating them costs little next to the pipeline.
+
+    Args:
+        pacing: "realtime" or "fast".
+        shapes: Number of moving squares.
+        motion: (still, moving) numbers of frames the squares alternately
+                stay still and move for, starting still. None keeps them
+                moving.
+        flicker: Amplitude of the lighting change, as a fraction of the
+                 brightness.
+        noise: Maximum sensor noise added to each pixel.
+        frames: Number of frames before the source ends. None never ends.
+        seed: Seed of the random background and noise.
+
+    Attributes:
+        __shapes: Number of moving squares
+        __motion: (still, moving) frames of each cycle, or None
+        __flicker: Amplitude of the lighting change
+        __noise: Maximum sensor noise
+        __frames: Number of frames before the source ends, or None
+        __seed: Seed of the random background and noise
+        __frame_size: The (width, height) of the frames
+        __fps: The fps of the scene
+        __background: The static background
+        __noise_pool: Precomputed noise frames, cycled through
+        __count: Number of frames generated
+    """
+
+    def __init__(
+        self,
+        pacing: str = SOURCE_PACING,
+        shapes: int = 1,
+        motion: Optional[Tuple[int, int]] = None,
+        flicker: float = 0.0,
+        noise: int = 6,
+        frames: Optional[int] = None,
+        seed: int = 0,
+    ) -> None:
+        super().__init__(pacing)
+        self.__shapes = shapes
+        self.__motion = motion
+        self.__flicker = flicker
+        self.__noise = noise
+        self.__frames = frames
+        self.__seed = seed
+        self.__frame_size = (WIDTH, HEIGHT)
+        self.__fps = FPS
+        self.__background = None
+        self.__noise_pool = []
+        self.__count = 0
+
+    def open(
+        self, fps: int = FPS, frame_size: Tuple[int, int] = (WIDTH, HEIGHT)
+    ) -> bool:
+        super().open(fps, frame_size)
+        self.__frame_size = tuple(frame_size)
+        self.__fps = fps
+        width, height = self.__frame_size
+        rng = np.random.default_rng(self.__seed)
+        self.__background = rng.integers(60, 120, (height, width, 3), dtype=np.uint8)
+        self.__noise_pool = [
+            rng.integers(0, self.__noise + 1, (height, width, 3), dtype=np.uint8)
+            for _ in range(8 if self.__noise else 0)
+        ]
+        self.__count = 0
+        return True
+
+    def grab(self) -> Optional[np.ndarray]:
+        if self.__background is None:
+            return None
+        if self.__frames is not None and self.__count >= self.__frames:
+            return None
+        index = self.__count
+        self.__count += 1
+
+        # a new frame each time: consumers may keep frames they are given
+        if self.__noise_pool:
+            frame = cv2.add(self.__background, self.__noise_pool[index % 8])
+        else:
+            frame = self.__background.copy()
+
+        width, height = self.__frame_size
+        side = max(min(width, height) // 5, 1)
+        for shape in range(self.__shapes):
+            x = self.__shape_offset(index, shape, width - side)
+            y = (height // (self.__shapes + 1) * (shape + 1) - side // 2) % (
+                height - side + 1
+            )
+            frame[y : y + side, x : x + side] = 230
+
+        if self.__flicker:
+            gain = 1 + self.__flicker * np.sin(2 * np.pi * index / (4 * self.__fps))
+            cv2.convertScaleAbs(frame, frame, alpha=gain)
+        return frame
+
+    def __shape_offset(self, index: int, shape: int, span: int) -> int:
+        """
+        Gets the horizontal position of a square at a frame.
+
+        Args:
+            index (int): The frame number.
+            shape (int): The square number.
+            span (int): The range of positions.
+
+        Returns:
+            The x coordinate of the square.
+
+        """
+        if self.__motion is not None:
+            # count only the frames spent moving
+            still, moving = self.__motion
+            cycles, cycle = divmod(index, still + moving)
+            index = cycles * moving + max(cycle - still, 0)
+        step = 8 + 4 * shape
+        position = (index * step + shape * span // max(self.__shapes, 1)) % (
+            2 * max(span, 1)
+        )
+        return position if position <= span else 2 * span - position
+
+    def get_fps(self) -> float:
+        return self.__fps
+
+    def get_frame_size(self) -> Tuple[int, int]:
+        return self.__frame_size
+
+
+class LatestFrameSource(FrameSource):
+    """
+    Wraps a source with a grabber thread that keeps advancing it, so a
+    consumer slower than the source always reads the newest frame instead of
+    a backlog of stale ones buffered by the driver or the network stream.
+
+    Capture sources are advanced with grab() and only the frame a consumer
+    asks for is decoded with retrieve(); other sources are read whole. Every
+    frame the grabber moves past before the consumer read it is counted as
+    dropped. Live latency is then at most one frame, however slow the
+    consumer is.
+
+    Args:
+        source: The source to read from. Its pacing paces the grabber.
+
+    Attributes:
+        __source: The wrapped source
+        __capture: Whether the source is advanced without decoding
+        __condition: Guards the source and the counters below
+        __thread: The grabber thread, while open
+        __stopped: Whether close was called
+        __ended: Whether the source has no more frames
+        __waiting: Number of consumers waiting in read
+        __seq: Number of frames the grabber advanced to
+        __read_seq: The frame consumers read last
+        __frame: The newest frame of a source read whole
+        __dropped: Number of frames never read
+    """
+
+    def __init__(self, source: FrameSource) -> None:
+        super().__init__(source.get_pacing())
+        self.__source = source
+        self.__capture = isinstance(source, CaptureSource)
+        self.__condition = threading.Condition()
+        self.__thread = None
+        self.__stopped = False
+        self.__ended = False
+        self.__waiting = 0
+        self.__seq = 0
+        self.__read_seq = 0
+        self.__frame = None
+        self.__dropped = 0
+
+    def open(
+        self, fps: int = FPS, frame_size: Tuple[int, int] = (WIDTH, HEIGHT)
+    ) -> bool:
+        super().open(fps, frame_size)
+        if not self.__source.open(fps, frame_size):
+            return False
+        self.__stopped = self.__ended = False
+        self.__seq = self.__read_seq = self.__dropped = 0
+        self.__frame = None
+        self.__thread = threading.Thread(target=self.__grab_frames, daemon=True)
+        self.__thread.start()
+        return True
+
+    def read(self) -> Optional[np.ndarray]:
+        """
+        Read the newest frame the grabber advanced to, waiting for one the
+        consumer has not read yet.
+
+        Returns:
+            The BGR frame, or None when the source has no more frames.
+
+        """
+        with self.__condition:
+            self.__waiting += 1
+            try:
+                while self.__seq == self.__read_seq and not (
+                    self.__ended or self.__stopped
+                ):
+                    self.__condition.wait()
+                if self.__seq == self.__read_seq:
+                    return None
+                self.__read_seq = self.__seq
+                if self.__capture:
+                    return self.__source.retrieve()
+                return self.__frame
+            finally:
+                self.__waiting -= 1
+                self.__condition.notify_all()
+
+    def grab(self) -> Optional[np.ndarray]:
+        return self.read()
+
+    def close(self) -> None:
+        with self.__condition:
+            self.__stopped = True
+            self.__condition.notify_all()
+        if self.__thread is not None:
+            self.__thread.join()
+            self.__thread = None
+        self.__source.close()
+
+    def get_dropped_frames(self) -> int:
+        return self.__dropped
+
+    def get_fps(self) -> float:
+        return self.__source.get_fps()
+
+    def get_frame_size(self) -> Tuple[int, int]:
+        return self.__source.get_frame_size()
+
+    def __grab_frames(self) -> None:
+        """
+        Runs the grabber thread: advances the source as frames arrive, until
+        it ends or the source is closed.
+
+        """
+        while True:
+            self._pace()
+            with self.__condition:
+                # let a waiting consumer take the frame just grabbed first
+                while (
+                    self.__waiting
+                    and self.__seq > self.__read_seq
+                    and not self.__stopped
+                ):
+                    self.__condition.wait()
+                if self.__stopped:
+                    return
+                if self.__capture:
+                    grabbed = self.__source.capture()
+                else:
+                    self.__frame = self.__source.grab()
+                    grabbed = self.__frame is not None
+                if not grabbed:
+                    if self.__capture and self.__seq > self.__read_seq:
+                        # a failed grab leaves nothing to retrieve
+                        self.__dropped += 1
+                        self.__read_seq = self.__seq
+                    self.__ended = True
+                    self.__condition.notify_all()
+                    return
+                if self.__seq > self.__read_seq:
+                    self.__dropped += 1
+                self.__seq += 1
+                self.__condition.notify_all()
+
+
+def create_source(
+    target: Union[int, str, FrameSource],
+    pacing: str = SOURCE_PACING,
+    capture: str = CAPTURE_MODE,
+) -> FrameSource:
+    """
+    Create a frame source from a camera configuration value: a device index,
+    an rtsp:// or http:// URL, "synthetic", or a video file path.
+
+    Args:
+        target: What to read frames from. A FrameSource is returned as is.
+        pacing (str, optional): Pacing of file and synthetic sources.
+        capture (str, optional): "sequential" reads every frame in order,
+                                 "latest" always reads the newest frame from
+                                 a grabber thread.
+
+    Returns:
+        The frame source.
+
+    """
+    if capture not in CAPTURE_MODES:
+        raise ValueError(f"Unknown capture {capture!r}, use one of {CAPTURE_MODES}")
+    if isinstance(target, FrameSource):
+        return target
+    if isinstance(target, int) or str(target).isdigit():
+        source = DeviceSource(int(target))
+    elif str(target).startswith(("rtsp://", "rtsps://", "http://", "https://")):
+        source = RtspSource(target)
+    elif target == "synthetic":
+        source = SyntheticSource(pacing)
+    else:
+        source = FileSource(target, pacing)
+    if capture == "latest":
+        return LatestFrameSource(source)
+    return source
@@ -0,0 +1,264 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+import cv2
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+# video
+VID_DIR = os.getenv("VID_DIR")
+
+# thumbnails
+THUMBNAILS = bool(int(os.getenv("THUMBNAILS", 1)))
+THUMBNAIL_WIDTH = int(os.getenv("THUMBNAIL_WIDTH", 160))
+THUMBNAIL_QUALITY = int(os.getenv("THUMBNAIL_QUALITY", 80))
+SPRITE_FRAMES = int(os.getenv("SPRITE_FRAMES", 8))
+THUMBNAIL_CACHE_SIZE = int(os.getenv("THUMBNAIL_CACHE_SIZE", 512))
+
+THUMBNAIL_KINDS = ("thumbnail", "sprite")
+
+
+class KeyframeCollector:
+    """
+    Keeps small copies of frames of a motion event while it is recorded, so
+    its thumbnail and sprite sheet are made from frames already in memory
+    rather than by decoding the video again.
+
+    The thumbnail is the frame with the lowest similarity score, the most
+    motion. Keyframes are sampled evenly over the event without knowing its
+    length in advance: every step-th frame is kept, and when twice the
+    number of sprite frames are kept, every other one is dropped and the
+    step doubles. Only frames that are kept are resized.
+
+    Args:
+        frames: Number of keyframes of the sprite sheet.
+        width: Width of the thumbnail and of each keyframe.
+
+    Attributes:
+        __frames: Number of keyframes of the sprite sheet
+        __width: Width of the thumbnail and keyframes
+        __thumbnail: The resized frame with the lowest score, or None
+        __best_score: The score of the thumbnail frame
+        __keyframes: The resized keyframes kept so far
+        __step: Frames between kept keyframes
+        __count: Number of frames seen
+    """
+
+    def __init__(
+        self, frames: int = SPRITE_FRAMES, width: int = THUMBNAIL_WIDTH
+    ) -> None:
+        self.__frames = max(frames, 1)
+        self.__width = width
+        self.__thumbnail = None
+        self.__best_score = None
+        self.__keyframes = []
+        self.__step = 1
+        self.__count = 0
+
+    def add(self, frame: np.ndarray, score: float) -> None:
+        """
+        Offer a frame of the event.
+
+        Args:
+            frame (np.ndarray): The frame. It is not kept.
+            score (float): The latest similarity score.
+
+        """
+        if self.__best_score is None or score < self.__best_score:
+            self.__thumbnail = self.__resize(frame)
+            self.__best_score = score
+        if self.__count % self.__step == 0:
+            self.__keyframes.append(self.__resize(frame))
+            if len(self.__keyframes) >= 2 * self.__frames:
+                self.__keyframes = self.__keyframes[::2]
+                self.__step *= 2
+        self.__count += 1
+
+    def get_thumbnail(self) -> Optional[np.ndarray]:
+        """
+        Gets the thumbnail of the event.
+
+        Returns:
+            The resized frame with the lowest score, or None before the
+            first frame.
+
+        """
+        return self.__thumbnail
+
+    def get_keyframes(self) -> List[np.ndarray]:
+        """
+        Gets keyframes spread evenly over the event.
+
+        Returns:
+            Up to the number of sprite frames, in order.
+
+        """
+        keyframes = self.__keyframes
+        if len(keyframes) <= self.__frames:
+            return list(keyframes)
+        picks = np.linspace(0, len(keyframes) - 1, self.__frames).round()
+        return [keyframes[int(index)] for index in picks]
+
+    def __resize(self, frame: np.ndarray) -> np.ndarray:
+        """
+        Resize a frame to the thumbnail width, keeping its aspect ratio.
+
+        Args:
+            frame (np.ndarray): The frame.
+
+        Returns:
+            A resized copy.
+
+        """
+        height, width = frame.shape[:2]
+        if width <= self.__width:
+            return frame.copy()
+        size = (self.__width, max(round(height * self.__width / width), 1))
+        return cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+
+
+def thumbnail_paths(video_path: str) -> Tuple[str, str]:
+    """
+    Gets where the thumbnail and sprite sheet of a video are saved: in a
+    thumbnails directory next to it, named after it.
+
+    Args:
+        video_path (str): The video file.
+
+    Returns:
+        The thumbnail and sprite sheet files.
+
+    """
+    directory, name = os.path.split(video_path)
+    base = os.path.join(directory, "thumbnails", os.path.splitext(name)[0])
+    return f"{base}.jpg", f"{base}_sprite.jpg"
+
+
+def save_thumbnails(
+    video_path: str, collector: KeyframeCollector, quality: int = THUMBNAIL_QUALITY
+) -> bool:
+    """
+    Save the thumbnail of a video and a sprite sheet of its keyframes, side
+    by side in one row.
+
+    Args:
+        video_path (str): The video file.
+        collector (KeyframeCollector): The frames collected while recording.
+        quality (int, optional): The JPEG quality.
+
+    Returns:
+        False if no frame was collected.
+
+    """
+    thumbnail = collector.get_thumbnail()
+    keyframes = collector.get_keyframes()
+    if thumbnail is None or not keyframes:
+        return False
+    thumbnail_path, sprite_path = thumbnail_paths(video_path)
+    os.makedirs(os.path.dirname(thumbnail_path), exist_ok=True)
+    params = [cv2.IMWRITE_JPEG_QUALITY, quality]
+    cv2.imwrite(thumbnail_path, thumbnail, params)
+    cv2.imwrite(sprite_path, np.hstack(keyframes), params)
+    return True
+
+
+def extract_thumbnail(
+    video_path: str, width: int = THUMBNAIL_WIDTH, quality: int = THUMBNAIL_QUALITY
+) -> bool:
+    """
+    Save a thumbnail from the middle frame of a video recorded without one,
+    decoding only that frame.
+
+    Args:
+        video_path (str): The video file.
+        width (int, optional): Width of the thumbnail.
+        quality (int, optional): The JPEG quality.
+
+    Returns:
+        False if the video cannot be read.
+
+    """
+    cap = cv2.VideoCapture(video_path)
+    try:
+        count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        if count > 1:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, count // 2)
+        ret, frame = cap.read()
+    finally:
+        cap.release()
+    if not ret:
+        return False
+    collector = KeyframeCollector(frames=1, width=width)
+    collector.add(frame, 0.0)
+    thumbnail_path, _ = thumbnail_paths(video_path)
+    os.makedirs(os.path.dirname(thumbnail_path), exist_ok=True)
+    cv2.imwrite(
+        thumbnail_path, collector.get_thumbnail(), [cv2.IMWRITE_JPEG_QUALITY, quality]
+    )
+    return True
+
+
+class ThumbnailCache:
+    """
+    Keeps the bytes of recently served thumbnails and sprite sheets in
+    memory, least recently used first out, so listing events reads each
+    image from disk once. Entries are keyed by file and modification time,
+    so a rewritten image is read again.
+
+    Args:
+        size: Maximum number of images kept.
+
+    Attributes:
+        __size: Maximum number of images kept
+        __lock: Lock guarding the entries
+        __entries: Image bytes by (path, mtime), least recently used first
+    """
+
+    def __init__(self, size: int = THUMBNAIL_CACHE_SIZE) -> None:
+        self.__size = size
+        self.__lock = threading.Lock()
+        self.__entries = OrderedDict()
+
+    def get(self, video_path: str, kind: str = "thumbnail") -> Optional[bytes]:
+        """
+        Gets the thumbnail or sprite sheet of a video. A missing thumbnail
+        of an existing video is extracted from it once.
+
+        Args:
+            video_path (str): The video file.
+            kind (str, optional): "thumbnail" or "sprite".
+
+        Returns:
+            The JPEG bytes, or None if there is no such image.
+
+        """
+        if kind not in THUMBNAIL_KINDS:
+            raise ValueError(f"Unknown kind {kind!r}, use one of {THUMBNAIL_KINDS}")
+        thumbnail_path, sprite_path = thumbnail_paths(video_path)
+        path = thumbnail_path if kind == "thumbnail" else sprite_path
+        if not os.path.exists(path):
+            if kind == "sprite" or not os.path.exists(video_path):
+                return None
+            if not extract_thumbnail(video_path):
+                return None
+
+        key = (path, os.stat(path).st_mtime_ns)
+        with self.__lock:
+            data = self.__entries.get(key)
+            if data is not None:
+                self.__entries.move_to_end(key)
+                return data
+        with open(path, "rb") as file:
+            data = file.read()
+        with self.__lock:
+            self.__entries[key] = data
+            while len(self.__entries) > self.__size:
+                self.__entries.popitem(last=False)
+        return data
+
+    def __len__(self) -> int:
+        with self.__lock:
+            return len(self.__entries)
@@ -0,0 +1,191 @@
+import os
+import time
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+# stage timing
+STAGE_TIMING = bool(int(os.getenv("STAGE_TIMING", 0)))
+
+
+class StageTimer:
+    """
+    Records how long each stage of the pipeline takes, such as capture,
+    detection or encoding, when enabled, and hands each duration to an
+    observer such as the metrics registry. With neither, timing a stage
+    costs one attribute check.
+
+    Stages are timed with a context manager:
+
+        with timer.stage("encode"):
+            ...
+
+    Args:
+        enabled: Whether to record durations from the start.
+
+    Attributes:
+        __enabled: Whether durations are recorded
+        __samples: Recorded durations in seconds, by stage
+        __observer: Called with the stage name and duration, or None
+        __active: Whether stages are timed at all
+    """
+
+    def __init__(self, enabled: bool = STAGE_TIMING) -> None:
+        self.__enabled = enabled
+        self.__samples = defaultdict(list)
+        self.__observer = None
+        self.__active = enabled
+
+    def enable(self) -> None:
+        """
+        Start recording durations.
+
+        """
+        self.__enabled = True
+        self.__active = True
+
+    def disable(self) -> None:
+        """
+        Stop recording durations.
+
+        """
+        self.__enabled = False
+        self.__active = self.__observer is not None
+
+    def set_observer(self, observer: Optional[Callable[[str, float], None]]) -> None:
+        """
+        Hand every stage duration to an observer, whether or not durations
+        are recorded.
+
+        Args:
+            observer (callable): Called with the stage name and duration in
+                                 seconds. None removes the observer.
+
+        """
+        self.__observer = observer
+        self.__active = self.__enabled or observer is not None
+
+    def is_enabled(self) -> bool:
+        """
+        Gets whether durations are recorded.
+
+        Returns:
+            True if durations are recorded.
+
+        """
+        return self.__enabled
+
+    def stage(self, name: str) -> "_Stage":
+        """
+        Time a stage of the pipeline.
+
+        Args:
+            name (str): The name of the stage.
+
+        Returns:
+            A context manager timing its block.
+
+        """
+        if not self.__active:
+            return NULL_STAGE
+        samples = self.__samples[name] if self.__enabled else None
+        return _Stage(name, samples, self.__observer)
+
+    def reset(self) -> None:
+        """
+        Forget the recorded durations.
+
+        """
+        self.__samples = defaultdict(list)
+
+    def get_samples(self) -> Dict[str, List[float]]:
+        """
+        Gets the recorded durations.
+
+        Returns:
+            The durations in seconds, by stage.
+
+        """
+        return {name: list(samples) for name, samples in self.__samples.items()}
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """
+        Summarize the latency distribution of each stage.
+
+        Returns:
+            The count, mean, p50, p95, p99 and max in milliseconds, by stage.
+
+        """
+        stats = {}
+        for name, samples in self.get_samples().items():
+            if not samples:
+                continue
+            ms = np.array(samples) * 1000
+            p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+            stats[name] = {
+                "count": len(ms),
+                "mean_ms": float(ms.mean()),
+                "p50_ms": float(p50),
+                "p95_ms": float(p95),
+                "p99_ms": float(p99),
+                "max_ms": float(ms.max()),
+            }
+        return stats
+
+
+class _Stage:
+    """
+    Context manager appending the duration of its block to a list and
+    handing it to an observer.
+
+    Args:
+        name: The name of the stage.
+        samples: The list of durations of the stage, or None.
+        observer: Called with the name and duration, or None.
+    """
+
+    __slots__ = ("name", "samples", "observer", "start")
+
+    def __init__(
+        self,
+        name: str,
+        samples: Optional[List[float]],
+        observer: Optional[Callable[[str, float], None]],
+    ) -> None:
+        self.name = name
+        self.samples = samples
+        self.observer = observer
+        self.start = 0.0
+
+    def __enter__(self) -> None:
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc) -> None:
+        duration = time.perf_counter() - self.start
+        if self.samples is not None:
+            self.samples.append(duration)
+        if self.observer is not None:
+            self.observer(self.name, duration)
+
+
+class _NullStage:
+    """
+    Context manager doing nothing, used while timing is disabled.
+    """
+
+    __slots__ = ()
+
+    def __enter__(self) -> None:
+        pass
+
+    def __exit__(self, *exc) -> None:
+        pass
+
+
+NULL_STAGE = _NullStage()
+
+# the timer shared by the pipeline stages
+timer = StageTimer()
@@ -1,19 +1,38 @@
+import math
 import os
+import threading
 import time
 from datetime import datetime
-from typing import Dict
+from typing import AsyncIterator, Callable, Dict, Iterator, Optional, Tuple, Union
 
+import numpy as np
+
+from app.adaptive import (
+    AdaptiveClient,
+    StreamProfile,
+    VariantRegistry,
+    deliver,
+    deliver_async,
+)
+from app.buffer import PREMOTION_SECS, FrameBuffer
 from app.camera import Camera
-import cv2
+from app.encoder import EncodedFrame, JpegEncoder
+from app.events import EventStore, MotionEvent
+from app.hub import FrameHub
 from app.image import Image
+from app.metrics import metrics
 from app.motion import Detector
-import numpy as np
+from app.overlay import OVERLAY_CAMERA_NAME, Clock, Overlay
+from app.recorder import Recorder
+from app.source import FrameSource
+from app.thumbnails import THUMBNAILS, KeyframeCollector, save_thumbnails
 from dotenv import load_dotenv
 
 load_dotenv()
 # video
 VID_DIR = os.getenv("VID_DIR")
 TIME_FORMAT = os.getenv("TIME_FORMAT")
+FILE_TIME_FORMAT = os.getenv("FILE_TIME_FORMAT", "%Y%m%d-%H%M%S")
 STREAM_TIME_MINS = float(os.getenv("STREAM_TIME_MINS"))
 
 # camera
@@ -25,79 +44,527 @@ HEIGHT = int(os.getenv("HEIGHT"))
 N_FRAMES = int(os.getenv("N_FRAMES"))
 SIM_THRESHOLD = float(os.getenv("THRESHOLD"))
 
+# load shedding
+SKIP_WHEN_BEHIND = bool(int(os.getenv("SKIP_WHEN_BEHIND", 1)))
+MAX_FRAME_STRIDE = 4
+
+# idle streaming
+IDLE_STREAM = bool(int(os.getenv("IDLE_STREAM", 0)))
+IDLE_SCORE = float(os.getenv("IDLE_SCORE", 99.5))
+IDLE_KEEPALIVE_SECS = float(os.getenv("IDLE_KEEPALIVE_SECS", 5.0))
+
 
 class Streaming:
     """
     Imitates a video streaming object that uses a Camera object to read frames
     and a Motion Detector object to detect motion by comparing every 10 frames.
+
+    A single capture loop runs in a background thread while at least one
+    client is connected, and broadcasts its frames to every client through a
+    FrameHub, so capture and detection cost does not grow with viewers.
+    Clients use start() from a worker thread or stream() from asyncio.
+
+    Each client can ask for a lower fps, width or JPEG quality, and steps
+    down further while its socket backs up. Variants are encoded once per
+    frame on the capture thread and shared by the clients using them. When
+    the capture loop falls behind real time, it only encodes, buffers and
+    publishes every n-th frame and detects motion less often, while still
+    recording every frame during motion.
+
+    With idle streaming, while the scene is unchanged (no motion and a
+    similarity score of at least IDLE_SCORE) frames are neither encoded for
+    nor published to clients, except for a keepalive frame every
+    idle_keepalive seconds. Frames are published again from the first one
+    the detector scores below IDLE_SCORE.
     """
 
-    def __init__(self, camera: Camera, detector: Detector) -> None:
+    def __init__(
+        self,
+        camera: Union[Camera, FrameSource],
+        detector: Detector,
+        encoder: Optional[JpegEncoder] = None,
+        recorder: Optional[Recorder] = None,
+        premotion: Optional[FrameBuffer] = None,
+        fps: int = FPS,
+        frame_size: Tuple[int, int] = (WIDTH, HEIGHT),
+        camera_id: str = "0",
+        events: Optional[EventStore] = None,
+        idle_stream: bool = IDLE_STREAM,
+        idle_keepalive: float = IDLE_KEEPALIVE_SECS,
+        overlay: Optional[Overlay] = None,
+    ) -> None:
         """Initialize the VideoStreaming object.
 
         Args:
-            camera (Camera): The camera object for reading frames.
+            camera (Camera): The camera object for reading frames. A
+                             FrameSource, such as a video file or a
+                             synthetic scene, is wrapped in a Camera.
             motion_detector (Detector): The detector object for detecting
                                         motion.
+            encoder (JpegEncoder, optional): The JPEG encoder for streamed
+                                             frames. Defaults to the
+                                             settings from .env.
+            recorder (Recorder, optional): The background recorder for
+                                           motion videos. Defaults to the
+                                           settings from .env.
+            premotion (FrameBuffer, optional): The buffer of frames from
+                                               before motion starts.
+                                               Defaults to PREMOTION_SECS
+                                               of frames.
+            fps (int, optional): The fps to start the camera with.
+            frame_size (tuple, optional): The (width, height) to start the
+                                          camera with.
+            camera_id (str, optional): The camera label of the metrics and
+                                       recordings.
+            events (EventStore, optional): The index motion events are added
+                                           to once their video is closed.
+                                           Defaults to no index.
+            idle_stream (bool, optional): Only publish keepalive frames
+                                          while the scene is idle.
+            idle_keepalive (float, optional): Seconds between frames
+                                              published while idle.
+            overlay (Overlay, optional): The timestamp and other overlays
+                                         drawn on the frames. Defaults to
+                                         the settings from .env.
         """
+        if isinstance(camera, FrameSource):
+            camera = Camera(source=camera)
         self.__camera = camera
         self.__detector = detector
+        self.__encoder = encoder if encoder is not None else JpegEncoder()
+        self.__recorder = recorder if recorder is not None else Recorder()
+        if premotion is None:
+            premotion = FrameBuffer(int(PREMOTION_SECS * fps))
+        self.__premotion = premotion
+        self.__fps = fps
+        self.__frame_size = tuple(frame_size)
+        self.__camera_id = camera_id
+        self.__events = events
+        self.__event = None
+        self.__idle_stream = idle_stream
+        self.__idle_keepalive = idle_keepalive
+        if overlay is None:
+            overlay = Overlay(camera_name=camera_id if OVERLAY_CAMERA_NAME else None)
+        self.__overlay = overlay
+        self.__clock = Clock(TIME_FORMAT)
+        self.__variants = VariantRegistry()
+        self.__lock = threading.Lock()
+        self.__clients = 0
+        self.__stopping = False
+        self.__hub = None
+        self.__producer = None
+        self.__previous_producer = None
 
-    def start(self) -> None:
+    def start(self, profile: Optional[StreamProfile] = None) -> Iterator[bytes]:
         """
-        Starts the video streaming process.
+        Streams the shared camera feed to one client.
+
+        The first client starts the capture loop; later clients subscribe to
+        the frames it is already producing.
+
+        Args:
+            profile (StreamProfile, optional): The fps, width and quality
+                                               the client asked for.
+                                               Defaults to the full stream.
+
+        Yields:
+            Multipart JPEG chunks for a multipart/x-mixed-replace response.
         """
-        prev_img = self.__initialize_camera()
-        start_time = time.time()
-        params = {
-            "frameno": 0,
-            "in_motion": False,
-            "is_moving": False,
-            "idle_score": 100.0,
-            "frame": prev_img.get_image(),
-            "current_time": "",
-        }
+        hub = self.__connect()
+        try:
+            client = self.__create_client(profile)
+            for part in deliver(hub.subscribe(), client, self.__variants):
+                metrics.inc("stream_bytes_total", len(part), camera=self.__camera_id)
+                yield part
+        finally:
+            self.__disconnect()
+
+    async def stream(
+        self, profile: Optional[StreamProfile] = None
+    ) -> AsyncIterator[bytes]:
+        """
+        Streams the shared camera feed to one client without blocking the
+        event loop.
+
+        Capture, detection and JPEG encoding all run on the capture thread;
+        this generator only waits for the next encoded chunk.
+
+        Args:
+            profile (StreamProfile, optional): The fps, width and quality
+                                               the client asked for.
+                                               Defaults to the full stream.
+
+        Yields:
+            Multipart JPEG chunks for a multipart/x-mixed-replace response.
+        """
+        hub = self.__connect()
+        try:
+            client = self.__create_client(profile)
+            frames = hub.subscribe_async()
+            async for part in deliver_async(frames, client, self.__variants):
+                metrics.inc("stream_bytes_total", len(part), camera=self.__camera_id)
+                yield part
+        finally:
+            self.__disconnect()
+
+    def __create_client(self, profile: Optional[StreamProfile]) -> AdaptiveClient:
+        """
+        Creates the pacing and variant selection of a new client.
+
+        Args:
+            profile (StreamProfile): The profile the client asked for.
+
+        Returns:
+            The client's AdaptiveClient.
+        """
+        return AdaptiveClient(
+            profile or StreamProfile(),
+            self.__fps,
+            self.__frame_size[0],
+            self.__encoder.get_quality(),
+        )
+
+    def get_client_count(self) -> int:
+        """
+        Gets the number of clients currently streaming.
 
-        # Streaming video for specified durations (in mins)
-        while (time.time() - start_time) < STREAM_TIME_MINS * 60:
-            # Get current time and frame from camera
-            params["current_time"] = datetime.now().strftime(TIME_FORMAT)
-            params["frame"] = self.__camera.read_frame(params["current_time"])
-
-            # Every n frames, compare current and previous frames
-            # to detect motion
-            if params["frameno"] % N_FRAMES == 0:
-                img = Image(params["frame"])
-                is_moving, score = self.__detector.detect_motion(
-                    prev_img, img, SIM_THRESHOLD
+        Returns:
+            The number of connected clients.
+        """
+        return self.__clients
+
+    def get_recorder_metrics(self) -> Dict[str, int]:
+        """
+        Gets the counters of the background recorder.
+
+        Returns:
+            The recorder queue depth, written and dropped frames, and number
+            of videos opened.
+        """
+        return self.__recorder.get_metrics()
+
+    def collect_metrics(self) -> None:
+        """
+        Copies the recorder counters, client count and frames dropped by the
+        camera into the metrics registry, before the metrics are rendered.
+        """
+        recorder = self.__recorder.get_metrics()
+        labels = {"camera": self.__camera_id}
+        metrics.set("stream_clients", self.__clients, **labels)
+        metrics.set(
+            "camera_dropped_frames_total",
+            self.__camera.get_dropped_frames(),
+            **labels,
+        )
+        metrics.set("recorder_queue_depth", recorder["queue_depth"], **labels)
+        metrics.set(
+            "recorder_written_frames_total", recorder["written_frames"], **labels
+        )
+        metrics.set(
+            "recorder_dropped_frames_total", recorder["dropped_frames"], **labels
+        )
+
+    def join(self, timeout: Optional[float] = None) -> None:
+        """
+        Waits for the capture loop to stop after the last client has left.
+
+        Args:
+            timeout (float, optional): Maximum seconds to wait.
+                                       Defaults to waiting forever.
+        """
+        producer = self.__previous_producer
+        if producer is not None:
+            producer.join(timeout)
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """
+        Stops the capture loop even while clients are connected, then waits
+        for the recorder to write and close the last video.
+
+        Args:
+            timeout (float, optional): Maximum seconds to wait for each.
+                                       Defaults to waiting forever.
+        """
+        with self.__lock:
+            self.__stopping = True
+        self.join(timeout)
+        self.__recorder.stop(timeout)
+
+    def __connect(self) -> FrameHub:
+        """
+        Registers a client and starts the capture loop if it is not running.
+
+        Returns:
+            The hub the running capture loop publishes frames to.
+        """
+        with self.__lock:
+            self.__clients += 1
+            if self.__producer is None:
+                self.__stopping = False
+                self.__hub = FrameHub()
+                self.__producer = threading.Thread(
+                    target=self.__run_shared,
+                    args=(self.__hub, self.__previous_producer),
+                    daemon=True,
                 )
-                params["is_moving"], params["idle_score"] = is_moving, score
+                self.__previous_producer = self.__producer
+                self.__producer.start()
+            return self.__hub
 
-            # Determine if status of motion (starting, ending, no change)
-            params = self.__process_motion(params)
+    def __disconnect(self) -> None:
+        """
+        Unregisters a client. The capture loop stops when none are left.
+        """
+        with self.__lock:
+            self.__clients -= 1
 
-            # Encode frame to bytes for streaming
-            frame_bytes = self.__encode_frame_to_bytes(params["frame"])
-            yield (
-                b"--frame\r\n"
-                b"Content-Type: image/jpeg\r\n\r\n" + frame_bytes + b"\r\n"
-            )
+    def __should_stop(self, start_time: float) -> bool:
+        """
+        Decides whether the capture loop should stop, either because the
+        streaming duration has elapsed, every client has left or stop was
+        called.
 
-            prev_img = img
-            params["frameno"] += 1
+        Args:
+            start_time (float): Time the capture loop started.
 
-        self.__camera.end()
+        Returns:
+            True if the capture loop has been released and must stop.
+        """
+        with self.__lock:
+            timed_out = (time.time() - start_time) >= STREAM_TIME_MINS * 60
+            if timed_out or self.__clients <= 0 or self.__stopping:
+                if self.__producer is threading.current_thread():
+                    self.__producer = None
+                return True
+            return False
+
+    def __run_shared(self, hub: FrameHub, previous: Optional[threading.Thread]) -> None:
+        """
+        Runs the capture loop shared by the connected clients.
+
+        Args:
+            hub (FrameHub): The hub to publish frames to.
+            previous (Thread, optional): The previous capture loop, which
+                                         must release the camera first.
+        """
+        if previous is not None:
+            previous.join()
+
+        start_time = time.time()
+        try:
+            self.run(hub, lambda: self.__should_stop(start_time))
+        finally:
+            self.__should_stop(0)  # release the loop if the camera failed
+
+    def run(
+        self, hub: FrameHub, should_stop: Callable[[], bool], captured=None
+    ) -> None:
+        """
+        Runs the capture loop on the calling thread: reads frames, detects
+        motion, records, encodes and publishes frames to the hub, until
+        should_stop returns True or the camera stops giving frames.
+
+        Args:
+            hub (FrameHub): The hub to publish frames to, or any object with
+                            the same publish and close methods.
+            should_stop (callable): Called before each frame.
+            captured (multiprocessing.Value, optional): Counter of the frames
+                                                        captured, for another
+                                                        process to read.
+        """
+        try:
+            first_img = self.__initialize_camera()
+            if first_img is None:
+                return
+            self.__detector.reset()
+            self.__detector.update(first_img, SIM_THRESHOLD)
+            fps_start, fps_frames = time.monotonic(), 0
+            params = {
+                "frameno": 0,
+                "load": 0.0,
+                "in_motion": False,
+                "is_moving": False,
+                "idle_score": 100.0,
+                "frame": first_img.get_image(),
+                "current_time": "",
+                "published_at": -math.inf,
+            }
+
+            while not should_stop():
+                # Get current time and frame from camera
+                params["current_time"] = self.__clock.now()
+                frame = self.__camera.read_frame()
+                if frame is None:
+                    metrics.inc("camera_read_failures_total", camera=self.__camera_id)
+                    break
+                metrics.inc("camera_frames_total", camera=self.__camera_id)
+                if captured is not None:
+                    captured.value += 1
+                fps_frames += 1
+                now = time.monotonic()
+                if now - fps_start >= 1:
+                    fps = fps_frames / (now - fps_start)
+                    metrics.set("camera_capture_fps", fps, camera=self.__camera_id)
+                    fps_start, fps_frames = now, 0
 
-    def __initialize_camera(self) -> Image:
+                work_start = time.perf_counter()
+                # When behind real time, only fully process every n-th frame
+                stride = self.__get_stride(params["load"])
+                full = params["frameno"] % stride == 0
+
+                # Unless set otherwise, detect motion before drawing the
+                # clock and other overlays, so they never count as motion
+                on_detect = self.__overlay.get_on_detect()
+                shown = self.__draw_overlay(frame, params) if on_detect else frame
+                # Every n frames, compare current frame with the one
+                # compared last time to detect motion
+                if params["frameno"] % (N_FRAMES * stride) == 0:
+                    is_moving, score = self.__detector.update(
+                        Image(shown), SIM_THRESHOLD
+                    )
+                    params["is_moving"], params["idle_score"] = is_moving, score
+                    metrics.set(
+                        "motion_similarity_score", score, camera=self.__camera_id
+                    )
+                if not on_detect:
+                    shown = self.__draw_overlay(frame, params)
+                # Clients always see the overlays, recordings only if set
+                params["frame"] = shown if self.__overlay.get_on_record() else frame
+
+                publish = full and self.__should_publish(params, now)
+                if full:
+                    encoded = EncodedFrame(shown, self.__encoder)
+                    if publish:
+                        # Encode once on the capture thread, before any client
+                        # sees it, along with the variants clients are using
+                        encoded.get_part()
+                        self.__variants.encode(encoded)
+
+                    # Keep recent frames so recordings include the lead-up
+                    if not params["in_motion"]:
+                        self.__buffer_frame(encoded, params["frame"], publish)
+
+                # Determine if status of motion (starting, ending, no change)
+                params = self.__process_motion(params)
+
+                if full:
+                    if publish:
+                        hub.publish(encoded)
+                        params["published_at"] = now
+                    else:
+                        metrics.inc("stream_idle_frames_total", camera=self.__camera_id)
+                    # Share of the frame interval the work took
+                    work = time.perf_counter() - work_start
+                    load = work * self.__fps
+                    params["load"] = 0.9 * params["load"] + 0.1 * load
+                    metrics.set(
+                        "pipeline_load", params["load"], camera=self.__camera_id
+                    )
+                else:
+                    metrics.inc(
+                        "pipeline_skipped_frames_total", camera=self.__camera_id
+                    )
+
+                params["frameno"] += 1
+
+            self.__end_motion_recording()
+        finally:
+            try:
+                self.__camera.end()
+            finally:
+                hub.close()
+
+    @staticmethod
+    def __get_stride(load: float) -> int:
+        """
+        Decides how many frames to skip per processed frame.
+
+        Args:
+            load (float): Smoothed share of the frame interval the work on
+                          a frame takes; above 1 the loop is behind.
+
+        Returns:
+            1 to process every frame, n to process every n-th frame.
+        """
+        if not SKIP_WHEN_BEHIND or load <= 1:
+            return 1
+        return min(math.ceil(load), MAX_FRAME_STRIDE)
+
+    def __should_publish(self, params: Dict, now: float) -> bool:
+        """
+        Decides whether to encode and publish a frame to the clients.
+
+        Args:
+            params (dict): The motion state and latest similarity score,
+                           and when a frame was last published.
+            now (float): The monotonic time of the frame.
+
+        Returns:
+            False while idle streaming suppresses the frame.
+        """
+        if not self.__idle_stream or params["is_moving"]:
+            return True
+        if params["idle_score"] < IDLE_SCORE:
+            return True
+        return now - params["published_at"] >= self.__idle_keepalive
+
+    def __initialize_camera(self) -> Optional[Image]:
         """
         Initializes the camera with the desired frame rate and dimensions.
+
+        Returns:
+            The first frame, or None if the camera cannot be read.
         """
-        self.__camera.start(FPS, (WIDTH, HEIGHT))
+        self.__camera.start(self.__fps, self.__frame_size)
         time.sleep(0.1)  # allow camera to turn on and stabilise
         first_frame = self.__camera.read_frame()
+        if first_frame is None:
+            return None
         first_img = Image(first_frame)
         return first_img
 
+    def __buffer_frame(
+        self, frame: EncodedFrame, recorded: np.ndarray, published: bool
+    ) -> None:
+        """
+        Adds a frame to the pre-motion buffer, reusing its streaming JPEG
+        when the buffer keeps JPEGs, recordings look like the stream and the
+        frame was published, so already encoded. Frames idle streaming holds
+        back are never encoded at the stream quality: the buffer encodes them
+        at its own.
+
+        Args:
+            frame (EncodedFrame): The captured frame, as streamed.
+            recorded (np.ndarray): The captured frame, as recorded.
+            published (bool): Whether the frame was encoded and published.
+        """
+        streamed = frame.get_frame() is recorded
+        if (
+            published
+            and streamed
+            and self.__premotion.get_mode() == "jpeg"
+            and frame.get_jpeg() is not None
+        ):
+            self.__premotion.push(frame.get_jpeg())
+        else:
+            self.__premotion.push(recorded)
+
+    def __draw_overlay(self, frame: np.ndarray, params: Dict) -> np.ndarray:
+        """
+        Draws the timestamp and other overlays on a frame, in place when
+        recordings get them too, otherwise on a copy.
+
+        Args:
+            frame (np.ndarray): The captured frame.
+            params (dict): The current time and whether there is movement.
+
+        Returns:
+            The frame with the overlays.
+        """
+        if not self.__overlay.get_on_record():
+            frame = frame.copy()
+        return self.__overlay.draw(frame, params["current_time"], params["is_moving"])
+
     def __process_motion(self, params: dict) -> Dict:
         """
         Processes the motion by recording frames or starting/stopping
@@ -114,48 +581,99 @@ class Streaming:
         """
         # Movement detected and current motion continues
         if params["in_motion"] and params["is_moving"]:
-            self.__camera.record_frame(params["frame"])
+            self.__recorder.write(params["frame"])
+            score = params["idle_score"]
+            self.__event["peak_score"] = max(self.__event["peak_score"], score)
+            self.__event["min_score"] = min(self.__event["min_score"], score)
+            if self.__event["keyframes"] is not None:
+                self.__event["keyframes"].add(params["frame"], score)
         # Movement detected, new motion starting
         elif not params["in_motion"] and params["is_moving"]:
-            self.__start_motion_recording(params["current_time"])
+            self.__start_motion_recording(params["frame"], params["idle_score"])
             print("start", params["current_time"])
             params["in_motion"] = True
+            metrics.set("motion_active", 1, camera=self.__camera_id)
+            metrics.inc("motion_events_total", camera=self.__camera_id)
         # No movement detected, current motion ending
         elif params["in_motion"] and not params["is_moving"]:
             self.__end_motion_recording()
             print("end", params["current_time"])
             params["in_motion"] = False
+            metrics.set("motion_active", 0, camera=self.__camera_id)
         return params
 
-    def __start_motion_recording(self, curr_time: str = datetime.now()) -> None:
+    def __start_motion_recording(self, frame: np.ndarray, score: float) -> None:
         """
         Starts recording a video when motion is detected.
 
         Args:
-            current_time_str (str): The current timestamp as a string.
+            frame (np.ndarray): The frame the motion was detected in.
+            score (float): The similarity score that started the motion.
         """
-
-        filename = f"{VID_DIR}/{curr_time}"  # video format added using env
-        self.__camera.start_record_video(filename)
+        start = time.time()
+        # no spaces or colons, so the name is safe in URLs and on any disk
+        file_time = datetime.fromtimestamp(start).strftime(FILE_TIME_FORMAT)
+        filename = f"{VID_DIR}/{self.__camera_id}_{file_time}"  # format from env
+        # Keep small copies of frames for the thumbnail and sprite sheet
+        keyframes = KeyframeCollector() if THUMBNAILS else None
+        if keyframes is not None:
+            keyframes.add(frame, score)
+        self.__event = {
+            "start": start,
+            "peak_score": score,
+            "min_score": score,
+            "keyframes": keyframes,
+        }
+        self.__recorder.open(
+            filename,
+            self.__camera.get_fps(),
+            self.__camera.get_frame_size(),
+            on_close=self.__make_event_callback(self.__event),
+        )
+        # Start with the frames leading up to the motion
+        self.__recorder.write_batch(self.__premotion.detach())
 
     def __end_motion_recording(self) -> None:
         """
         Stops recording the video when motion ends.
 
         """
-        self.__camera.end_record_video()
+        if self.__event is not None:
+            self.__event["end"] = time.time()
+            self.__event = None
+        self.__recorder.close()
 
-    def __encode_frame_to_bytes(self, frame: np.ndarray) -> bytes:
+    def __make_event_callback(self, event: Dict) -> Callable[[str, int], None]:
         """
-        Encodes the frame into bytes format for streaming purposes.
+        Makes the callback saving the thumbnail and sprite sheet of a motion
+        event and adding it to the index, once the recorder has closed its
+        video. It runs on the recorder thread.
 
         Args:
-            frame (Frame): The frame to encode.
+            event (dict): The start and end time, scores and keyframes of
+                          the event, completed when the motion ends.
+
+        Returns:
+            The on_close callback of the recorder.
         """
-        ret, buffer = cv2.imencode(".jpg", frame)
-        if not ret:
-            print("Something is wrong with the frames or camera")
-            return
 
-        frame_bytes = buffer.tobytes()
-        return frame_bytes
+        def add_event(filename: str, frames: int) -> None:
+            if event["keyframes"] is not None:
+                save_thumbnails(filename, event["keyframes"])
+            if self.__events is None:
+                return
+            size = os.path.getsize(filename) if os.path.exists(filename) else None
+            self.__events.add(
+                MotionEvent(
+                    camera=self.__camera_id,
+                    start=event["start"],
+                    end=event.get("end", time.time()),
+                    peak_score=event["peak_score"],
+                    min_score=event["min_score"],
+                    path=filename,
+                    size=size,
+                    frames=frames,
+                )
+            )
+
+        return add_event
@@ -0,0 +1,73 @@
+"""
+Measures aggregate throughput of the camera manager as cameras are added,
+with every pipeline on a thread of the web process or in its own worker
+process. Cameras serve synthetic scenes as fast as the pipeline takes them.
+
+    python -m benchmarks.bench_cameras --cameras 1,2,4 --seconds 5
+"""
+
+import argparse
+import threading
+import time
+
+from app.manager import CameraManager
+from app.video import HEIGHT, WIDTH
+
+
+def run(mode: str, n_cameras: int, seconds: float) -> float:
+    """
+    Stream from every camera for a while and return the aggregate fps seen
+    by the clients.
+    """
+    configs = [
+        {
+            "id": str(i),
+            "source": "synthetic",
+            "pacing": "fast",
+            "mode": mode,
+            "fps": 30,
+            "width": WIDTH,
+            "height": HEIGHT,
+            "engine": "difference",
+        }
+        for i in range(n_cameras)
+    ]
+    manager = CameraManager(configs)
+    manager.start()
+    counts = [0] * n_cameras
+
+    def consume(index: int) -> None:
+        frames = manager.get(str(index)).frames()
+        next(frames)  # wait for the pipeline to warm up
+        start = time.perf_counter()
+        for _ in frames:
+            counts[index] += 1
+            if time.perf_counter() - start >= seconds:
+                break
+        frames.close()
+
+    threads = [threading.Thread(target=consume, args=(i,)) for i in range(n_cameras)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    manager.stop()
+    return sum(counts) / seconds
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--cameras", default="1,2,4", help="camera counts to try")
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--modes", default="thread,process")
+    args = parser.parse_args()
+
+    print(f"{'mode':<8} {'cameras':>7} {'total fps':>10} {'fps/camera':>11}")
+    for mode in args.modes.split(","):
+        for n_cameras in map(int, args.cameras.split(",")):
+            fps = run(mode, n_cameras, args.seconds)
+            print(f"{mode:<8} {n_cameras:>7} {fps:>10.1f} {fps / n_cameras:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Compares motion detection at camera resolution with downscaled, masked
+detection: per-update latency and agreement of scores and motion decisions.
+
+    python -m benchmarks.bench_detection --frames 300 --size 160x120
+"""
+
+import argparse
+import time
+from datetime import datetime, timedelta
+
+import cv2
+import numpy as np
+
+from app.image import Image
+from app.motion import Detector, parse_regions
+from app.video import HEIGHT, SIM_THRESHOLD, TIME_FORMAT, WIDTH
+
+
+def synthetic_frames(n_frames: int, width: int, height: int) -> list:
+    """
+    Build noisy frames with a timestamp and a square that moves for the
+    middle third of the clip.
+    """
+    rng = np.random.default_rng(0)
+    background = rng.integers(60, 120, size=(height, width, 3), dtype=np.uint8)
+    start = datetime(2023, 1, 1)
+    frames = []
+    for i in range(n_frames):
+        frame = background.copy()
+        noise = rng.integers(0, 6, size=frame.shape, dtype=np.uint8)
+        cv2.add(frame, noise, frame)
+        x = width // 4
+        if n_frames // 3 <= i < 2 * n_frames // 3:
+            x += (i - n_frames // 3) * 8 % (width // 2)
+        frame[height // 3 : height // 3 + 100, x : x + 100] = 230
+        text = (start + timedelta(seconds=i / 30)).strftime(TIME_FORMAT)
+        cv2.putText(
+            frame, text, (10, 15), cv2.FONT_HERSHEY_COMPLEX_SMALL, 0.8, (0, 0, 255)
+        )
+        frames.append(Image(frame))
+    return frames
+
+
+def run(detector: Detector, frames: list) -> tuple:
+    """
+    Feed every frame to the detector, timing each update.
+    """
+    latencies, scores, moving = [], [], []
+    for frame in frames:
+        start = time.perf_counter()
+        is_moving, score = detector.update(frame, SIM_THRESHOLD)
+        latencies.append(time.perf_counter() - start)
+        scores.append(score)
+        moving.append(is_moving)
+    return np.array(latencies[1:]), np.array(scores[1:]), np.array(moving[1:])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--size", default="160x120", help="detection WxH")
+    parser.add_argument(
+        "--exclude",
+        default="0,0,260,24",
+        help="rectangles x,y,w,h;... ignored, by default the timestamp",
+    )
+    args = parser.parse_args()
+    detect_size = tuple(int(n) for n in args.size.split("x"))
+    exclusions = parse_regions(args.exclude)
+
+    frames = synthetic_frames(args.frames, WIDTH, HEIGHT)
+    engines = {
+        f"full {WIDTH}x{HEIGHT}": Detector(),
+        f"downscaled {args.size}": Detector(detect_size=detect_size),
+        f"downscaled {args.size} + exclude": Detector(
+            detect_size=detect_size, exclusions=exclusions
+        ),
+    }
+    results = {name: run(detector, frames) for name, detector in engines.items()}
+
+    _, full_scores, full_moving = next(iter(results.values()))
+    print(f"{'mode':<36}{'mean ms':>9}{'p99 ms':>9}{'|dscore|':>10}{'agree':>8}")
+    for name, (latencies, scores, moving) in results.items():
+        print(
+            f"{name:<36}"
+            f"{latencies.mean() * 1000:>9.3f}"
+            f"{np.percentile(latencies, 99) * 1000:>9.3f}"
+            f"{np.abs(scores - full_scores).mean():>10.3f}"
+            f"{(moving == full_moving).mean():>8.1%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
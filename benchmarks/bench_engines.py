@@ -0,0 +1,100 @@
+"""
+Compares motion engines on recorded clips: per-frame latency and detection
+results (share of frames with motion, number of motion segments).
+
+    python -m benchmarks.bench_engines videos/clip.mp4 --size 160x120
+"""
+
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+from app.engines import ENGINES
+from app.image import Image
+from app.motion import DETECT_EXCLUDE, Detector
+from app.video import HEIGHT, SIM_THRESHOLD, WIDTH
+from benchmarks.bench_detection import synthetic_frames
+
+
+def read_clip(path: str, max_frames: int) -> list:
+    """
+    Decode up to max_frames frames of a video file.
+    """
+    cap = cv2.VideoCapture(path)
+    frames = []
+    while len(frames) < max_frames:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(Image(frame))
+    cap.release()
+    return frames
+
+
+def flicker(frames: list) -> list:
+    """
+    Add a slow lighting flicker to synthetic frames.
+    """
+    flickered = []
+    for i, frame in enumerate(frames):
+        gain = 1 + 0.08 * np.sin(i / 15)
+        flickered.append(Image(cv2.convertScaleAbs(frame.get_image(), alpha=gain)))
+    return flickered
+
+
+def run(engine: str, frames: list, detect_size: tuple) -> dict:
+    """
+    Feed every frame to a detector using the engine.
+    """
+    detector = Detector(
+        detect_size=detect_size, exclusions=DETECT_EXCLUDE, engine=engine
+    )
+    latencies, moving = [], []
+    for frame in frames:
+        start = time.perf_counter()
+        is_moving, _ = detector.update(frame, SIM_THRESHOLD)
+        latencies.append(time.perf_counter() - start)
+        moving.append(is_moving)
+    latencies, moving = np.array(latencies[1:]), np.array(moving[1:])
+    return {
+        "mean_ms": latencies.mean() * 1000,
+        "p99_ms": np.percentile(latencies, 99) * 1000,
+        "motion": moving.mean(),
+        "segments": int(
+            np.count_nonzero(np.diff(moving.astype(np.int8)) == 1) + moving[0]
+        ),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("clips", nargs="*", help="video files, synthetic if none")
+    parser.add_argument("--size", default="160x120", help="detection WxH, 0 for full")
+    parser.add_argument("--max-frames", type=int, default=900)
+    args = parser.parse_args()
+    detect_size = (
+        None if args.size == "0" else tuple(int(n) for n in args.size.split("x"))
+    )
+
+    clips = {path: read_clip(path, args.max_frames) for path in args.clips}
+    if not clips:
+        frames = synthetic_frames(min(args.max_frames, 300), WIDTH, HEIGHT)
+        clips = {"synthetic": frames, "synthetic + flicker": flicker(frames)}
+
+    print(
+        f"{'clip':<24}{'engine':<12}{'mean ms':>9}{'p99 ms':>9}{'motion':>8}{'segs':>6}"
+    )
+    for clip, frames in clips.items():
+        for engine in ENGINES:
+            result = run(engine, frames, detect_size)
+            print(
+                f"{clip[-24:]:<24}{engine:<12}"
+                f"{result['mean_ms']:>9.3f}{result['p99_ms']:>9.3f}"
+                f"{result['motion']:>8.1%}{result['segments']:>6}"
+            )
+
+
+if __name__ == "__main__":
+    main()
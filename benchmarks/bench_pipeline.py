@@ -0,0 +1,145 @@
+"""
+Drives Streaming over synthetic or recorded clips at several resolutions and
+reports throughput, peak RSS and the latency distribution of each pipeline
+stage (capture, overlay, transform, similarity, encode, record). Results are
+written to JSON to compare commits.
+
+    python -m benchmarks.bench_pipeline --sizes 320x240,640x480,1280x720
+    python -m benchmarks.bench_pipeline --clips videos/clip.mp4 \\
+        --output results/pipeline.json
+"""
+
+import argparse
+import json
+import platform
+import resource
+import subprocess
+import time
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+from app.motion import DETECT_EXCLUDE, DETECT_SIZE, MOTION_ENGINE, Detector
+from app.recorder import Recorder
+from app.source import SyntheticSource, create_source
+from app.timing import timer
+from app.video import FPS, Streaming
+from benchmarks.bench_throughput import CountingSink
+
+
+def peak_rss_mb() -> float:
+    """
+    Peak resident memory of this process so far, in MB.
+    """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_pipeline(
+    clip: str, frame_size: tuple, n_frames: int, codec: str = "mp4v"
+) -> dict:
+    """
+    Run the capture pipeline over n_frames frames of a clip, as fast as it
+    takes them, and collect its stage timings.
+    """
+    if clip == "synthetic":
+        # still and moving phases, so recordings start and stop
+        source = SyntheticSource(pacing="fast", motion=(30, 30), frames=n_frames)
+    else:
+        source = create_source(clip, pacing="fast")
+    detector = Detector(
+        detect_size=DETECT_SIZE, exclusions=DETECT_EXCLUDE, engine=MOTION_ENGINE
+    )
+    recorder = Recorder(codec=codec)
+    streaming = Streaming(
+        source, detector, recorder=recorder, fps=FPS, frame_size=frame_size
+    )
+    sink = CountingSink()
+
+    timer.reset()
+    timer.enable()
+    try:
+        streaming.run(sink, lambda: sink.frames >= n_frames)
+        recorder.stop()
+    finally:
+        timer.disable()
+
+    elapsed = (sink.last or 0) - (sink.first or 0)
+    return {
+        "clip": clip,
+        "frame_size": list(frame_size),
+        "frames": sink.frames,
+        "fps": (sink.frames - 1) / elapsed if elapsed else 0.0,
+        "peak_rss_mb": peak_rss_mb(),
+        "recorder": recorder.get_metrics(),
+        "stages": timer.summary(),
+    }
+
+
+def environment() -> dict:
+    """
+    Describe what the results were measured on.
+    """
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "opencv": cv2.__version__,
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+    }
+
+
+def print_result(result: dict) -> None:
+    width, height = result["frame_size"]
+    print(
+        f"\n{result['clip'][-30:]} {width}x{height}: {result['fps']:.1f} fps, "
+        f"peak RSS {result['peak_rss_mb']:.0f} MB"
+    )
+    print(f"  {'stage':<12}{'count':>7}{'mean':>9}{'p50':>9}{'p95':>9}{'p99':>9}")
+    for name, stats in result["stages"].items():
+        print(
+            f"  {name:<12}{stats['count']:>7}{stats['mean_ms']:>9.3f}"
+            f"{stats['p50_ms']:>9.3f}{stats['p95_ms']:>9.3f}{stats['p99_ms']:>9.3f}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--clips", default="synthetic", help="comma separated")
+    parser.add_argument("--sizes", default="320x240,640x480,1280x720")
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--codec", default="mp4v", help="fourcc of recordings")
+    parser.add_argument("--output", help="JSON file for the results")
+    args = parser.parse_args()
+
+    results = []
+    for clip in args.clips.split(","):
+        for size in args.sizes.split(","):
+            frame_size = tuple(int(n) for n in size.split("x"))
+            start = time.perf_counter()
+            result = run_pipeline(clip, frame_size, args.frames, args.codec)
+            result["seconds"] = time.perf_counter() - start
+            print_result(result)
+            results.append(result)
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(
+                {"environment": environment(), "results": results}, file, indent=2
+            )
+        print(f"\nwrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
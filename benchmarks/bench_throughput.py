@@ -0,0 +1,68 @@
+"""
+Measures the maximum end-to-end throughput of the capture pipeline (read,
+detect, encode, buffer, record) without a camera, replaying a synthetic
+scene or a video file as fast as the pipeline takes frames.
+
+    python -m benchmarks.bench_throughput --source synthetic --frames 600
+    python -m benchmarks.bench_throughput --source videos/clip.mp4
+"""
+
+import argparse
+import time
+
+from app.motion import DETECT_EXCLUDE, DETECT_SIZE, MOTION_ENGINE, Detector
+from app.source import SyntheticSource, create_source
+from app.video import FPS, HEIGHT, WIDTH, Streaming
+
+
+class CountingSink:
+    """
+    Hub stand-in that counts published frames and when they arrived.
+    """
+
+    def __init__(self) -> None:
+        self.frames = 0
+        self.first = None
+        self.last = None
+
+    def publish(self, frame) -> None:
+        self.last = time.perf_counter()
+        if self.first is None:
+            self.first = self.last
+        self.frames += 1
+
+    def close(self) -> None:
+        pass
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--source", default="synthetic", help="synthetic or file")
+    parser.add_argument("--frames", type=int, default=600)
+    parser.add_argument("--size", default=f"{WIDTH}x{HEIGHT}", help="frame WxH")
+    parser.add_argument("--motion", default="30,30", help="still,moving frames")
+    args = parser.parse_args()
+    frame_size = tuple(int(n) for n in args.size.split("x"))
+
+    if args.source == "synthetic":
+        motion = tuple(int(n) for n in args.motion.split(","))
+        source = SyntheticSource(pacing="fast", motion=motion, frames=args.frames)
+    else:
+        source = create_source(args.source, pacing="fast")
+    detector = Detector(
+        detect_size=DETECT_SIZE, exclusions=DETECT_EXCLUDE, engine=MOTION_ENGINE
+    )
+    streaming = Streaming(source, detector, fps=FPS, frame_size=frame_size)
+    sink = CountingSink()
+    streaming.run(sink, lambda: sink.frames >= args.frames)
+
+    elapsed = (sink.last or 0) - (sink.first or 0)
+    fps = (sink.frames - 1) / elapsed if elapsed else 0.0
+    print(f"source     {args.source} {frame_size[0]}x{frame_size[1]}")
+    print(f"frames     {sink.frames}")
+    print(f"throughput {fps:.1f} fps ({1000 / fps if fps else 0:.2f} ms/frame)")
+    print(f"recorder   {streaming.get_recorder_metrics()}")
+
+
+if __name__ == "__main__":
+    main()
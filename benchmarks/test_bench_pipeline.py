@@ -0,0 +1,31 @@
+"""
+pytest-benchmark suite for the capture pipeline. Stage timings, throughput
+and peak RSS are saved with each benchmark in the JSON report:
+
+    python -m pytest benchmarks/ --benchmark-json=benchmark.json
+    python -m pytest benchmarks/ --benchmark-compare
+"""
+
+import pytest
+
+from benchmarks.bench_pipeline import run_pipeline
+
+pytest.importorskip("pytest_benchmark")
+
+FRAMES = 90
+
+
+@pytest.mark.parametrize("frame_size", [(320, 240), (640, 480), (1280, 720)])
+def test_pipeline_synthetic(benchmark, tmp_path, monkeypatch, frame_size):
+    # keep the recordings out of the repository
+    monkeypatch.chdir(tmp_path)
+    result = benchmark.pedantic(
+        run_pipeline, args=("synthetic", frame_size, FRAMES), rounds=3
+    )
+    benchmark.extra_info.update(
+        fps=result["fps"],
+        peak_rss_mb=result["peak_rss_mb"],
+        stages=result["stages"],
+    )
+    assert result["frames"] >= FRAMES - 1
+    assert {"capture", "transform", "encode"} <= set(result["stages"])
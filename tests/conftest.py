@@ -0,0 +1,72 @@
+import os
+import time
+
+import numpy as np
+import pytest
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# camera
+FPS = int(os.getenv("FPS"))
+WIDTH = int(os.getenv("WIDTH"))
+HEIGHT = int(os.getenv("HEIGHT"))
+
+
+class FakeCamera:
+    """
+    Stands in for Camera without hardware: serves random frames, paced at the
+    configured fps, and counts how often it is started. With change_after,
+    the scene changes completely after that many frames.
+    """
+
+    def __init__(self, fps: int = FPS, change_after: int = None) -> None:
+        self.fps = fps
+        self.change_after = change_after
+        self.starts = 0
+        self.reads = 0
+        self.frame = np.random.randint(
+            low=0, high=255, size=(HEIGHT, WIDTH, 3), dtype=np.uint8
+        )
+
+    def start(self, fps: int = FPS, frame_size: tuple = (WIDTH, HEIGHT)) -> None:
+        self.starts += 1
+
+    def end(self) -> None:
+        pass
+
+    def get_fps(self) -> int:
+        return self.fps
+
+    def get_frame_size(self) -> tuple:
+        return (WIDTH, HEIGHT)
+
+    def get_dropped_frames(self) -> int:
+        return 0
+
+    def read_frame(self, current_time: str = "") -> np.ndarray:
+        if self.reads:
+            time.sleep(1 / self.fps)
+        self.reads += 1
+        if self.change_after is not None and self.reads > self.change_after:
+            return 255 - self.frame
+        return self.frame.copy()
+
+    def start_record_video(self, name: str = "video") -> None:
+        pass
+
+    def end_record_video(self) -> None:
+        pass
+
+    def record_frame(self, frame) -> None:
+        pass
+
+
+@pytest.fixture
+def fake_camera():
+    yield FakeCamera()
+
+
+@pytest.fixture
+def motion_camera():
+    yield FakeCamera(change_after=5)
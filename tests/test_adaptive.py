@@ -0,0 +1,85 @@
+import time
+
+import numpy as np
+import pytest
+
+from app.adaptive import (
+    QUALITY_LADDER,
+    AdaptiveClient,
+    StreamProfile,
+    VariantRegistry,
+    deliver,
+)
+from app.encoder import EncodedFrame, JpegEncoder
+
+
+def test_slow_client_steps_down_then_recovers():
+    # Sends slower than the frame interval step down once a second, fast
+    # sends step back up after five seconds
+    client = AdaptiveClient(StreamProfile(), camera_fps=10, frame_width=640)
+    assert client.get_variant()[0] == 640
+    now = time.perf_counter()
+    for _ in range(40):
+        now += 0.5
+        client.sent(now, 0.5)
+    assert client.get_level() == len(QUALITY_LADDER) - 1
+    width, quality = client.get_variant()
+    assert width < 640
+    assert client.get_fps() < 10
+
+    for _ in range(200):
+        now += 0.5
+        client.sent(now, 0.001)
+    assert client.get_level() == 0
+
+
+def test_client_fps_is_capped():
+    # A client asking for 5 fps from a 10 fps camera gets every other frame,
+    # and never more than the camera fps
+    client = AdaptiveClient(StreamProfile(fps=5), camera_fps=10)
+    assert client.should_send(0.0)
+    client.sent(0.0, 0.0)
+    assert not client.should_send(0.1)
+    assert client.should_send(0.2)
+    assert AdaptiveClient(StreamProfile(fps=50), camera_fps=10).get_fps() == 10
+
+
+def test_non_adaptive_client_keeps_profile():
+    client = AdaptiveClient(
+        StreamProfile(width=320, quality=60), camera_fps=10, adaptive=False
+    )
+    for step in range(1, 20):
+        client.sent(float(step), 1.0)
+    assert client.get_level() == 0
+    assert client.get_variant() == (320, 60)
+
+
+def test_variant_registry_counts_clients():
+    variants = VariantRegistry()
+    variants.switch(None, (320, 60))
+    variants.switch(None, (320, 60))
+    variants.switch((320, 60), (160, 40))
+    assert sorted(variants.get_variants()) == [(160, 40), (320, 60)]
+    variants.switch((320, 60), None)
+    variants.switch((160, 40), None)
+    assert variants.get_variants() == []
+
+
+def test_clients_share_variant_bytes():
+    # Two clients at the same profile get the very same bytes object
+    frame = np.random.randint(0, 255, (240, 320, 3), dtype=np.uint8)
+    frames = [EncodedFrame(frame, JpegEncoder())]
+    variants = VariantRegistry()
+    profile = StreamProfile(width=160, quality=50)
+    first = deliver(iter(frames), AdaptiveClient(profile, 10, 320), variants)
+    second = deliver(iter(frames), AdaptiveClient(profile, 10, 320), variants)
+    part = next(first)
+    assert next(second) is part
+    assert variants.get_variants() == [(160, 50)]
+    first.close()
+    second.close()
+    assert variants.get_variants() == []
+
+
+if __name__ == "__main__":
+    pytest.main()
@@ -0,0 +1,107 @@
+import cv2
+import numpy as np
+import pytest
+
+from app.backends import (
+    FfmpegWriter,
+    JpegBackend,
+    benchmark_jpeg,
+    benchmark_record,
+    get_jpeg_backends,
+    sample_frame,
+    select_jpeg_backend,
+    select_record_backend,
+)
+from app.encoder import JpegEncoder
+from app.metrics import metrics
+from app.recorder import Recorder
+
+
+@pytest.mark.parametrize("name", list(get_jpeg_backends()))
+def test_jpeg_backends_encode(name):
+    frame = sample_frame((64, 48))
+    jpeg = get_jpeg_backends()[name](95, False, False).encode(frame)
+    decoded = cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_COLOR)
+    assert decoded.shape == frame.shape
+    assert np.abs(decoded.astype(int) - frame).mean() < 10
+
+
+def test_select_jpeg_backend():
+    assert select_jpeg_backend("opencv") == "opencv"
+    assert select_jpeg_backend("auto") in get_jpeg_backends()
+    with pytest.raises(ValueError):
+        select_jpeg_backend("unknown")
+    missing = [
+        name for name in ("turbojpeg", "simplejpeg") if name not in get_jpeg_backends()
+    ]
+    for name in missing:
+        with pytest.raises(ValueError):
+            select_jpeg_backend(name)
+
+
+def test_jpeg_backend_requires_encode():
+    class NoEncode(JpegBackend):
+        pass
+
+    with pytest.raises(TypeError, match="encode"):
+        NoEncode()
+
+
+def test_auto_skips_backends_ignoring_settings():
+    # only backends honouring progressive and optimised JPEGs are picked
+    for optimize, progressive in ((True, False), (False, True), (True, True)):
+        backends = get_jpeg_backends(optimize, progressive)
+        assert "simplejpeg" not in backends
+        assert select_jpeg_backend("auto", optimize, progressive) in backends
+    assert "turbojpeg" not in get_jpeg_backends(optimize=True)
+    encoder = JpegEncoder(optimize=True, backend="auto")
+    assert encoder.get_backend() == "opencv"
+
+
+def test_encoder_keeps_backend_across_qualities():
+    encoder = JpegEncoder(backend="opencv")
+    assert encoder.get_backend() == "opencv"
+    assert encoder.with_quality(40).get_backend() == "opencv"
+
+
+def test_benchmarks_report_fps():
+    results = benchmark_jpeg(frames=3, frame_size=(64, 48))
+    assert results["opencv"] > 0
+    assert metrics.get("encoder_backend_fps", kind="jpeg", backend="opencv") > 0
+    results = benchmark_record(frames=3, frame_size=(64, 48), codec="mp4v")
+    assert results["opencv"] > 0
+
+
+def test_select_record_backend():
+    assert select_record_backend("auto") in ("opencv", "ffmpeg")
+    with pytest.raises(ValueError):
+        Recorder(backend="unknown")
+
+
+def test_ffmpeg_writer(tmp_path):
+    path = str(tmp_path / "clip.mp4")
+    writer = FfmpegWriter(path, 10, (64, 48))
+    if not FfmpegWriter.is_available():
+        # without the ffmpeg binary the writer never opens, like a VideoWriter
+        assert not writer.isOpened()
+        writer.write(sample_frame((64, 48)))
+        writer.release()
+        return
+    for _ in range(10):
+        writer.write(sample_frame((64, 48)))
+    writer.release()
+    cap = cv2.VideoCapture(path)
+    assert int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) == 10
+    cap.release()
+
+
+def test_ffmpeg_quality_options():
+    assert FfmpegWriter.get_quality_options("libx264", 23) == {"crf": 23}
+    assert FfmpegWriter.get_quality_options("h264_nvenc", 23) == {"cq": 23}
+    assert FfmpegWriter.get_quality_options("hevc_qsv", 23) == {"global_quality": 23}
+    assert FfmpegWriter.get_quality_options("h264_vaapi", 23) == {"qp": 23}
+    assert FfmpegWriter.get_quality_options("mpeg4", 23) == {}
+
+
+if __name__ == "__main__":
+    pytest.main()
@@ -0,0 +1,76 @@
+import os
+
+import numpy as np
+import pytest
+from dotenv import load_dotenv
+
+from app.buffer import FrameBuffer, decode_frame
+
+load_dotenv()
+
+# camera
+WIDTH = int(os.getenv("WIDTH"))
+HEIGHT = int(os.getenv("HEIGHT"))
+
+
+def numbered_frame(n: int) -> np.ndarray:
+    # A frame filled with its number, to check the order of frames
+    return np.full((HEIGHT, WIDTH, 3), n, dtype=np.uint8)
+
+
+def test_raw_keeps_latest_frames_in_order():
+    # Only the last capacity frames are kept, oldest first
+    buffer = FrameBuffer(capacity=5, mode="raw")
+    for n in range(12):
+        buffer.push(numbered_frame(n))
+    assert len(buffer) == 5
+    assert buffer.get_nbytes() == 5 * HEIGHT * WIDTH * 3
+    frames = buffer.detach()
+    assert [int(frame[0, 0, 0]) for frame in frames] == [7, 8, 9, 10, 11]
+
+
+def test_detached_frames_survive_new_pushes():
+    # Detaching hands over the storage, so later frames do not overwrite it
+    buffer = FrameBuffer(capacity=3, mode="raw")
+    for n in range(3):
+        buffer.push(numbered_frame(n))
+    frames = buffer.detach()
+    assert len(buffer) == 0
+    for n in range(10, 13):
+        buffer.push(numbered_frame(n))
+    assert [int(frame[0, 0, 0]) for frame in frames] == [0, 1, 2]
+
+
+def test_handed_over_block_is_counted():
+    # Memory of the detached frames counts until they are released
+    buffer = FrameBuffer(capacity=3, mode="raw")
+    for n in range(3):
+        buffer.push(numbered_frame(n))
+    frames = buffer.detach()
+    buffer.push(numbered_frame(3))
+    block = 3 * HEIGHT * WIDTH * 3
+    assert buffer.get_nbytes() == 2 * block
+    del frames
+    assert buffer.get_nbytes() == block
+
+
+def test_jpeg_mode():
+    # Raw frames are encoded and JPEG bytes are stored as they are
+    buffer = FrameBuffer(capacity=4, mode="jpeg", quality=90)
+    buffer.push(numbered_frame(100))
+    jpeg = bytes(buffer.detach()[0])
+    buffer.push(jpeg)
+    assert buffer.detach()[0] is jpeg
+    assert buffer.get_nbytes() == 0
+    decoded = decode_frame(jpeg)
+    assert decoded.shape == (HEIGHT, WIDTH, 3)
+    assert abs(int(decoded[0, 0, 0]) - 100) <= 2
+
+
+def test_unknown_mode():
+    with pytest.raises(ValueError):
+        FrameBuffer(capacity=4, mode="unknown")
+
+
+if __name__ == "__main__":
+    pytest.main()
@@ -0,0 +1,94 @@
+import os
+
+import cv2
+import numpy as np
+import pytest
+from dotenv import load_dotenv
+
+from app.encoder import EncodedFrame, JpegEncoder
+
+load_dotenv()
+
+# camera
+WIDTH = int(os.getenv("WIDTH"))
+HEIGHT = int(os.getenv("HEIGHT"))
+
+
+@pytest.fixture
+def frame():
+    # Create a sample frame for testing
+    return np.random.randint(low=0, high=255, size=(HEIGHT, WIDTH, 3), dtype=np.uint8)
+
+
+def test_encode_part(frame):
+    # The multipart chunk wraps a decodable JPEG
+    part = JpegEncoder().encode_part(frame)
+    assert part.startswith(b"--frame\r\nContent-Type: image/jpeg\r\n\r\n")
+    assert part.endswith(b"\r\n")
+    jpeg = np.frombuffer(
+        part[len(b"--frame\r\nContent-Type: image/jpeg\r\n\r\n") : -2], np.uint8
+    )
+    assert cv2.imdecode(jpeg, cv2.IMREAD_COLOR).shape == frame.shape
+
+
+def test_quality_setting(frame):
+    # Lower quality gives a smaller JPEG
+    low = JpegEncoder(quality=20).encode(frame)
+    high = JpegEncoder(quality=95).encode(frame)
+    assert len(low) < len(high)
+
+
+def test_encoded_frame_encodes_once(frame, monkeypatch):
+    # Every client gets the same bytes object from a single encode
+    encoder = JpegEncoder()
+    calls = []
+    original = encoder.encode_part
+    monkeypatch.setattr(
+        encoder, "encode_part", lambda f: calls.append(1) or original(f)
+    )
+    encoded = EncodedFrame(frame, encoder)
+    parts = [encoded.get_part() for _ in range(20)]
+    assert len(calls) == 1
+    assert all(part is parts[0] for part in parts)
+
+
+def decode_part(part):
+    header = b"--frame\r\nContent-Type: image/jpeg\r\n\r\n"
+    return cv2.imdecode(np.frombuffer(part[len(header) : -2], np.uint8), 1)
+
+
+def test_variant_is_resized_and_shared(frame):
+    # A smaller variant keeps the aspect ratio and is encoded once
+    encoded = EncodedFrame(frame, JpegEncoder())
+    part = encoded.get_variant(width=WIDTH // 2, quality=50)
+    assert decode_part(part).shape == (HEIGHT // 2, WIDTH // 2, 3)
+    assert encoded.get_variant(width=WIDTH // 2, quality=50) is part
+
+
+def test_full_variant_is_the_stream_part(frame):
+    # Full size at the encoder quality is the frame's own chunk
+    encoder = JpegEncoder()
+    encoded = EncodedFrame(frame, encoder)
+    part = encoded.get_part()
+    assert encoded.get_variant() is part
+    assert encoded.get_variant(WIDTH * 2, encoder.get_quality()) is part
+
+
+def test_variant_of_jpeg_only_frame(frame):
+    # Frames relayed from a worker process only carry their JPEG
+    jpeg = JpegEncoder().encode(frame)
+    encoded = EncodedFrame(None, None, jpeg=jpeg)
+    part = encoded.get_variant(width=WIDTH // 4, quality=40)
+    assert decode_part(part).shape[1] == WIDTH // 4
+
+
+def test_full_variant_of_jpeg_only_frame(frame):
+    # The relayed JPEG is served as is at its own width and quality
+    encoder = JpegEncoder()
+    encoded = EncodedFrame(None, encoder, jpeg=encoder.encode(frame), width=WIDTH)
+    part = encoded.get_part()
+    assert encoded.get_variant(WIDTH, encoder.get_quality()) is part
+
+
+if __name__ == "__main__":
+    pytest.main()
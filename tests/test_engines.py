@@ -0,0 +1,110 @@
+import os
+
+import cv2
+import numpy as np
+import pytest
+from dotenv import load_dotenv
+
+from app.engines import (
+    ENGINES,
+    MotionEngine,
+    RunningAverageEngine,
+    create_engine,
+    difference_score,
+    stack_similarity,
+)
+from app.image import Image
+from app.motion import Detector
+
+load_dotenv()
+
+# camera
+WIDTH = int(os.getenv("WIDTH"))
+HEIGHT = int(os.getenv("HEIGHT"))
+
+# motion detector
+SIM_THRESHOLD = float(os.getenv("THRESHOLD"))
+
+
+def gray_frame(brightness: int = 80, square_x: int = None) -> np.ndarray:
+    # A flat gray frame with an optional white square
+    frame = np.full((HEIGHT // 4, WIDTH // 4), brightness, dtype=np.uint8)
+    if square_x is not None:
+        frame[40:80, square_x : square_x + 40] = 255
+    return frame
+
+
+@pytest.mark.parametrize("name", list(ENGINES))
+def test_engine_static_scene(name):
+    # A static scene scores 100 for every engine
+    engine = create_engine(name)
+    scores = [engine.update(gray_frame()) for _ in range(5)]
+    assert scores == [100.0] * 5
+
+
+@pytest.mark.parametrize("name", list(ENGINES))
+def test_engine_moving_object(name):
+    # A square moving into view lowers the score for every engine
+    engine = create_engine(name)
+    for _ in range(5):
+        engine.update(gray_frame())
+    assert engine.update(gray_frame(square_x=60)) < 100.0
+
+
+@pytest.mark.parametrize("name", list(ENGINES))
+def test_engine_reset(name):
+    # After a reset the next frame only starts the history
+    engine = create_engine(name)
+    engine.update(gray_frame())
+    engine.reset()
+    assert engine.update(gray_frame(square_x=60)) == 100.0
+
+
+def test_running_average_absorbs_lighting():
+    # A slow brightness ramp scores closer to 100 than a sudden object
+    engine = RunningAverageEngine(alpha=0.5)
+    ramp = [engine.update(gray_frame(brightness=80 + i)) for i in range(20)]
+    assert min(ramp[1:]) > engine.update(gray_frame(brightness=99, square_x=60))
+
+
+def test_detector_engine_by_name():
+    # The detector accepts an engine name
+    detector = Detector(engine="average")
+    frame = Image(np.full((HEIGHT, WIDTH, 3), 80, dtype=np.uint8))
+    assert detector.update(frame, SIM_THRESHOLD) == (False, 100.0)
+
+
+@pytest.mark.parametrize("lag", [1, 3])
+def test_stack_similarity_matches_difference_score(lag):
+    # Scores of a stack, computed a few pairs at a time, match scoring each pair
+    rng = np.random.default_rng(0)
+    stack = rng.integers(0, 256, (10, HEIGHT // 4, WIDTH // 4), dtype=np.uint8)
+    mask = np.zeros(stack.shape[1:], np.uint8)
+    mask[10:50, 20:90] = 255
+    for pair_mask in (None, mask):
+        expected = [
+            difference_score(cv2.absdiff(stack[i - lag], stack[i]), pair_mask)
+            for i in range(lag, len(stack))
+        ]
+        scores = stack_similarity(stack, lag, pair_mask, chunk_size=4)
+        assert np.allclose(scores, expected, atol=0.01)
+    assert len(stack_similarity(stack[:1])) == 0
+
+
+def test_unknown_engine():
+    with pytest.raises(ValueError):
+        create_engine("unknown")
+
+
+def test_engine_must_implement_reset():
+    # a missing override fails on creation, not on the first frame
+    class NoReset(MotionEngine):
+        def update(self, image, mask=None):
+            return 100.0
+
+    with pytest.raises(TypeError, match="reset"):
+        NoReset()
+
+
+if __name__ == "__main__":
+    pytest.main()
@@ -0,0 +1,88 @@
+import time
+
+import pytest
+
+from app.events import EventStore, MotionEvent
+
+
+@pytest.fixture
+def store():
+    store = EventStore(":memory:")
+    yield store
+    store.close()
+
+
+def make_events(count, cameras=("front", "back"), start=0.0):
+    # one event a minute, alternating cameras
+    return [
+        MotionEvent(
+            camera=cameras[i % len(cameras)],
+            start=start + 60 * i,
+            end=start + 60 * i + 10,
+            peak_score=99.0,
+            min_score=80.0,
+            path=f"videos/{i}.mp4",
+            size=1000,
+            frames=300,
+        )
+        for i in range(count)
+    ]
+
+
+def test_add_and_get(store):
+    event = make_events(1)[0]
+    event_id = store.add(event)
+    assert store.get(event_id) == event._replace(id=event_id)
+    assert store.get(event_id + 1) is None
+
+
+def test_query_time_range_and_camera(store):
+    store.add_many(make_events(10))
+    events = store.query(start=120, end=420)
+    assert [event.start for event in events] == [360, 300, 240, 180, 120]
+    assert store.count(start=120, end=420) == 5
+    front = store.query(start=120, end=420, camera="front")
+    assert [event.start for event in front] == [360, 240, 120]
+    assert store.query(camera="side") == []
+
+
+def test_query_limit_and_offset(store):
+    store.add_many(make_events(10))
+    first = store.query(limit=3)
+    second = store.query(limit=3, offset=3)
+    assert [event.start for event in first + second] == [
+        540,
+        480,
+        420,
+        360,
+        300,
+        240,
+    ]
+
+
+def test_queries_use_indexes(store):
+    assert "USING INDEX events_start" in store.explain(start=0, end=60)
+    assert "USING INDEX events_camera_start" in store.explain(0, 60, "front")
+
+
+def test_query_is_fast_with_many_events(store):
+    # A day of events out of a year of one event a minute
+    store.add_many(make_events(200_000))
+    begin = time.perf_counter()
+    events = store.query(start=60 * 100_000, end=60 * 101_440, camera="front")
+    elapsed = time.perf_counter() - begin
+    assert len(events) == 100
+    assert elapsed < 0.05
+
+
+def test_events_shared_across_connections(tmp_path):
+    path = str(tmp_path / "events.db")
+    writer, reader = EventStore(path), EventStore(path)
+    writer.add(make_events(1)[0])
+    assert reader.count() == 1
+    writer.close()
+    reader.close()
+
+
+if __name__ == "__main__":
+    pytest.main()
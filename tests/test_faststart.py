@@ -0,0 +1,86 @@
+import struct
+
+import cv2
+import numpy as np
+import pytest
+
+from app.faststart import faststart, find_atom
+
+
+@pytest.fixture
+def video_file(tmp_path):
+    # a short mp4 clip, with its moov atom at the end as OpenCV writes it
+    path = str(tmp_path / "clip.mp4")
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), 10, (64, 48))
+    for value in range(0, 250, 25):
+        writer.write(np.full((48, 64, 3), value, dtype=np.uint8))
+    writer.release()
+    yield path
+
+
+def read_frames(path):
+    cap = cv2.VideoCapture(path)
+    frames = []
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(frame)
+    cap.release()
+    return frames
+
+
+def test_moov_moved_to_front(video_file):
+    before = read_frames(video_file)
+    assert find_atom(video_file, b"moov") > find_atom(video_file, b"mdat")
+    assert faststart(video_file)
+    assert find_atom(video_file, b"moov") < find_atom(video_file, b"mdat")
+    # the chunk offsets follow the media data
+    after = read_frames(video_file)
+    assert len(after) == len(before) == 10
+    assert all(np.array_equal(a, b) for a, b in zip(before, after))
+
+
+def test_faststart_is_idempotent(video_file):
+    assert faststart(video_file)
+    assert not faststart(video_file)
+
+
+def test_faststart_ignores_other_files(tmp_path):
+    path = tmp_path / "notes.txt"
+    path.write_bytes(b"not a video")
+    assert not faststart(str(path))
+    assert path.read_bytes() == b"not a video"
+
+
+def test_moov_with_64_bit_size(video_file):
+    # rewrite the moov header with a 64 bit size, as large files have it
+    before = read_frames(video_file)
+    moov_offset = find_atom(video_file, b"moov")
+    with open(video_file, "rb") as file:
+        data = file.read()
+    (size,) = struct.unpack_from(">I", data, moov_offset)
+    header = struct.pack(">I4sQ", 1, b"moov", size + 8)
+    with open(video_file, "wb") as file:
+        file.write(data[:moov_offset] + header + data[moov_offset + 8 :])
+    assert faststart(video_file)
+    after = read_frames(video_file)
+    assert len(after) == len(before)
+    assert all(np.array_equal(a, b) for a, b in zip(before, after))
+
+
+def test_faststart_leaves_malformed_moov(video_file):
+    # a child atom of the moov claims a size smaller than its header
+    moov_offset = find_atom(video_file, b"moov")
+    with open(video_file, "r+b") as file:
+        file.seek(moov_offset + 8)
+        file.write(struct.pack(">I", 4))
+    with open(video_file, "rb") as file:
+        data = file.read()
+    assert not faststart(video_file)
+    with open(video_file, "rb") as file:
+        assert file.read() == data
+
+
+if __name__ == "__main__":
+    pytest.main()
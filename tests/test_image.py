@@ -4,7 +4,7 @@ import numpy as np
 import pytest
 from dotenv import load_dotenv
 
-from app.image import Image
+from app.image import Image, Preprocessor
 
 load_dotenv()
 
@@ -76,5 +76,47 @@ def test_get_image(rgb_image_object):
     assert np.array_equal(img_data, rgb_image_data)
 
 
+def test_preprocessor_matches_image_methods(rgb_image_object):
+    # The fused pipeline gives the same result as chaining Image methods
+    expected = (
+        rgb_image_object.color_to_gray()
+        .format_contrast()
+        .denoise(k=5, s=2)
+        .clean_white_noise(radius=3)
+        .get_image()
+    )
+    preprocessor = Preprocessor(k=5, s=2, radius=3)
+    assert np.array_equal(preprocessor.apply(rgb_image_data), expected)
+
+
+def test_preprocessor_reuses_output(rgb_image_object):
+    # Passing the previous output back in writes into the same buffer
+    preprocessor = Preprocessor()
+    out = preprocessor.apply(rgb_image_data)
+    assert preprocessor.apply(rgb_image_data, out=out) is out
+
+
+def test_preprocessor_skips_noop_stages():
+    # A blur kernel and structuring element of size 1 do nothing
+    assert Preprocessor(k=1, s=1, radius=1).get_stages() == [
+        "color_to_gray",
+        "format_contrast",
+    ]
+    assert Preprocessor().get_stages() == [
+        "color_to_gray",
+        "format_contrast",
+        "denoise",
+        "erode",
+        "dilate",
+    ]
+
+
+def test_preprocessor_resize():
+    # Downscaling gives a grayscale image of the requested size
+    preprocessor = Preprocessor(k=1, s=1, radius=1, size=(160, 120))
+    assert preprocessor.get_stages() == ["resize", "format_contrast"]
+    assert preprocessor.apply(rgb_image_data).shape == (120, 160)
+
+
 if __name__ == "__main__":
     pytest.main()
@@ -0,0 +1,68 @@
+import asyncio
+import time
+
+import numpy as np
+import pytest
+
+from app.motion import Detector
+from app.video import Streaming
+
+N_CLIENTS = 200
+CONNECT_SPREAD_SECS = 0.5
+MAX_P99_TTFF_SECS = 1.0
+
+
+async def time_to_first_frame(
+    stream: Streaming, delay: float, done: asyncio.Event
+) -> float:
+    # Connect after a delay, time how long the first frame takes and stay
+    # connected until every client has been served
+    await asyncio.sleep(delay)
+    client = stream.stream()
+    start = time.perf_counter()
+    part = await client.__anext__()
+    elapsed = time.perf_counter() - start
+    assert part.startswith(b"--frame")
+    await done.wait()
+    await client.aclose()
+    return elapsed
+
+
+async def heartbeat(stop: asyncio.Event, lags: list) -> None:
+    # Measure how late the event loop runs an unrelated task
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(0.01)
+        lags.append(time.perf_counter() - start - 0.01)
+
+
+async def run_clients(stream: Streaming) -> tuple:
+    stop, lags = asyncio.Event(), []
+    beat = asyncio.ensure_future(heartbeat(stop, lags))
+    delays = np.linspace(0, CONNECT_SPREAD_SECS, N_CLIENTS)
+    clients = [
+        asyncio.ensure_future(time_to_first_frame(stream, d, stop)) for d in delays
+    ]
+    await asyncio.sleep(CONNECT_SPREAD_SECS + MAX_P99_TTFF_SECS)
+    stop.set()
+    ttffs = await asyncio.gather(*clients)
+    await beat
+    return ttffs, lags
+
+
+def test_p99_time_to_first_frame(fake_camera):
+    # Many concurrent clients on one fake camera get their first frame quickly
+    # and the event loop stays free for other work
+    stream = Streaming(fake_camera, Detector())
+    ttffs, lags = asyncio.run(run_clients(stream))
+    stream.join()
+    p99 = float(np.percentile(ttffs, 99))
+    print(f"p99 time-to-first-frame for {N_CLIENTS} clients: {p99 * 1000:.1f} ms")
+    print(f"max event loop lag: {max(lags) * 1000:.1f} ms")
+    assert p99 < MAX_P99_TTFF_SECS
+    assert max(lags) < MAX_P99_TTFF_SECS
+    assert fake_camera.starts == 1
+
+
+if __name__ == "__main__":
+    pytest.main()
@@ -1,11 +1,19 @@
+import os
+
 import pytest
 from fastapi.testclient import TestClient
+import app.main as main
 from app.main import app
 
-client = TestClient(app)
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(main, "EVENT_DB", str(tmp_path / "events.db"))
+    with TestClient(app) as client:
+        yield client
 
 
-def test_stream_video():
+def test_stream_video(client):
     response = client.get("/stream")
     print(response.headers)
     assert response.status_code == 200
@@ -13,5 +21,74 @@ def test_stream_video():
     assert stream_content_type == "multipart/x-mixed-replace; boundary=frame"
 
 
+def test_stream_profile(client):
+    response = client.get("/stream?fps=5&width=320&quality=60")
+    assert response.status_code == 200
+    assert client.get("/stream?quality=0").status_code == 422
+
+
+def test_events(client):
+    response = client.get("/events?start=2024-01-01T00:00:00&camera=0&limit=5")
+    assert response.status_code == 200
+    assert set(response.json()) == {"count", "events"}
+    assert client.get("/events/0").status_code == 404
+
+
+@pytest.fixture
+def recording(tmp_path, monkeypatch):
+    monkeypatch.setattr(main, "VID_DIR", str(tmp_path))
+    path = os.path.join(str(tmp_path), "test_clip.mp4")
+    with open(path, "wb") as file:
+        file.write(bytes(range(256)) * 4)
+    return path
+
+
+def test_recordings(client, recording):
+    names = [r["name"] for r in client.get("/recordings").json()["recordings"]]
+    assert "test_clip.mp4" in names
+    assert client.get("/recordings/missing.mp4").status_code == 404
+
+
+def test_download_recording(client, recording):
+    response = client.get("/recordings/test_clip.mp4")
+    assert response.status_code == 200
+    assert response.content == bytes(range(256)) * 4
+    assert response.headers["accept-ranges"] == "bytes"
+
+    etag = response.headers["etag"]
+    cached = client.get("/recordings/test_clip.mp4", headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+
+    partial = client.get("/recordings/test_clip.mp4", headers={"Range": "bytes=10-19"})
+    assert partial.status_code == 206
+    assert partial.content == bytes(range(10, 20))
+    assert partial.headers["content-range"] == "bytes 10-19/1024"
+
+    beyond = client.get("/recordings/test_clip.mp4", headers={"Range": "bytes=2000-"})
+    assert beyond.status_code == 416
+
+
+def test_only_videos_are_served(client, tmp_path, monkeypatch):
+    # the event database and other files next to the videos are not served
+    monkeypatch.setattr(main, "VID_DIR", str(tmp_path))
+    for name in ["events.db", "events.db-wal", "notes.txt"]:
+        (tmp_path / name).write_bytes(b"private")
+        assert client.get(f"/recordings/{name}").status_code == 404
+
+
+def test_missing_thumbnail(client, recording):
+    # the clip is not a video, so no thumbnail can be made
+    assert client.get("/recordings/test_clip.mp4/thumbnail").status_code == 404
+    assert client.get("/recordings/test_clip.mp4/poster").status_code == 404
+
+
+def test_metrics(client):
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert "# TYPE camera_frames_total counter" in response.text
+    assert 'stream_clients{camera="0"}' in response.text
+
+
 if __name__ == "__main__":
     pytest.main()
@@ -0,0 +1,162 @@
+import json
+import threading
+
+import cv2
+import numpy as np
+import pytest
+
+import app.encoder
+from app.encoder import EncodedFrame, JpegEncoder
+from app.manager import (
+    CameraManager,
+    FrameRingPublisher,
+    ThreadCamera,
+    load_config,
+)
+from app.metrics import metrics
+from app.shm import FrameRing
+from conftest import FakeCamera
+
+
+def fake_camera_factory(config):
+    return FakeCamera()
+
+
+def write_config(tmp_path, cameras):
+    path = tmp_path / "cameras.json"
+    path.write_text(json.dumps({"cameras": cameras}))
+    return str(path)
+
+
+def test_load_config_defaults(tmp_path):
+    path = write_config(tmp_path, [{"id": 1, "source": "rtsp://cam"}])
+    (config,) = load_config(path)
+    assert config["id"] == "1"
+    assert config["source"] == "rtsp://cam"
+    assert set(config) >= {"mode", "fps", "width", "height", "engine"}
+
+
+def test_load_config_without_file(tmp_path):
+    configs = load_config(str(tmp_path / "missing.json"))
+    assert [config["id"] for config in configs] == ["0"]
+
+
+def test_load_config_rejects_unknown_mode(tmp_path):
+    path = write_config(tmp_path, [{"id": "a", "source": 0, "mode": "fiber"}])
+    with pytest.raises(ValueError):
+        load_config(path)
+
+
+def test_camera_manager_lookup(tmp_path):
+    path = write_config(
+        tmp_path,
+        [
+            {"id": "front", "source": 0, "mode": "thread"},
+            {"id": "back", "source": 1, "mode": "thread"},
+        ],
+    )
+    manager = CameraManager.from_file(path, fake_camera_factory)
+    assert manager.get_ids() == ["front", "back"]
+    assert manager.get_default() is manager.get("front")
+    assert isinstance(manager.get("back"), ThreadCamera)
+    with pytest.raises(KeyError):
+        manager.get("side")
+
+
+def test_thread_camera_streams(tmp_path):
+    path = write_config(tmp_path, [{"id": "front", "source": 0, "mode": "thread"}])
+    manager = CameraManager.from_file(path, fake_camera_factory)
+    frames = manager.get("front").frames()
+    part = next(frames)
+    frames.close()
+    manager.stop()
+    assert part.startswith(b"--frame")
+
+
+def test_process_camera_streams(tmp_path):
+    path = write_config(tmp_path, [{"id": "front", "source": 0, "mode": "process"}])
+    manager = CameraManager.from_file(path, fake_camera_factory)
+    manager.start()
+    try:
+        camera = manager.get("front")
+        frames = camera.frames()
+        part = next(frames)
+        frames.close()
+        # other consumers read the frames in place
+        config = camera.get_config()
+        shape = (config["height"], config["width"], 3)
+        ring = FrameRing(shape, name=camera.get_ring_name())
+        seq = ring.get_seq()
+        frame_shape = ring.view(seq).shape
+        ring.close()
+        # frames are counted as captured by the worker, published or not
+        camera.collect_metrics()
+        captured = metrics.get("camera_frames_total", camera="front")
+    finally:
+        manager.stop()
+    assert part.startswith(b"--frame")
+    assert seq > 0
+    assert captured >= seq
+    assert frame_shape == shape
+
+
+def test_process_camera_restarts(tmp_path):
+    path = write_config(tmp_path, [{"id": "front", "source": 0, "mode": "process"}])
+    manager = CameraManager.from_file(path, fake_camera_factory)
+    manager.start()
+    manager.stop()
+    manager.start()
+    try:
+        frames = manager.get("front").frames()
+        part = next(frames)
+        frames.close()
+    finally:
+        manager.stop()
+    assert part.startswith(b"--frame")
+
+
+def test_process_camera_relays_without_reencoding(tmp_path, monkeypatch):
+    # A default client gets the worker's JPEG, not a decoded and re-encoded one
+    calls = {"imdecode": 0, "encode": 0}
+    imdecode, encode = cv2.imdecode, JpegEncoder.encode
+
+    def counting_imdecode(*args, **kwargs):
+        calls["imdecode"] += 1
+        return imdecode(*args, **kwargs)
+
+    def counting_encode(self, frame):
+        calls["encode"] += 1
+        return encode(self, frame)
+
+    monkeypatch.setattr(app.encoder.cv2, "imdecode", counting_imdecode)
+    monkeypatch.setattr(JpegEncoder, "encode", counting_encode)
+    path = write_config(tmp_path, [{"id": "front", "source": 0, "mode": "process"}])
+    manager = CameraManager.from_file(path, fake_camera_factory)
+    manager.start()
+    try:
+        frames = manager.get("front").frames()
+        parts = [next(frames) for _ in range(3)]
+        frames.close()
+    finally:
+        manager.stop()
+    assert all(part.startswith(b"--frame") for part in parts)
+    assert calls == {"imdecode": 0, "encode": 0}
+
+
+def test_ring_publisher_resizes_other_frame_sizes(capsys):
+    # A device delivering another size than configured still streams, with
+    # one warning instead of one per frame
+    ring = FrameRing((48, 64, 3))
+    try:
+        publisher = FrameRingPublisher(ring, threading.Condition())
+        frame = np.full((96, 128, 3), 200, dtype=np.uint8)
+        for _ in range(3):
+            publisher.publish(EncodedFrame(frame, JpegEncoder()))
+        seq, image = ring.read_frame()
+        _, jpeg = ring.read_jpeg()
+        decoded = cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_COLOR)
+    finally:
+        ring.close()
+    assert seq == 3
+    assert image.shape == decoded.shape == (48, 64, 3)
+    assert capsys.readouterr().out.count("resizing") == 1
@@ -0,0 +1,87 @@
+import pytest
+
+import app.video
+from app.metrics import MetricsRegistry, metrics
+from app.motion import Detector
+from app.timing import StageTimer
+from app.video import Streaming
+from conftest import FakeCamera
+
+
+@pytest.fixture
+def registry():
+    registry = MetricsRegistry(enabled=True)
+    registry.define("frames_total", "counter", "Frames captured.")
+    registry.define("clients", "gauge", "Clients streaming.")
+    registry.define("latency_seconds", "histogram", "Latency.", buckets=(0.01, 0.1))
+    yield registry
+
+
+def test_counter_and_gauge(registry):
+    registry.inc("frames_total", camera="front")
+    registry.inc("frames_total", 2, camera="front")
+    registry.set("clients", 3, camera="front")
+    assert registry.get("frames_total", camera="front") == 3
+    text = registry.render()
+    assert "# TYPE frames_total counter" in text
+    assert 'frames_total{camera="front"} 3' in text
+    assert 'clients{camera="front"} 3' in text
+
+
+def test_histogram(registry):
+    for value in (0.005, 0.05, 0.5):
+        registry.observe("latency_seconds", value, stage="encode")
+    text = registry.render()
+    assert 'latency_seconds_bucket{stage="encode",le="0.01"} 1' in text
+    assert 'latency_seconds_bucket{stage="encode",le="0.1"} 2' in text
+    assert 'latency_seconds_bucket{stage="encode",le="+Inf"} 3' in text
+    assert 'latency_seconds_count{stage="encode"} 3' in text
+    assert 'latency_seconds_sum{stage="encode"} 0.555' in text
+
+
+def test_label_values_are_escaped(registry):
+    registry.set("clients", 1, camera='a"b')
+    assert 'clients{camera="a\\"b"} 1' in registry.render()
+
+
+def test_disabled_registry_ignores_updates():
+    registry = MetricsRegistry(enabled=False)
+    registry.define("frames_total", "counter", "Frames captured.")
+    registry.inc("frames_total")
+    assert registry.get("frames_total") is None
+
+
+def test_unknown_metric_kind(registry):
+    with pytest.raises(ValueError):
+        registry.define("frames", "summary", "Frames.")
+
+
+def test_stage_timer_observer():
+    observed = []
+    stage_timer = StageTimer(enabled=False)
+    stage_timer.set_observer(lambda name, seconds: observed.append(name))
+    with stage_timer.stage("encode"):
+        pass
+    assert observed == ["encode"]
+    # the observer does not make the timer keep samples
+    assert stage_timer.get_samples() == {}
+
+
+def test_streaming_updates_metrics(tmp_path, monkeypatch):
+    # the motion event is recorded, with its thumbnails, under tmp_path
+    monkeypatch.setattr(app.video, "VID_DIR", str(tmp_path))
+    metrics.reset()
+    streaming = Streaming(FakeCamera(change_after=5), Detector(), camera_id="test")
+    frames = streaming.start()
+    for _ in range(12):
+        next(frames)
+    streaming.collect_metrics()
+    assert metrics.get("stream_clients", camera="test") == 1
+    frames.close()
+    streaming.join()
+    assert metrics.get("camera_frames_total", camera="test") >= 12
+    assert metrics.get("stream_bytes_total", camera="test") > 0
+    assert metrics.get("motion_events_total", camera="test") == 1
+    assert metrics.get("motion_similarity_score", camera="test") is not None
+    text = metrics.render()
+    assert 'pipeline_stage_seconds_count{stage="encode"}' in text
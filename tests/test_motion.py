@@ -5,7 +5,7 @@ import pytest
 from dotenv import load_dotenv
 
 from app.image import Image
-from app.motion import Detector
+from app.motion import Detector, parse_regions
 
 load_dotenv()
 # video
@@ -82,5 +82,115 @@ def test_detect_motion(create_sample_image):
     assert 0 <= similarity_score <= 100
 
 
+def test_update_matches_detect_motion():
+    # Incremental detection gives the same results as pairwise detection
+    frames = [
+        Image(np.random.randint(0, 255, size=(HEIGHT, WIDTH, 3), dtype=np.uint8))
+        for _ in range(4)
+    ]
+    detector = Detector()
+    assert detector.update(frames[0], SIM_THRESHOLD) == (False, 100.0)
+    for prev_frame, current_frame in zip(frames, frames[1:]):
+        expected = Detector().detect_motion(prev_frame, current_frame, SIM_THRESHOLD)
+        assert detector.update(current_frame, SIM_THRESHOLD) == expected
+
+
+def test_update_reuses_buffers(create_sample_image):
+    # Incremental detection alternates between two preallocated buffers
+    detector = Detector()
+    buffers = set()
+    for _ in range(6):
+        detector.update(create_sample_image, SIM_THRESHOLD)
+        buffers.update(id(b) for b in detector._Detector__buffers if b is not None)
+    assert len(buffers) == 2
+
+
+def test_reset(create_sample_image):
+    # After a reset the next frame only sets the reference
+    detector = Detector()
+    detector.update(create_sample_image, SIM_THRESHOLD)
+    detector.reset()
+    assert detector.update(create_sample_image, SIM_THRESHOLD) == (False, 100.0)
+
+
+def test_image_similarity_matches_normalised_mean():
+    # The integer score matches the mean of the normalised difference
+    detector = Detector()
+    for _ in range(10):
+        img1, img2 = (
+            Image(np.random.randint(0, 255, size=(HEIGHT, WIDTH), dtype=np.uint8))
+            for _ in range(2)
+        )
+        difference = detector._Detector__image_subtraction(img1, img2)
+        expected = round(100 - (np.mean(difference.normalise()) * 100), 2)
+        score = detector._Detector__image_similarity(img1, img2)
+        assert round(score, 2) == expected
+
+
+def moving_square_frames(offset: int) -> tuple:
+    # Two gray frames with a white square that moves by offset pixels
+    frames = []
+    for x in (100, 100 + offset):
+        frame = np.full((HEIGHT, WIDTH, 3), 80, dtype=np.uint8)
+        frame[200:300, x : x + 100] = 255
+        frames.append(Image(frame))
+    return frames
+
+
+def test_update_downscaled_agrees_with_full_resolution():
+    # Detecting at a lower resolution gives a close score
+    prev_frame, current_frame = moving_square_frames(offset=60)
+    full, small = Detector(), Detector(detect_size=(160, 120))
+    for detector in (full, small):
+        detector.update(prev_frame, SIM_THRESHOLD)
+    _, full_score = full.update(current_frame, SIM_THRESHOLD)
+    _, small_score = small.update(current_frame, SIM_THRESHOLD)
+    assert full_score < 100
+    assert small_score == pytest.approx(full_score, abs=1.0)
+
+
+def test_update_ignores_excluded_regions():
+    # Motion inside an excluded region does not count
+    prev_frame, current_frame = moving_square_frames(offset=60)
+    detector = Detector(detect_size=(160, 120), exclusions=[(80, 180, 300, 140)])
+    detector.update(prev_frame, SIM_THRESHOLD)
+    assert detector.update(current_frame, SIM_THRESHOLD) == (False, 100.0)
+
+
+def test_update_only_scores_regions_of_interest():
+    # Motion counts more when the region of interest surrounds it
+    prev_frame, current_frame = moving_square_frames(offset=60)
+    whole, roi = Detector(), Detector(regions=[(100, 200, 160, 100)])
+    for detector in (whole, roi):
+        detector.update(prev_frame, SIM_THRESHOLD)
+    assert roi.update(current_frame, SIM_THRESHOLD)[1] < (
+        whole.update(current_frame, SIM_THRESHOLD)[1]
+    )
+
+
+def test_score_stack_matches_update():
+    # Scoring a stack of frames agrees with updating frame by frame
+    frames = [moving_square_frames(offset=offset)[1] for offset in (0, 20, 40, 40)]
+    regions = [(100, 200, 160, 100)]
+    detector = Detector(detect_size=(160, 120), regions=regions)
+    expected = [detector.update(frame, SIM_THRESHOLD)[1] for frame in frames][1:]
+
+    stacked = Detector(detect_size=(160, 120), regions=regions)
+    images = [frame.get_image() for frame in frames]
+    stack = stacked.transform_stack(images)
+    assert stack.shape == (4, 120, 160)
+    scores = stacked.score_stack(stack, images[0].shape)
+    assert np.allclose(scores, expected, atol=0.01)
+    assert scores[-1] == 100.0
+
+
+def test_parse_regions():
+    assert parse_regions("") == []
+    assert parse_regions("0,0,260,24;10,20,30,40") == [
+        (0, 0, 260, 24),
+        (10, 20, 30, 40),
+    ]
+
+
 if __name__ == "__main__":
     pytest.main()
@@ -0,0 +1,83 @@
+import cv2
+import numpy as np
+import pytest
+
+import app.overlay
+from app.overlay import (
+    FONT,
+    FONT_SCALE,
+    TEXT_COLOR,
+    TIME_ORIGIN,
+    Clock,
+    Overlay,
+    TextCache,
+    blit,
+    render_dot,
+)
+
+TEXT = "2023-01-01  12:34:56"
+
+
+def random_frame(size=(120, 240)):
+    return np.random.default_rng(0).integers(0, 256, size + (3,), dtype=np.uint8)
+
+
+def test_text_is_drawn_where_put_text_draws():
+    frame = random_frame()
+    expected = frame.copy()
+    cv2.putText(expected, TEXT, TIME_ORIGIN, FONT, FONT_SCALE, TEXT_COLOR)
+    drawn = frame.copy()
+    TextCache().draw(drawn, TEXT, TIME_ORIGIN)
+    changed = (drawn != frame).any(axis=2)
+    assert changed.sum() > 50
+    # only text colored pixels, all of them where cv2.putText draws too
+    assert (drawn[changed] == TEXT_COLOR).all()
+    assert not (changed & ~(expected != frame).any(axis=2)).any()
+
+
+def test_text_is_rendered_once():
+    cache = TextCache(size=2)
+    assert cache.get(TEXT) is cache.get(TEXT)
+    cache.get("a")
+    cache.get(TEXT)
+    cache.get("b")  # drops "a", the least recently used
+    assert len(cache) == 2
+    assert cache.get(TEXT) is cache.get(TEXT)
+
+
+def test_blit_is_clipped_to_the_frame():
+    frame = random_frame()
+    dot = render_dot()
+    for origin in [(0, 0), (239, 119), (-100, 5), (500, 500)]:
+        blit(frame, dot, origin)
+    assert (frame[0, 0] == TEXT_COLOR).all()
+    assert (frame[119, 239] == TEXT_COLOR).all()
+    TextCache().draw(frame, "", TIME_ORIGIN)
+
+
+def test_clock_formats_once_per_second(monkeypatch):
+    now = [1000.2]
+    monkeypatch.setattr(app.overlay.time, "time", lambda: now[0])
+    clock = Clock("%S")
+    first = clock.now()
+    now[0] = 1000.9
+    assert clock.now() is first
+    now[0] = 1001.25
+    assert clock.now() != first
+    # a format finer than seconds is formatted every time
+    assert Clock("%f").now() == "250000"
+
+
+def test_overlay_draws_camera_name_and_motion():
+    frame = random_frame()
+    overlay = Overlay(camera_name="front", motion=True)
+    still = overlay.draw(frame.copy(), TEXT)
+    moving = overlay.draw(frame.copy(), TEXT, is_moving=True)
+    # the name at the bottom, the indicator at the top right only when moving
+    assert (still[-20:] != frame[-20:]).any()
+    assert (still[:, -30:] == frame[:, -30:]).all()
+    assert (moving[:, -30:] != frame[:, -30:]).any()
+
+
+if __name__ == "__main__":
+    pytest.main()
@@ -0,0 +1,88 @@
+import os
+
+import pytest
+
+from app.playback import (
+    RangeNotSatisfiable,
+    etag_matches,
+    file_etag,
+    find_recording,
+    iter_file,
+    list_recordings,
+    parse_range,
+)
+
+
+@pytest.fixture
+def recordings(tmp_path):
+    # three recordings of two cameras, oldest first
+    for age, name in enumerate(["front_2.mp4", "back_1.mp4", "front_1.mp4"]):
+        path = tmp_path / name
+        path.write_bytes(bytes(range(256)) * (age + 1))
+        os.utime(path, (1000 - age, 1000 - age))
+    (tmp_path / "events.db").write_bytes(b"")
+    yield str(tmp_path)
+
+
+@pytest.mark.parametrize(
+    "header, expected",
+    [
+        (None, None),
+        ("bytes=0-99", (0, 99)),
+        ("bytes=100-", (100, 999)),
+        ("bytes=-100", (900, 999)),
+        ("bytes=900-5000", (900, 999)),
+        ("bytes=0-1,5-6", None),
+        ("items=0-1", None),
+        ("bytes=a-b", None),
+        ("bytes=20-10", None),
+    ],
+)
+def test_parse_range(header, expected):
+    assert parse_range(header, 1000) == expected
+
+
+@pytest.mark.parametrize("header", ["bytes=1000-", "bytes=1000-1005", "bytes=-0"])
+def test_unsatisfiable_range(header):
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range(header, 1000)
+
+
+def test_etag(recordings):
+    path = os.path.join(recordings, "front_1.mp4")
+    etag = file_etag(os.stat(path))
+    assert etag_matches(etag, etag)
+    assert etag_matches(f'"other", {etag}', etag)
+    assert etag_matches("*", etag)
+    assert not etag_matches(None, etag)
+    with open(path, "ab") as file:
+        file.write(b"more")
+    assert file_etag(os.stat(path)) != etag
+
+
+def test_iter_file_reads_range_in_chunks(recordings):
+    path = os.path.join(recordings, "front_2.mp4")
+    chunks = list(iter_file(path, 10, 109, chunk_size=32))
+    assert [len(chunk) for chunk in chunks] == [32, 32, 32, 4]
+    assert b"".join(chunks) == bytes(range(10, 110))
+
+
+def test_list_recordings(recordings):
+    names = [recording["name"] for recording in list_recordings(recordings, "mp4")]
+    assert names == ["front_2.mp4", "back_1.mp4", "front_1.mp4"]
+    front = list_recordings(recordings, "mp4", camera="front")
+    assert [recording["name"] for recording in front] == ["front_2.mp4", "front_1.mp4"]
+    assert list_recordings(os.path.join(recordings, "missing"), "mp4") == []
+
+
+def test_find_recording(recordings):
+    assert find_recording("back_1.mp4", recordings).endswith("back_1.mp4")
+    assert find_recording("missing.mp4", recordings) is None
+    assert find_recording("../back_1.mp4", recordings) is None
+    assert find_recording(".hidden", recordings) is None
+    # only videos are served, not the event database or other files
+    assert find_recording("events.db", recordings) is None
+
+
+if __name__ == "__main__":
+    pytest.main()
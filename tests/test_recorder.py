@@ -0,0 +1,111 @@
+import os
+import threading
+
+import numpy as np
+import pytest
+from dotenv import load_dotenv
+
+import app.recorder
+from app.faststart import find_atom
+from app.recorder import Recorder
+
+load_dotenv()
+
+# camera
+FPS = int(os.getenv("FPS"))
+WIDTH = int(os.getenv("WIDTH"))
+HEIGHT = int(os.getenv("HEIGHT"))
+
+frame = np.zeros((HEIGHT, WIDTH, 3), dtype=np.uint8)
+
+
+class BlockedWriter:
+    # VideoWriter stand-in that blocks until released
+    release_event = threading.Event()
+
+    def __init__(self, *args) -> None:
+        self.frames = 0
+
+    def write(self, frame) -> None:
+        BlockedWriter.release_event.wait()
+        self.frames += 1
+
+    def isOpened(self) -> bool:
+        return True
+
+    def release(self) -> None:
+        pass
+
+
+@pytest.fixture
+def blocked_writer(monkeypatch):
+    BlockedWriter.release_event.clear()
+    monkeypatch.setattr(app.recorder.cv2, "VideoWriter", BlockedWriter)
+    yield BlockedWriter
+    BlockedWriter.release_event.set()
+
+
+def test_record_video(tmp_path):
+    # Frames are written to a video file by the background thread
+    recorder = Recorder(codec="mp4v", vid_format="mp4")
+    name = str(tmp_path / "test_video")
+    recorder.open(name, FPS, (WIDTH, HEIGHT))
+    for _ in range(10):
+        assert recorder.write(frame)
+    recorder.close()
+    recorder.stop()
+    assert os.path.getsize(f"{name}.mp4") > 0
+    assert recorder.get_metrics() == {
+        "written_frames": 10,
+        "dropped_frames": 0,
+        "videos": 1,
+        "queue_depth": 0,
+    }
+
+
+def test_on_close_reports_video(tmp_path):
+    # The callback gets the file and frame count once the video is closed
+    closed = []
+    recorder = Recorder(codec="mp4v", vid_format="mp4")
+    name = str(tmp_path / "event")
+    recorder.open(name, FPS, (WIDTH, HEIGHT), on_close=lambda *v: closed.append(v))
+    for _ in range(5):
+        recorder.write(frame)
+    recorder.close()
+    recorder.stop()
+    assert closed == [(f"{name}.mp4", 5)]
+
+
+def test_recordings_start_with_their_index(tmp_path):
+    # mp4 recordings are rewritten with the moov atom first
+    recorder = Recorder(codec="mp4v", vid_format="mp4", fast_start=True)
+    name = str(tmp_path / "fast")
+    recorder.open(name, FPS, (WIDTH, HEIGHT))
+    for _ in range(5):
+        recorder.write(frame)
+    recorder.stop()
+    assert find_atom(f"{name}.mp4", b"moov") < find_atom(f"{name}.mp4", b"mdat")
+
+
+@pytest.mark.parametrize("overflow", ["drop_oldest", "drop_newest"])
+def test_overflow_drops_frames(blocked_writer, overflow):
+    # A full queue drops frames instead of blocking the caller
+    recorder = Recorder(queue_size=5, overflow=overflow)
+    recorder.open("unused", FPS, (WIDTH, HEIGHT))
+    results = [recorder.write(frame) for _ in range(20)]
+    metrics = recorder.get_metrics()
+    assert metrics["queue_depth"] <= 5
+    assert metrics["dropped_frames"] >= 14
+    assert all(results) == (overflow == "drop_oldest")
+    blocked_writer.release_event.set()
+    recorder.stop()
+    assert recorder.get_metrics()["queue_depth"] == 0
+
+
+def test_unknown_overflow_policy():
+    with pytest.raises(ValueError):
+        Recorder(overflow="unknown")
+
+
+if __name__ == "__main__":
+    pytest.main()
@@ -0,0 +1,189 @@
+import json
+
+import cv2
+import numpy as np
+import pytest
+
+from app.image import Image
+from app.motion import Detector
+from app.scan import (
+    Segment,
+    find_segments,
+    find_videos,
+    main,
+    sample_frames,
+    scan_file,
+    scan_files,
+    score_lags,
+    sweep_file,
+    sweep_thresholds,
+)
+
+
+def write_clip(path, frames=60, moving=(20, 40)):
+    # a square at rest, moving from frame 20 to 40, then at rest again
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), 10, (160, 120))
+    background = np.random.default_rng(0).integers(
+        60, 120, (120, 160, 3), dtype=np.uint8
+    )
+    for index in range(frames):
+        frame = background.copy()
+        x = (min(max(index, moving[0]), moving[1]) - moving[0]) * 5
+        frame[30:90, x : x + 60] = 230
+        writer.write(frame)
+    writer.release()
+    return path
+
+
+@pytest.fixture
+def clip(tmp_path):
+    yield write_clip(str(tmp_path / "clip.mp4"))
+
+
+def test_find_segments_merges_close_motion():
+    results = [
+        (0, False, 100.0),
+        (10, True, 90.0),
+        (20, True, 80.0),
+        (30, False, 99.0),
+        (40, True, 85.0),
+        (100, False, 99.0),
+        (200, True, 70.0),
+    ]
+    segments = find_segments(results, fps=10, every=10, merge_gap=1.0)
+    assert segments == [Segment(0.0, 4.0, 80.0), Segment(19.0, 20.0, 70.0)]
+
+
+def test_sweep_thresholds_matches_find_segments():
+    rng = np.random.default_rng(0)
+    indices = np.arange(0, 3000, 5)
+    scores = np.round(rng.uniform(85, 100, len(indices)), 2)
+    thresholds = [88, 92, 95, 99, 101]
+    sweep = sweep_thresholds(indices, scores, 30, thresholds, every=5, merge_gap=1)
+    for threshold in thresholds:
+        results = [
+            (index, score < threshold, score) for index, score in zip(indices, scores)
+        ]
+        expected = find_segments(results, 30, every=5, merge_gap=1)
+        assert sweep[threshold] == expected
+    assert sweep_thresholds(indices, scores, 30, [50])[50] == []
+
+
+def test_sample_frames_grab_and_seek_agree(clip):
+    grabbed = list(sample_frames(clip, every=25))
+    seeked = list(sample_frames(clip, every=25, seek_stride=10))
+    assert [index for index, _ in grabbed] == [0, 25, 50]
+    assert [index for index, _ in seeked] == [0, 25, 50]
+    for (_, a), (_, b) in zip(grabbed, seeked):
+        assert np.array_equal(a, b)
+
+
+def test_scan_file_finds_motion(clip):
+    result = scan_file(clip, threshold=98, every=2)
+    assert result["frames"] == 60
+    assert result["duration"] == 6.0
+    [segment] = result["segments"]
+    assert 1.5 <= segment["start"] <= 2.5
+    assert 3.5 <= segment["end"] <= 4.5
+    assert segment["score"] < 98
+
+
+@pytest.mark.parametrize("batch_size", [4, 32])
+def test_score_lags_matches_update(clip, batch_size):
+    # Each interval scores the frames the live detector compares with N_FRAMES
+    lags = score_lags(clip, [2, 3, 6], batch_size, Detector())
+    for lag, (indices, scores) in lags.items():
+        detector = Detector()
+        expected = [
+            (index, detector.update(Image(frame), 98)[1])
+            for index, frame in sample_frames(clip, lag)
+        ][1:]
+        assert list(indices) == [index for index, _ in expected]
+        assert np.allclose(scores, [score for _, score in expected], atol=0.01)
+    with pytest.raises(ValueError):
+        score_lags(clip, [0])
+
+
+def test_scan_file_engines_agree(clip):
+    stacked = scan_file(clip, threshold=98, every=2, batch_size=5)
+    updated = scan_file(clip, threshold=98, every=2, engine="average")
+    assert len(stacked["segments"]) == len(updated["segments"]) == 1
+
+
+def test_sweep_file(clip):
+    result = sweep_file(clip, [50, 98], [2, 4])
+    rows = {(row["every"], row["threshold"]): row for row in result["sweep"]}
+    assert len(rows) == 4
+    assert rows[(2, 50)]["segments"] == 0
+    assert rows[(2, 98)]["segments"] == 1
+    assert 1.5 <= rows[(2, 98)]["motion"] <= 3
+
+
+def test_scan_is_resumable(tmp_path):
+    clips = [write_clip(str(tmp_path / f"clip{i}.mp4"), frames=20) for i in range(3)]
+    output = str(tmp_path / "scan.jsonl")
+    first = list(scan_files(clips[:2], threshold=98, every=2, workers=1, output=output))
+    assert len(first) == 2
+    # only the new file is scanned, and a new threshold scans everything
+    again = list(scan_files(clips, threshold=98, every=2, workers=1, output=output))
+    assert [result["path"] for result in again] == [clips[2]]
+    assert len(list(scan_files(clips, 90, 2, workers=1, output=output))) == 3
+    with open(output) as file:
+        assert len([json.loads(line) for line in file]) == 6
+
+
+def test_scan_resumes_per_engine(tmp_path):
+    # files scanned with one engine are scanned again with another
+    clips = [write_clip(str(tmp_path / f"clip{i}.mp4"), frames=20) for i in range(2)]
+    output = str(tmp_path / "scan.jsonl")
+    first = list(scan_files(clips, 98, 2, "difference", workers=1, output=output))
+    assert [result["engine"] for result in first] == ["difference"] * 2
+    again = list(scan_files(clips, 98, 2, "average", workers=1, output=output))
+    assert sorted(result["path"] for result in again) == clips
+    assert not list(scan_files(clips, 98, 2, "average", workers=1, output=output))
+
+
+def test_scan_in_process_pool(tmp_path):
+    clips = [write_clip(str(tmp_path / f"clip{i}.mp4"), frames=20) for i in range(2)]
+    results = list(scan_files([str(tmp_path)], threshold=98, every=2, workers=2))
+    assert sorted(result["path"] for result in results) == clips
+
+
+def test_find_videos(tmp_path):
+    (tmp_path / "day").mkdir()
+    for name in ["day/b.mp4", "a.MOV", "notes.txt"]:
+        (tmp_path / name).write_bytes(b"")
+    assert find_videos([str(tmp_path)]) == [
+        str(tmp_path / "a.MOV"),
+        str(tmp_path / "day" / "b.mp4"),
+    ]
+
+
+def test_main(clip, tmp_path, capsys):
+    output = str(tmp_path / "scan.jsonl")
+    main(
+        [
+            clip,
+            "--threshold",
+            "98",
+            "--every",
+            "2",
+            "--workers",
+            "1",
+            "--output",
+            output,
+        ]
+    )
+    with open(output) as file:
+        assert len(json.loads(file.readline())["segments"]) == 1
+    assert "real time" in capsys.readouterr().err
+
+
+def test_main_sweep(clip, capsys):
+    main([clip, "--sweep", "90,98", "--lags", "2,5"])
+    out = capsys.readouterr().out
+    assert out.count("segments") == 4
+
+
+if __name__ == "__main__":
+    pytest.main()
@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+
+from app.shm import FrameRing
+
+shape = (48, 64, 3)
+
+
+def make_frame(value: int) -> np.ndarray:
+    return np.full(shape, value, dtype=np.uint8)
+
+
+@pytest.fixture
+def ring():
+    ring = FrameRing(shape, slots=3)
+    yield ring
+    ring.close()
+
+
+def test_frame_ring_starts_empty(ring):
+    assert ring.get_seq() == 0
+    assert ring.view(0) is None
+    assert ring.read_jpeg() == (0, None)
+
+
+def test_frame_ring_round_trip(ring):
+    frame = np.random.randint(0, 255, size=shape, dtype=np.uint8)
+    seq = ring.write(frame, memoryview(b"jpeg bytes"))
+    assert seq == ring.get_seq() == 1
+    assert ring.read_jpeg() == (1, b"jpeg bytes")
+    read_seq, copy = ring.read_frame()
+    assert read_seq == 1
+    assert np.array_equal(copy, frame)
+
+
+def test_frame_ring_views_are_zero_copy(ring):
+    seq = ring.write(make_frame(1))
+    view = ring.view(seq)
+    assert not view.flags.writeable
+    assert not view.flags.owndata
+    # the view sees the slot itself, so it changes when the slot is reused
+    for value in range(2, 2 + ring.get_slots()):
+        ring.write(make_frame(value))
+    assert not ring.is_valid(seq)
+    assert ring.view(seq) is None
+    assert view[0, 0, 0] == 1 + ring.get_slots()
+
+
+def test_frame_ring_keeps_recent_frames(ring):
+    seqs = [ring.write(make_frame(value)) for value in range(5)]
+    for seq, value in zip(seqs[-3:], range(2, 5)):
+        assert ring.is_valid(seq)
+        assert ring.view(seq)[0, 0, 0] == value
+    assert ring.read_frame(seqs[0]) == (seqs[0], None)
+
+
+def test_frame_ring_attach_by_name(ring):
+    ring.write(make_frame(7))
+    reader = FrameRing(shape, slots=3, name=ring.get_name())
+    try:
+        assert reader.get_seq() == 1
+        assert np.array_equal(reader.view(1), make_frame(7))
+        assert reader.read_jpeg() == (1, None)
+    finally:
+        reader.close()
+
+
+def test_frame_ring_skips_torn_reads(ring):
+    seq = ring.write(make_frame(0), b"jpeg")
+    # a write in progress leaves the stamp odd
+    ring._FrameRing__stamps[seq % 3, 0] -= 1
+    assert ring.read_jpeg(seq) == (seq, None)
+    assert ring.read_frame(seq) == (seq, None)
+
+
+def test_frame_ring_needs_a_slot():
+    with pytest.raises(ValueError):
+        FrameRing(shape, slots=0)
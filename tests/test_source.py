@@ -0,0 +1,203 @@
+import os
+import time
+
+import cv2
+import numpy as np
+import pytest
+from dotenv import load_dotenv
+
+from app.camera import Camera
+from app.motion import Detector
+from app.source import (
+    DeviceSource,
+    FileSource,
+    FrameSource,
+    LatestFrameSource,
+    RtspSource,
+    SyntheticSource,
+    create_source,
+)
+
+load_dotenv()
+
+# camera
+WIDTH = int(os.getenv("WIDTH"))
+HEIGHT = int(os.getenv("HEIGHT"))
+
+# motion detector
+SIM_THRESHOLD = float(os.getenv("THRESHOLD"))
+
+
+@pytest.fixture
+def video_file(tmp_path):
+    # a short clip of frames getting brighter
+    path = str(tmp_path / "clip.avi")
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), 10, (64, 48))
+    for value in range(0, 250, 25):
+        writer.write(np.full((48, 64, 3), value, dtype=np.uint8))
+    writer.release()
+    yield path
+
+
+def test_synthetic_source_frames():
+    source = SyntheticSource(pacing="fast", frames=3)
+    assert source.open(30, (WIDTH, HEIGHT))
+    frames = [source.read() for _ in range(4)]
+    assert frames[-1] is None
+    for frame in frames[:3]:
+        assert frame.shape == (HEIGHT, WIDTH, 3)
+        assert frame.dtype == np.uint8
+    # the square moves, and consumers get their own frames
+    assert not np.array_equal(frames[0], frames[1])
+    assert frames[0] is not frames[1]
+
+
+def test_synthetic_source_still_then_moving():
+    source = SyntheticSource(pacing="fast", noise=0, motion=(3, 3))
+    source.open(30, (160, 120))
+    frames = [source.read() for _ in range(6)]
+    assert np.array_equal(frames[0], frames[2])
+    assert not np.array_equal(frames[3], frames[4])
+
+
+def test_synthetic_source_flicker():
+    source = SyntheticSource(pacing="fast", noise=0, shapes=0, flicker=0.2)
+    source.open(10, (32, 24))
+    means = [source.read().mean() for _ in range(10)]
+    assert max(means) - min(means) > 5
+
+
+def test_realtime_pacing():
+    source = SyntheticSource(pacing="realtime")
+    source.open(50, (32, 24))
+    start = time.perf_counter()
+    for _ in range(6):
+        source.read()
+    assert time.perf_counter() - start >= 5 / 50 * 0.9
+
+
+def test_fast_pacing():
+    source = SyntheticSource(pacing="fast")
+    source.open(1, (32, 24))
+    start = time.perf_counter()
+    for _ in range(5):
+        source.read()
+    assert time.perf_counter() - start < 1
+
+
+def test_unknown_pacing():
+    with pytest.raises(ValueError):
+        SyntheticSource(pacing="slow")
+
+
+def test_file_source(video_file):
+    source = FileSource(video_file, pacing="fast")
+    assert source.open(10, (32, 24))
+    frames = []
+    frame = source.read()
+    while frame is not None:
+        frames.append(frame)
+        frame = source.read()
+    source.close()
+    assert len(frames) == 10
+    assert frames[0].shape == (24, 32, 3)
+    assert frames[-1].mean() > frames[0].mean()
+
+
+def test_file_source_loop(video_file):
+    source = FileSource(video_file, pacing="fast", loop=True)
+    source.open(10, (64, 48))
+    frames = [source.read() for _ in range(15)]
+    source.close()
+    assert all(frame is not None for frame in frames)
+
+
+def test_missing_file_source(tmp_path):
+    source = FileSource(str(tmp_path / "missing.mp4"))
+    assert not source.open()
+    assert source.read() is None
+
+
+@pytest.mark.parametrize(
+    "target, kind",
+    [
+        (0, DeviceSource),
+        ("1", DeviceSource),
+        ("rtsp://camera/stream", RtspSource),
+        ("synthetic", SyntheticSource),
+        ("videos/clip.mp4", FileSource),
+    ],
+)
+def test_create_source(target, kind):
+    assert isinstance(create_source(target), kind)
+
+
+def test_create_latest_source():
+    source = create_source("synthetic", capture="latest")
+    assert isinstance(source, LatestFrameSource)
+    with pytest.raises(ValueError):
+        create_source("synthetic", capture="newest")
+
+
+def test_latest_source_skips_stale_frames(video_file):
+    # A slow consumer gets ever newer frames, and every frame is either read
+    # or counted as dropped
+    source = LatestFrameSource(FileSource(video_file, pacing="fast"))
+    assert source.open(10, (64, 48))
+    frames = []
+    while True:
+        frame = source.read()
+        if frame is None:
+            break
+        frames.append(frame)
+        time.sleep(0.02)
+    dropped = source.get_dropped_frames()
+    source.close()
+    assert dropped > 0
+    assert len(frames) + dropped == 10
+    means = [frame.mean() for frame in frames]
+    assert means == sorted(means)
+
+
+def test_latest_source_bounds_latency():
+    # Reading at a fifth of the source fps drops the frames in between
+    source = LatestFrameSource(SyntheticSource(pacing="realtime"))
+    source.open(50, (32, 24))
+    for _ in range(5):
+        assert source.read() is not None
+        time.sleep(0.1)
+    dropped = source.get_dropped_frames()
+    source.close()
+    assert dropped >= 10
+
+
+def test_camera_reads_from_source():
+    camera = Camera(source=SyntheticSource(pacing="fast"))
+    camera.start(30, (160, 120))
+    frame = camera.read_frame("2023-01-01  00:00:00")
+    assert frame.shape == (120, 160, 3)
+    assert camera.get_frame_size() == (160, 120)
+    assert camera.get_fps() == 30
+
+
+def test_detector_reads_from_source():
+    source = SyntheticSource(pacing="fast", noise=0, motion=(10, 10), frames=20)
+    source.open(30, (WIDTH, HEIGHT))
+    results = list(Detector().detect_source(source, SIM_THRESHOLD, every=2))
+    assert [index for index, _, _ in results] == list(range(0, 20, 2))
+    scores = [score for _, _, score in results]
+    assert scores[:5] == [100.0] * 5
+    assert all(score < 100 for score in scores[6:])
+
+
+def test_source_must_implement_grab():
+    # a missing override fails on creation, not on the first frame
+    class NoGrab(FrameSource):
+        def get_fps(self):
+            return 30.0
+
+        def get_frame_size(self):
+            return (WIDTH, HEIGHT)
+
+    with pytest.raises(TypeError, match="grab"):
+        NoGrab()
@@ -0,0 +1,96 @@
+import os
+
+import cv2
+import numpy as np
+import pytest
+
+from app.thumbnails import (
+    KeyframeCollector,
+    ThumbnailCache,
+    extract_thumbnail,
+    save_thumbnails,
+    thumbnail_paths,
+)
+
+
+def numbered_frame(value, size=(48, 64)):
+    return np.full(size + (3,), value, dtype=np.uint8)
+
+
+def test_thumbnail_is_lowest_score_frame():
+    collector = KeyframeCollector(frames=4, width=32)
+    for value, score in [(10, 99.0), (20, 80.0), (30, 90.0)]:
+        collector.add(numbered_frame(value), score)
+    thumbnail = collector.get_thumbnail()
+    assert thumbnail.shape == (24, 32, 3)
+    assert thumbnail.mean() == 20
+
+
+def test_keyframes_spread_over_event():
+    # 100 frames sampled down to 8 evenly spaced keyframes, without knowing
+    # the length of the event in advance
+    collector = KeyframeCollector(frames=8, width=64)
+    for value in range(100):
+        collector.add(numbered_frame(value), 95.0)
+    values = [int(frame.mean()) for frame in collector.get_keyframes()]
+    assert len(values) == 8
+    assert values == sorted(values)
+    assert values[0] == 0 and values[-1] >= 80
+
+
+def test_short_event_keeps_every_frame():
+    collector = KeyframeCollector(frames=8)
+    for value in range(3):
+        collector.add(numbered_frame(value), 95.0)
+    assert len(collector.get_keyframes()) == 3
+
+
+def test_save_thumbnails(tmp_path):
+    collector = KeyframeCollector(frames=4, width=32)
+    for value in range(10):
+        collector.add(numbered_frame(value * 20), 95.0 - value)
+    video = str(tmp_path / "front_20240101-000000.mp4")
+    assert save_thumbnails(video, collector)
+    thumbnail_path, sprite_path = thumbnail_paths(video)
+    assert cv2.imread(thumbnail_path).shape == (24, 32, 3)
+    assert cv2.imread(sprite_path).shape == (24, 4 * 32, 3)
+    assert not save_thumbnails(video, KeyframeCollector())
+
+
+@pytest.fixture
+def video_file(tmp_path):
+    path = str(tmp_path / "old.mp4")
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), 10, (64, 48))
+    for value in range(0, 250, 25):
+        writer.write(numbered_frame(value))
+    writer.release()
+    yield path
+
+
+def test_extract_thumbnail_of_old_video(video_file):
+    assert extract_thumbnail(video_file, width=32)
+    assert cv2.imread(thumbnail_paths(video_file)[0]).shape == (24, 32, 3)
+
+
+def test_cache_reads_each_image_once(video_file):
+    cache = ThumbnailCache(size=1)
+    first = cache.get(video_file)
+    assert first is not None
+    assert cache.get(video_file) is first
+    assert cache.get(video_file, "sprite") is None
+    assert len(cache) == 1
+    with pytest.raises(ValueError):
+        cache.get(video_file, "poster")
+
+
+def test_cache_rereads_rewritten_image(video_file):
+    cache = ThumbnailCache()
+    first = cache.get(video_file)
+    thumbnail_path = thumbnail_paths(video_file)[0]
+    stat = os.stat(thumbnail_path)
+    os.utime(thumbnail_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert cache.get(video_file) is not first
+
+
+if __name__ == "__main__":
+    pytest.main()
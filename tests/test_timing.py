@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+from app.encoder import JpegEncoder
+from app.timing import StageTimer, timer
+
+
+def test_stage_timer_disabled():
+    stage_timer = StageTimer(enabled=False)
+    with stage_timer.stage("capture"):
+        pass
+    assert stage_timer.get_samples() == {}
+    assert stage_timer.summary() == {}
+
+
+def test_stage_timer_records():
+    stage_timer = StageTimer(enabled=True)
+    for _ in range(10):
+        with stage_timer.stage("capture"):
+            pass
+    with stage_timer.stage("encode"):
+        pass
+    samples = stage_timer.get_samples()
+    assert len(samples["capture"]) == 10
+    summary = stage_timer.summary()
+    assert summary["capture"]["count"] == 10
+    assert set(summary["encode"]) == {
+        "count",
+        "mean_ms",
+        "p50_ms",
+        "p95_ms",
+        "p99_ms",
+        "max_ms",
+    }
+    stage_timer.reset()
+    assert stage_timer.get_samples() == {}
+
+
+def test_stage_timer_records_on_error():
+    stage_timer = StageTimer(enabled=True)
+    with pytest.raises(RuntimeError):
+        with stage_timer.stage("capture"):
+            raise RuntimeError
+    assert len(stage_timer.get_samples()["capture"]) == 1
+
+
+def test_pipeline_stages_are_timed():
+    timer.reset()
+    timer.enable()
+    try:
+        JpegEncoder().encode(np.zeros((48, 64, 3), dtype=np.uint8))
+    finally:
+        timer.disable()
+    assert len(timer.get_samples()["encode"]) == 1
+    timer.reset()
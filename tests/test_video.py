@@ -1,11 +1,20 @@
 import os
+import time
 
 import pytest
 from dotenv import load_dotenv
 
+import app.video
+from app.buffer import FrameBuffer
 from app.camera import Camera
+from app.encoder import JpegEncoder
+from app.events import EventStore
+from app.metrics import metrics
 from app.motion import Detector
-from app.video import Streaming
+from app.overlay import Overlay
+from app.thumbnails import thumbnail_paths
+from app.video import MAX_FRAME_STRIDE, Streaming
+from conftest import FakeCamera
 
 # Load environment variables from .env file
 load_dotenv()
@@ -22,6 +31,13 @@ N_FRAMES = int(os.getenv("N_FRAMES"))
 SIM_THRESHOLD = float(os.getenv("THRESHOLD"))
 
 
+@pytest.fixture(autouse=True)
+def video_dir(tmp_path, monkeypatch):
+    # Recordings closed by a test save their thumbnails under tmp_path
+    monkeypatch.setattr(app.video, "VID_DIR", str(tmp_path))
+    yield tmp_path
+
+
 @pytest.fixture
 def camera_object():
     # Create a Camera instance for testing
@@ -48,5 +64,250 @@ def test_streaming_functionality(camera_object, motion_detector_object):
         assert isinstance(frame_bytes, bytes)
 
 
+def test_clients_share_one_capture_loop(fake_camera, motion_detector_object):
+    # Several clients must be served by a single capture loop
+    stream = Streaming(fake_camera, motion_detector_object)
+    clients = [stream.start() for _ in range(5)]
+    for _ in range(3):
+        for client in clients:
+            assert next(client).startswith(b"--frame")
+    assert fake_camera.starts == 1
+    assert stream.get_client_count() == 5
+
+    for client in clients:
+        client.close()
+    assert stream.get_client_count() == 0
+    stream.join()
+
+
+def test_slow_client_does_not_block_capture(fake_camera, motion_detector_object):
+    # A client that stops reading must not hold up frames for the others
+    stream = Streaming(fake_camera, motion_detector_object)
+    slow, fast = stream.start(), stream.start()
+    next(slow)
+    for _ in range(10):
+        next(fast)
+    assert fake_camera.reads >= 10
+    slow.close()
+    fast.close()
+    stream.join()
+
+
+class FakeRecorder:
+    # Records the calls Streaming makes to its recorder
+    def __init__(self) -> None:
+        self.calls = []
+        self.on_close = None
+
+    def open(self, name, fps, frame_size, on_close=None) -> None:
+        self.calls.append(("open", name))
+        self.on_close = on_close
+
+    def write_batch(self, frames) -> None:
+        self.calls.append(("batch", len(frames)))
+
+    def write(self, frame) -> bool:
+        self.calls.append(("write", 1))
+        return True
+
+    def close(self) -> None:
+        self.calls.append(("close", None))
+        if self.on_close is not None:
+            self.on_close(f"{self.calls[0][1]}.mp4", 3)
+            self.on_close = None
+
+    def stop(self, timeout=None) -> None:
+        self.calls.append(("stop", None))
+
+
+def test_recording_starts_with_premotion_frames(motion_camera, motion_detector_object):
+    # When motion starts, the frames leading up to it are recorded first
+    recorder = FakeRecorder()
+    stream = Streaming(
+        motion_camera,
+        motion_detector_object,
+        recorder=recorder,
+        premotion=FrameBuffer(capacity=30, mode="jpeg"),
+    )
+    client = stream.start()
+    for _ in range(N_FRAMES + 2):
+        next(client)
+    client.close()
+    stream.join()
+    assert recorder.calls[0][0] == "open"
+    assert recorder.calls[1] == ("batch", N_FRAMES + 1)
+
+
+def test_stop_finishes_recording(motion_camera, motion_detector_object):
+    # Stopping with a client still connected ends the loop, closes the
+    # recording in progress and waits for the recorder
+    recorder = FakeRecorder()
+    stream = Streaming(motion_camera, motion_detector_object, recorder=recorder)
+    client = stream.start()
+    for _ in range(N_FRAMES + 2):
+        next(client)
+    stream.stop(timeout=5)
+    assert stream.get_client_count() == 1
+    assert recorder.calls[-2:] == [("close", None), ("stop", None)]
+    client.close()
+
+
+def test_motion_events_are_indexed(motion_camera, motion_detector_object, video_dir):
+    # Each recording is added to the event index once it is closed, with a
+    # thumbnail and sprite sheet made from the frames recorded
+    events = EventStore(":memory:")
+    stream = Streaming(
+        motion_camera,
+        motion_detector_object,
+        recorder=FakeRecorder(),
+        camera_id="front",
+        events=events,
+    )
+    client = stream.start()
+    for _ in range(N_FRAMES + 2):
+        next(client)
+    client.close()
+    stream.join()
+    [event] = events.query(camera="front")
+    assert event.path.startswith(str(video_dir / "front_"))
+    assert event.frames == 3
+    assert event.start <= event.end
+    assert event.min_score <= event.peak_score
+    for path in thumbnail_paths(event.path):
+        assert os.path.exists(path)
+
+
+class SlowEncoder(JpegEncoder):
+    # Takes longer than the frame interval to encode
+    def encode(self, frame):
+        time.sleep(0.05)
+        return super().encode(frame)
+
+
+def test_frames_are_skipped_when_behind(motion_detector_object):
+    # When the work takes longer than the frame interval, only some frames
+    # are encoded and published
+    stream = Streaming(
+        FakeCamera(fps=50),
+        motion_detector_object,
+        encoder=SlowEncoder(),
+        fps=50,
+        camera_id="behind",
+    )
+    client = stream.start()
+    for _ in range(15):
+        next(client)
+    client.close()
+    stream.join()
+    assert metrics.get("pipeline_load", camera="behind") > 1
+    assert metrics.get("pipeline_skipped_frames_total", camera="behind") > 0
+
+
+def test_stride_follows_load():
+    get_stride = Streaming._Streaming__get_stride
+    assert get_stride(0.5) == 1
+    assert get_stride(1.0) == 1
+    assert get_stride(1.5) == 2
+    assert get_stride(100) == MAX_FRAME_STRIDE
+
+
+class ListHub:
+    # Collects the published frames in place of a FrameHub
+    def __init__(self) -> None:
+        self.frames = []
+
+    def publish(self, frame) -> None:
+        self.frames.append(frame)
+
+    def close(self) -> None:
+        pass
+
+
+def run_frames(stream: Streaming, camera: FakeCamera, frames: int) -> ListHub:
+    hub = ListHub()
+    stream.run(hub, lambda: camera.reads > frames)
+    return hub
+
+
+def test_idle_stream_only_sends_keepalive_and_motion(motion_detector_object):
+    # An unchanged scene only gets keepalive frames; once the scene changes,
+    # every frame of the motion is published
+    camera = FakeCamera(fps=1000, change_after=3 * N_FRAMES - 5)
+    stream = Streaming(
+        camera,
+        motion_detector_object,
+        recorder=FakeRecorder(),
+        idle_stream=True,
+        idle_keepalive=60,
+        camera_id="idle",
+    )
+    hub = run_frames(stream, camera, 4 * N_FRAMES + 2)
+    first = camera.frame[0, 0, 0]
+    changed = [frame for frame in hub.frames if frame.get_frame()[0, 0, 0] != first]
+    # the first frame, then the frames from the one motion is detected in
+    # until the one it ends in
+    assert len(hub.frames) == 1 + N_FRAMES
+    assert len(changed) == N_FRAMES
+    idle = metrics.get("stream_idle_frames_total", camera="idle")
+    assert idle == 4 * N_FRAMES + 2 - len(hub.frames)
+
+
+def test_idle_stream_keepalive(motion_detector_object):
+    # Keepalive frames keep coming while the scene stays idle
+    camera = FakeCamera(fps=1000)
+    stream = Streaming(
+        camera, motion_detector_object, idle_stream=True, idle_keepalive=0
+    )
+    assert len(run_frames(stream, camera, 20).frames) == 20
+
+
+class CountingEncoder(JpegEncoder):
+    # Counts the frames encoded at the stream quality
+    def __init__(self) -> None:
+        super().__init__()
+        self.count = 0
+
+    def encode(self, frame):
+        self.count += 1
+        return super().encode(frame)
+
+
+def test_idle_frames_are_not_stream_encoded(motion_detector_object):
+    # Frames held back while idle go to the pre-motion buffer unencoded by
+    # the stream encoder
+    camera = FakeCamera(fps=1000)
+    encoder = CountingEncoder()
+    premotion = FrameBuffer(capacity=30, mode="jpeg")
+    stream = Streaming(
+        camera,
+        motion_detector_object,
+        encoder=encoder,
+        premotion=premotion,
+        idle_stream=True,
+        idle_keepalive=60,
+    )
+    hub = run_frames(stream, camera, 30)
+    assert len(hub.frames) == 1
+    assert encoder.count == 1
+    assert len(premotion) == 30
+
+
+def test_overlay_is_left_off_recordings(motion_detector_object):
+    # Clients see the timestamp, the pre-motion buffer gets clean frames
+    camera = FakeCamera(fps=1000)
+    premotion = FrameBuffer(capacity=30, mode="raw")
+    stream = Streaming(
+        camera,
+        motion_detector_object,
+        premotion=premotion,
+        overlay=Overlay(on_record=False),
+    )
+    hub = run_frames(stream, camera, 5)
+    for frame in hub.frames:
+        assert (frame.get_frame() != camera.frame).any()
+    for frame in premotion.detach():
+        assert (frame == camera.frame).all()
+
+
 if __name__ == "__main__":
     pytest.main()